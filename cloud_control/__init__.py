@@ -1,10 +1,20 @@
 import argparse
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Union
 
 import common
 
 from code_control import setup, BranchProtectArgAction
+from code_control.bulk import bulk_setup
+from code_control.reconcile import reconcile
+from code_control.snapshot import (
+    diff_snapshots,
+    export_repos,
+    format_snapshot_change,
+)
 from deployer import deploy
 
 from reporter.local import get_logger, LocalMetrics
@@ -103,6 +113,7 @@ class ArgumentsParser:
         )
         self._setup_deploy_parser()
         self._setup_config_parser()
+        self._setup_inventory_parser()
 
         self.args = self.root_parser.parse_args(args)
 
@@ -164,8 +175,44 @@ class ArgumentsParser:
         )
         config_parser.add_argument(
             "project_id",
-            help="ID of project we're creating a repository for",
-            default=SETTINGS.DEFAULT_PROJECT_NAME,
+            help="ID of project we're creating a repository for, required "
+            "unless --manifest is given",
+            nargs="?",
+        )
+        config_parser.add_argument(
+            "--reconcile",
+            help="Read current state of repository, its teams and "
+            "protection, and apply only changes needed to reach desired state",
+            default=False,
+            action="store_true",
+        )
+        config_parser.add_argument(
+            "--plan",
+            help="Same as --reconcile, but only print changes without "
+            "applying them",
+            default=False,
+            action="store_true",
+        )
+        config_parser.add_argument(
+            "--manifest",
+            help="CSV, JSON or YAML file with project_id of every project to "
+            "set up, and optional per-project overrides of config_repo, "
+            "force, bypass_branch_protection, branch_protection and "
+            "output_data. Replaces project_id argument",
+        )
+        config_parser.add_argument(
+            "--manifest-workers",
+            help="Number of projects from manifest set up at once",
+            type=int,
+            default=SETTINGS.BULK_SETUP_WORKERS,
+        )
+        config_parser.add_argument(
+            "--no-resume",
+            help="Set up again projects of manifest, which succeeded in "
+            "previous run",
+            dest="resume",
+            default=True,
+            action="store_false",
         )
         config_parser.add_argument(
             "--config-repo",
@@ -203,10 +250,64 @@ class ArgumentsParser:
         )
         config_parser.add_argument(
             "--output-data",
-            help="Output repo data to files in "
-            + str(SETTINGS.PROJECT_DATA_DIR),
+            help="Append repo and team data to --snapshot-file",
             action="store_true",
         )
+        config_parser.add_argument(
+            "--snapshot-file",
+            help="JSON Lines snapshot, gzip compressed if ends with .gz",
+            default=SETTINGS.OUTPUT_DATA_SNAPSHOT_FILE,
+        )
+
+    def _setup_inventory_parser(self):
+        """
+        Setup specific to inventory command arguments
+        """
+        inventory_parser = self.management_parser.add_parser(
+            "inventory",
+            help="Index repositories, teams and branch protection of config "
+            "organisation in " + str(SETTINGS.INVENTORY_DB) + ", export "
+            "and compare snapshots of organisation",
+        )
+        inventory_parser.set_defaults(
+            project_id=SETTINGS.DEFAULT_PROJECT_NAME,
+            config_repo=None,
+            branch_permissions=SETTINGS.HIGHLY_PROTECTED_BRANCH,
+        )
+        inventory_parser.formatter_class = argparse.RawTextHelpFormatter
+
+        inventory_parser.add_argument(
+            "i_action",
+            choices=("refresh", "lacking-protection", "export", "diff"),
+            help="refresh: crawl repositories updated since previous "
+            "refresh\n"
+            "lacking-protection: list repositories, which master branch is "
+            "less protected than --branch-protection\n"
+            "export: stream all repositories and teams to --snapshot-file\n"
+            "diff: compare --previous-snapshot with --snapshot-file",
+        )
+        inventory_parser.add_argument(
+            "--snapshot-file",
+            help="JSON Lines snapshot, gzip compressed if ends with .gz",
+            default=SETTINGS.EXPORT_SNAPSHOT_FILE,
+        )
+        inventory_parser.add_argument(
+            "--previous-snapshot",
+            help="Snapshot compared with --snapshot-file by diff",
+        )
+        inventory_parser.add_argument(
+            "--full",
+            help="Relist all repositories and drop deleted ones",
+            default=False,
+            action="store_true",
+        )
+        inventory_parser.add_argument(
+            "--branch-protection",
+            choices=("standard", "high"),
+            help="Protection level required by lacking-protection query",
+            default="high",
+            action=BranchProtectArgAction,
+        )
 
 
 class CloudControl:
@@ -218,6 +319,7 @@ class CloudControl:
         "gcp": "Google Cloud Platform",
         "aws": "Amazon Web Services",
         "github": "Github",
+        "local-git": "Local git mirror",
     }
 
     def __init__(self, args):
@@ -228,6 +330,23 @@ class CloudControl:
                 "Choosing of all VCS platforms is not implemented currently."
             )
 
+        if (
+            self.args.command in ("config", "inventory")
+            and self.args.vcs_platform == "local-git"
+        ):
+            raise CloudControlException(
+                "local-git VCS platform is read-only, use it for deploy only."
+            )
+
+        if (
+            self.args.command == "config"
+            and not self.args.project_id
+            and not getattr(self.args, "manifest", None)
+        ):
+            raise CloudControlException(
+                "config requires project_id or --manifest"
+            )
+
         if self.args.command == "deploy" and self.args.cloud == "all":
             raise CloudControlException(
                 "Choosing of all clouds is not implemented currently."
@@ -255,6 +374,13 @@ class CloudControl:
             debug=self.args.debug,
             json_formatter=self.args.json_logging,
         )
+        # terraform output is streamed to this logger
+        get_logger(
+            "deployer",
+            log_file=self.args.log_file,
+            debug=self.args.debug,
+            json_formatter=self.args.json_logging,
+        )
 
     @property
     def remote_metrics(self) -> Metrics:
@@ -282,6 +408,16 @@ class CloudControl:
 
     def _log_and_send_metrics(self, command, success):
         self._log.info("finished " + command + " run")
+        self._log.debug(
+            "GitHub client registry: %s", common.CLIENT_REGISTRY.stats
+        )
+        self._log.debug("GitHub HTTP cache: %s", common.HTTP_CACHE.stats)
+        self._log.debug(
+            "GitHub request scheduler: %s", common.REQUEST_SCHEDULER.stats
+        )
+        self._log.debug("REST session: %s", common.REST_SESSION.stats)
+        self._log.debug("Org inventory: %s", common.INVENTORY.stats)
+        common.REQUEST_SCHEDULER.report(self.metrics_registry)
 
         self.metrics_registry.add_metric("successes", int(success))
         self.metrics_registry.add_metric("failures", int(not success))
@@ -321,6 +457,8 @@ class CloudControl:
             command = self._deploy
         elif self.args.command == "config":
             command = self._config
+        elif self.args.command == "inventory":
+            command = self._inventory
         else:
             raise CloudControlException(
                 "Command {} does not implemented".format(self.args.command)
@@ -363,33 +501,109 @@ class CloudControl:
         self._log.info("Starting deployment")
         if self.args.cloud == "all":
             self.args.cloud = "all_"
-        config_org = common.get_org(self.args, self.args.config_org)
-        code_org = common.get_org(self.args, self.args.code_org)
-        config_files = common.get_files(
-            config_org,
-            self.args.config_repo,
-            self.args.cloud,
-            self.args.config_version,
-        )
-        # code repo should contain any lists or maps that define
-        # security policies
-        # and operating requirements. The code repo should be public.
-        code_files = common.get_files(
-            code_org,
-            self.args.code_repo,
-            self.args.cloud,
-            self.args.config_version,
-        )
-
-        config_hash = common.get_hash_of_latest_commit(
-            config_org, self.args.config_repo, self.args.config_version
-        )
-        code_hash = common.get_hash_of_latest_commit(
-            code_org, self.args.code_repo, self.args.code_version
+        config_files, code_files, config_hash, code_hash = (
+            self._resolve_sources()
         )
         testing_ending = f"{config_hash[:7]}-{code_hash[:7]}"
 
         return deploy(self.args, code_files, config_files, testing_ending)
 
+    def _resolve_sources(self):
+        """
+        Resolves config and code versions to commit hashes once, and fetches
+        files of both repositories pinned to these commits, so files and
+        hashes always match even if branches move meanwhile. Repositories are
+        processed concurrently on bounded thread pool.
+        :return: tuple: config files, code files, config hash, code hash
+        """
+        start_time = time.monotonic()
+
+        config_org = common.get_org(self.args, self.args.config_org)
+        code_org = common.get_org(self.args, self.args.code_org)
+
+        def resolve(org, repo_name, version):
+            repo = common.get_repo(org, repo_name)
+            sha = common.get_latest_commit_hash(repo, version)
+            files = common.get_repo_files(
+                repo, self.args.cloud, sha, self.args.fetch_mode
+            )
+            return files, sha
+
+        with ThreadPoolExecutor(
+            max_workers=SETTINGS.SOURCE_RESOLUTION_WORKERS,
+            thread_name_prefix="sources",
+        ) as executor:
+            config_source = executor.submit(
+                resolve,
+                config_org,
+                self.args.config_repo,
+                self.args.config_version,
+            )
+            # code repo should contain any lists or maps that define
+            # security policies
+            # and operating requirements. The code repo should be public.
+            code_source = executor.submit(
+                resolve, code_org, self.args.code_repo, self.args.code_version
+            )
+
+            config_files, config_hash = config_source.result()
+            code_files, code_hash = code_source.result()
+            sources = (config_files, code_files, config_hash, code_hash)
+
+        elapsed = time.monotonic() - start_time
+        self.metrics_registry.add_metric("source_resolution_time", elapsed)
+        self._log.info("Resolved code and config sources in %.2fs", elapsed)
+
+        return sources
+
     def _config(self):
-        return setup(self.args)
+        setup_func = (
+            reconcile
+            if getattr(self.args, "reconcile", False)
+            or getattr(self.args, "plan", False)
+            else setup
+        )
+        if getattr(self.args, "manifest", None):
+            results = bulk_setup(self.args, setup_func, self.args.resume)
+            return all(
+                result["status"] == "success" for result in results.values()
+            )
+        return setup_func(self.args)
+
+    def _inventory(self):
+        if self.args.i_action == "diff":
+            if not self.args.previous_snapshot:
+                raise CloudControlException("diff requires --previous-snapshot")
+            for change in diff_snapshots(
+                self.args.previous_snapshot, self.args.snapshot_file
+            ):
+                print(format_snapshot_change(change))
+            return True
+
+        org = common.get_org(self.args, self.args.config_org)
+        if self.args.i_action == "refresh":
+            start_time = time.monotonic()
+            result = common.INVENTORY.refresh(org, self.args.full)
+            self._log.info(
+                "Refreshed inventory of %s in %.2fs: %s",
+                org.login,
+                time.monotonic() - start_time,
+                result,
+            )
+            return True
+
+        if self.args.i_action == "export":
+            records = export_repos(org.get_repos(), self.args.snapshot_file)
+            self._log.info(
+                "Exported %d records of %s to %s",
+                records,
+                org.login,
+                self.args.snapshot_file,
+            )
+            return True
+
+        for name in common.INVENTORY.lacking_protection(
+            org.login, self.args.branch_permissions
+        ):
+            print(name)
+        return True
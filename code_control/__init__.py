@@ -1,15 +1,30 @@
 import argparse
 import json
-import os
-import requests
+import threading
 
 # github package is PyGithub
 # noinspection PyPackageRequirements
-from github import GithubException, BadCredentialsException
-from common import get_team, get_repo, get_org
+from github import (
+    GithubException,
+    BadCredentialsException,
+    InputGitTreeElement,
+)
+from common import (
+    INVENTORY,
+    get_team,
+    get_repo,
+    get_org,
+    TEAM_INDEX,
+    REST_SESSION,
+)
 
 from settings import SETTINGS
 
+from .executor import StepError, StepExecutor
+from .protection import BranchProtectionBypass
+from .snapshot import SnapshotWriter, repo_record, team_record
+from .templates import TEMPLATE_STORE, TemplateError
+
 
 class TemplatesArgAction(argparse.Action):
     def __init__(self, option_strings, dest, nargs=None, **kwargs):
@@ -50,73 +65,123 @@ def create_repo(org, name=SETTINGS.DEFAULT_PROJECT_ID):
     :param name: string: name of the repo
     :return: obj: github.Repository.Repository
     """
-    return org.create_repo(
+    repo = org.create_repo(
         name=name, description="GCP Project config for " + name
     )
+    INVENTORY.record_repo(org, repo)
+    return repo
 
 
 class GithubFileExists(Exception):
     pass
 
 
-def update_repo_file(
+def commit_repo_files(
     repo,
-    file_to_change,
-    new_content,
+    files,
     commit_msg,
     force=False,
     bypass_protection=False,
+    branch="master",
 ):
     """
-    Updates the files on the newly project repository
-    :param bypass_protection: bool:  whether to bypass protection on branch
-    :param force: bool: whether or not to force an update to an existing file
+    Writes all files to the repository with single commit through Git Data
+    API: one tree and one commit for any amount of files. Files, which already
+    have the same content, are skipped, and no commit is made, when nothing
+    changed. Whole batch is written with single ref update, so protection is
+    lifted at most once for it.
     :param repo: obj: repository we're modifying
-    :param file_to_change: str: of the path relative to the file in the repo
-    :param new_content: str: to write to the file in Github
-    :param commit_msg: str: message to go with the git commit
+    :param files: dict: of path relative to repo root to str content
+    :param commit_msg: str: message of the commit
+    :param force: bool: whether or not to overwrite existing files
+    :param bypass_protection: bool:  whether to bypass protection on branch
+    :param branch: str: branch to commit to
+    :return: obj: github.GitCommit.GitCommit or None, if all files are up to
+     date
     """
     try:
-        cur_file = repo.get_contents(file_to_change, ref="master")
+        ref = repo.get_git_ref("heads/" + branch)
+    except GithubException as e:
+        # 409 is returned for empty repository
+        if e.status not in (404, 409):
+            raise
+        ref = None
+
+    if ref is None:
+        # Git Data API can't write to empty repository, so it's initialised
+        # with first file through contents API, and this commit is replaced
+        # with the one containing all files
+        path, content = next(iter(files.items()))
+        repo.create_file(path, commit_msg, content, branch=branch)
+        ref = repo.get_git_ref("heads/" + branch)
+        parents = []
+        base_tree = None
+    else:
+        parent = repo.get_git_commit(ref.object.sha)
+        parents = [parent]
+        base_tree = parent.tree
+        existing_files = {
+            element.path: element.sha
+            for element in repo.get_git_tree(base_tree.sha, recursive=True).tree
+        }
+        if not force:
+            for path in files:
+                if path in existing_files:
+                    raise GithubFileExists(
+                        "File "
+                        + path
+                        + " already exists. Use --force to reconfigure"
+                    )
+
+        unchanged_files = [
+            path
+            for path, content in files.items()
+            if existing_files.get(path) == TEMPLATE_STORE.blob_sha(content)
+        ]
+        for path in unchanged_files:
+            print("File " + path + " is up to date. Skipping...")
+        files = {
+            path: content
+            for path, content in files.items()
+            if path not in unchanged_files
+        }
+        if not files:
+            return None
+
+    elements = [
+        InputGitTreeElement(path, "100644", "blob", content=content)
+        for path, content in files.items()
+    ]
+    if base_tree is None:
+        tree = repo.create_git_tree(elements)
+    else:
+        tree = repo.create_git_tree(elements, base_tree)
+    commit = repo.create_git_commit(commit_msg, tree, parents)
+
+    print("Committing files " + ", ".join(files))
+    bypass = BranchProtectionBypass(repo, branch, enabled=bypass_protection)
+    try:
+        with bypass:
+            bypass.write(ref.edit, commit.sha, force=not parents)
     except GithubException as e:
-        cur_file = None
         print(e.data)
-        print(file_to_change + " doesn't exist. Creating...")
+        print("Try --bypass-branch-protection")
+        raise
 
-    if cur_file and force is True:
-        print("Updating file " + file_to_change)
-        try:
-            repo.update_file(
-                cur_file.path,
-                commit_msg + file_to_change,
-                new_content,
-                cur_file.sha,
-                branch="master",
-            )
-        except GithubException as e:
-            if e.status == 409 and bypass_protection:
-                set_master_branch_permissions(repo, {})
-                update_repo_file(
-                    repo,
-                    file_to_change,
-                    new_content,
-                    commit_msg,
-                    force,
-                    bypass_protection,
-                )
-            else:
-                print(e.data)
-                print("Try --bypass-branch-protection")
-    elif cur_file and force is not True:
-        raise GithubFileExists(
-            "File "
-            + file_to_change
-            + " already exists. Use --force to reconfigure"
-        )
-    else:
-        repo.create_file(
-            file_to_change, commit_msg, new_content, branch="master"
-        )
+    return commit
+
+
+_TEAM_LOCKS = {}
+_TEAM_LOCKS_LOCK = threading.Lock()
+
+
+def _team_lock(org, team_name):
+    """
+    Same team may be created by several projects set up concurrently, so
+    lookup and creation of each team is serialised
+    """
+    with _TEAM_LOCKS_LOCK:
+        return _TEAM_LOCKS.setdefault((org.login, team_name), threading.Lock())
 
 
 def create_team(
@@ -133,25 +198,32 @@ def create_team(
     :param permission: string: what rights the team should have
     :return: obj: github.Team.Team
     """
-    existing_team = get_team(org, team_name)
-    if existing_team:
-        existing_team.edit(
+    with _team_lock(org, team_name):
+        existing_team = get_team(org, team_name)
+        if existing_team:
+            existing_team.edit(
+                name=team_name, permission=permission, privacy=privacy
+            )
+            INVENTORY.record_team(
+                org, existing_team.slug, {"name": team_name, "privacy": privacy}
+            )
+            return existing_team
+
+        team = org.create_team(
             name=team_name, permission=permission, privacy=privacy
         )
-        return existing_team
-
-    return org.create_team(
-        name=team_name, permission=permission, privacy=privacy
-    )
+        TEAM_INDEX.add(org, team)
+        return team
 
 
 def configure_remote_object(url, token, **kwargs):
     """
-    uses request module to pass headers needed for beta API feature of setting
-    parent_id in API and attributes missing from PyGithub library
+    uses shared REST session to pass headers needed for beta API feature of
+    setting parent_id in API and attributes missing from PyGithub library
     :param token: authentication token header
     :param url: URL to access object
     :param kwargs: key value pairs of object attributes to set
+    :raises: :class:`github.GithubException` if object wasn't updated
     """
     data = {}
     data.update(**kwargs)
@@ -160,41 +232,67 @@ def configure_remote_object(url, token, **kwargs):
         "Authorization": "token " + token,
     }
 
-    response = requests.patch(url=url, headers=headers, data=json.dumps(data))
+    # attributes are set to absolute values, so patch is safe to retry
+    response = REST_SESSION.patch(
+        url, headers=headers, data=json.dumps(data), idempotent=True
+    )
     if response.status_code != 200:
         print("ERROR: FAILED TO UPDATE OBJECT")
         print(response.headers)
         print(response.text)
+        try:
+            error_data = response.json()
+        except ValueError:
+            error_data = response.text
+        # retries are exhausted by now, so caller has to know about failure
+        raise GithubException(response.status_code, error_data)
 
     return response
 
 
+def configure_team(org, team, token, **kwargs):
+    """
+    sets attributes of team, which PyGithub can't set, and keeps inventory up
+    to date with them
+    :param org: obj: organisation of the team
+    :param team: obj: github.Team.Team to configure
+    :param token: authentication token header
+    :param kwargs: key value pairs of team attributes to set
+    :return: obj: response of API
+    """
+    response = configure_remote_object(team.url, token, **kwargs)
+    INVENTORY.record_team(org, team.slug, response.json())
+    return response
+
+
 def configure_project_data(config_file, **kwargs):
     """
     takes a JSON template file with config defaults, sets any new values based
-    on kwargs returns a JSON string ready to be used in git file update
+    on kwargs returns a JSON string ready to be used in git file update.
+    Template is parsed once and rendered strings are memoized.
     :param config_file: str: path to template file containing defaults
     :param kwargs: list: of key/value pairs to set in dict
     :return: string
     """
-    with open(config_file, "r") as settings_file:
-        data_dict = json.loads(settings_file.read())
-
-    data_dict.update(**kwargs)
-    return json.dumps(data_dict, indent=2)
-
+    return TEMPLATE_STORE.render(config_file, **kwargs).content
 
-def write_project_data(repo, teams, data_dir=SETTINGS.PROJECT_DATA_DIR):
-    if not os.path.isdir(data_dir):
-        os.mkdir(data_dir, 0o0700)
 
-    repo_file = data_dir + "/repo.json"
-    with open(repo_file, "w") as rf:
-        rf.write(json.dumps(repo.raw_data, indent=2))
-    for team in teams:
-        team_file = data_dir + "/team_" + team.slug + ".json"
-        with open(team_file, "w") as tf:
-            tf.write(json.dumps(team.raw_data, indent=2))
+def write_project_data(
+    project_id, repo, snapshot_file=SETTINGS.OUTPUT_DATA_SNAPSHOT_FILE
+):
+    """
+    Appends repository and team records of the project to JSON Lines snapshot.
+    Teams are listed from repository, as permission of team returned by other
+    team APIs is its organisation default rather than one on repository.
+    :param project_id: str: project the repository belongs to
+    :param repo: obj: config repository of the project
+    :param snapshot_file: path: of snapshot, gzip compressed if ends with .gz
+    """
+    teams = list(repo.get_teams())
+    with SnapshotWriter(snapshot_file, append=True) as writer:
+        writer.write(repo_record(project_id, repo, teams))
+        for team in teams:
+            writer.write(team_record(team))
 
 
 def set_repo_visibility(repo, visibility):
@@ -209,6 +307,7 @@ def set_repo_visibility(repo, visibility):
         repo.edit(private=False)
     else:
         raise ValueError
+    INVENTORY.record_visibility(repo, visibility == "private")
 
 
 def set_repo_team_perms(org, repo, team_id, permission):
@@ -240,16 +339,45 @@ def set_master_branch_permissions(repo, branch_permissions):
     if not branch_permissions:
         master.remove_protection()
     master.edit_protection(**branch_permissions)
+    INVENTORY.record_protection(repo, "master", branch_permissions)
 
 
 def __file_content(file_with_content):
-    with open(file_with_content) as content:
-        return content.read()
+    return TEMPLATE_STORE.render(file_with_content).content
+
+
+def render_config_files(parsed_args):
+    """
+    Renders content of config files for the project
+    :param parsed_args: obj: which contains `change_files` and `project_id`
+    :return: dict: of path relative to repo root to str content
+    """
+    files = {}
+    for config_file in parsed_args.change_files.keys():
+        if config_file == "project_settings_file":
+            config = configure_project_data(
+                parsed_args.change_files[config_file],
+                project_id=parsed_args.project_id,
+                project_name=parsed_args.project_id,
+            )
+        else:
+            config = __file_content(parsed_args.change_files[config_file])
+        files[SETTINGS.REMOTE_FILES[config_file]] = config
+    return files
 
 
 def setup(parsed_args):
     # grab the last field from delimited project name
     environment = parsed_args.project_id.upper().split("-").pop()
+
+    # files are rendered first, so broken template doesn't leave empty
+    # repository behind
+    try:
+        files = render_config_files(parsed_args)
+    except TemplateError as e:
+        print(e)
+        exit(1)
+
     try:
         org = get_org(parsed_args, parsed_args.config_org)
     except BadCredentialsException as e:
@@ -261,7 +389,7 @@ def setup(parsed_args):
         raise BadCredentialsException(e.status, e.data)
 
     try:
-        existing_repo = get_repo(org, parsed_args.config_repo)
+        existing_repo = get_repo(org, parsed_args.config_repo, live=True)
     except GithubException as e:
         if e.status == 404:
             existing_repo = None
@@ -283,62 +411,99 @@ def setup(parsed_args):
         commit_msg = "Initial commit"
 
     # Configure project
-    for config_file in parsed_args.change_files.keys():
-        if config_file == "project_settings_file":
-            config = configure_project_data(
-                parsed_args.change_files[config_file],
-                project_id=parsed_args.project_id,
-                project_name=parsed_args.project_id,
-            )
-        else:
-            config = __file_content(parsed_args.change_files[config_file])
-        # Todo: capture update_repo_content exception and exclude if --force is
-        #  set
-        try:
-            # noinspection PyUnboundLocalVariable
-            update_repo_file(
-                repo,
-                SETTINGS.REMOTE_FILES[config_file],
-                config,
-                commit_msg,
-                parsed_args.force,
-                parsed_args.bypass_branch_protection,
-            )
-        except GithubException as e:
-            print(e.data)
+    if existing_repo:
+        commit_msg += ", ".join(files)
+    try:
+        commit_repo_files(
+            repo,
+            files,
+            commit_msg,
+            parsed_args.force,
+            parsed_args.bypass_branch_protection,
+        )
+    except GithubException as e:
+        print(e.data)
+
+    # Teams and permissions are declared as dependency graph, so independent
+    # API calls run concurrently
+    steps = StepExecutor(SETTINGS.CONFIG_SETUP_WORKERS)
 
     # Create teams
-    std_team = create_team(org)
-    priv_team = create_team(
-        org,
-        SETTINGS.PRIV_TEAM_ATTRIBUTES["name"],
-        SETTINGS.PRIV_TEAM_ATTRIBUTES["permission"],
+    steps.add("std_team", lambda results: create_team(org))
+    steps.add(
+        "priv_team",
+        lambda results: create_team(
+            org,
+            SETTINGS.PRIV_TEAM_ATTRIBUTES["name"],
+            SETTINGS.PRIV_TEAM_ATTRIBUTES["permission"],
+        ),
     )
-    admin_team = get_team(org, SETTINGS.ADMIN_TEAM)
-    configure_remote_object(
-        std_team.url,
-        parsed_args.vcs_token,
-        description=SETTINGS.STANDARD_TEAM_ATTRIBUTES["description"],
+    steps.add("admin_team", lambda results: get_team(org, SETTINGS.ADMIN_TEAM))
+    steps.add(
+        "std_team_config",
+        lambda results: configure_team(
+            org,
+            results["std_team"],
+            parsed_args.vcs_token,
+            description=SETTINGS.STANDARD_TEAM_ATTRIBUTES["description"],
+        ),
+        requires=["std_team"],
     )
-    configure_remote_object(
-        priv_team.url,
-        parsed_args.vcs_token,
-        parent_team_id=std_team.id,
-        description=SETTINGS.PRIV_TEAM_ATTRIBUTES["description"],
+    steps.add(
+        "priv_team_config",
+        lambda results: configure_team(
+            org,
+            results["priv_team"],
+            parsed_args.vcs_token,
+            parent_team_id=results["std_team"].id,
+            description=SETTINGS.PRIV_TEAM_ATTRIBUTES["description"],
+        ),
+        requires=["std_team", "priv_team"],
     )
 
     # Set repository permission
-    if admin_team:
-        set_repo_team_perms(org, repo, admin_team.id, "admin")
-    set_repo_team_perms(org, repo, std_team.id, "read")
-    set_repo_team_perms(org, repo, priv_team.id, "write")
-    try:
-        set_repo_visibility(repo, "private")
-    except GithubException as e:
-        print(e.data)
+    steps.add(
+        "admin_team_perms",
+        lambda results: results["admin_team"]
+        and set_repo_team_perms(org, repo, results["admin_team"].id, "admin"),
+        requires=["admin_team"],
+    )
+    steps.add(
+        "std_team_perms",
+        lambda results: set_repo_team_perms(
+            org, repo, results["std_team"].id, "read"
+        ),
+        requires=["std_team"],
+    )
+    steps.add(
+        "priv_team_perms",
+        lambda results: set_repo_team_perms(
+            org, repo, results["priv_team"].id, "write"
+        ),
+        requires=["priv_team"],
+    )
+
+    def set_private(results):
+        try:
+            set_repo_visibility(repo, "private")
+        except GithubException as e:
+            print(e.data)
+
+    steps.add("repo_visibility", set_private)
+    steps.add(
+        "branch_permissions",
+        lambda results: set_master_branch_permissions(
+            repo, parsed_args.branch_permissions
+        ),
+    )
+
+    results = steps.run()
+    if steps.failures:
+        raise StepError(steps.failures)
 
-    set_master_branch_permissions(repo, parsed_args.branch_permissions)
     if parsed_args.output_data:
-        write_project_data(repo, [std_team, priv_team])
+        write_project_data(
+            parsed_args.project_id, repo, parsed_args.snapshot_file
+        )
 
     return True
@@ -0,0 +1,238 @@
+import copy
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from common import ProjectIdFormatError, valid_project_id_format
+from settings import SETTINGS
+
+from .templates import TEMPLATE_STORE
+
+# manifest columns, which may override command line arguments per project
+MANIFEST_OVERRIDES = {
+    "config_repo": str,
+    "force": bool,
+    "bypass_branch_protection": bool,
+    "branch_protection": str,
+    "output_data": bool,
+}
+BRANCH_PROTECTION_LEVELS = {
+    "standard": SETTINGS.PROTECTED_BRANCH,
+    "high": SETTINGS.HIGHLY_PROTECTED_BRANCH,
+}
+
+
+class ManifestError(Exception):
+    pass
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+
+def _read_manifest_entries(path):
+    extension = os.path.splitext(path)[-1].lower()
+    with open(path, "r") as manifest_file:
+        if extension == ".csv":
+            return [
+                {
+                    key: value
+                    for key, value in row.items()
+                    if value not in ("", None)
+                }
+                for row in csv.DictReader(manifest_file)
+            ]
+        if extension == ".json":
+            data = json.load(manifest_file)
+        elif extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ManifestError(
+                    "PyYAML is required to read YAML manifests, install it "
+                    "or use CSV or JSON manifest"
+                )
+            data = yaml.safe_load(manifest_file)
+        else:
+            raise ManifestError(
+                f"Unsupported manifest format {extension}, "
+                "use .csv, .json, .yaml or .yml"
+            )
+
+    if isinstance(data, dict):
+        data = data.get("projects")
+    if not isinstance(data, list):
+        raise ManifestError("Manifest should contain list of projects")
+    return data
+
+
+def load_manifest(path):
+    """
+    Reads manifest of projects to onboard. Every entry has `project_id` and
+    optional overrides from `MANIFEST_OVERRIDES`.
+    :param path: string: path to .csv, .json, .yaml or .yml file
+    :return: list: of dicts
+    """
+    entries = []
+    seen = set()
+    for index, entry in enumerate(_read_manifest_entries(path), 1):
+        if not isinstance(entry, dict) or not entry.get("project_id"):
+            raise ManifestError(f"Entry {index} has no project_id")
+
+        project_id = str(entry.pop("project_id"))
+        try:
+            valid_project_id_format(project_id)
+        except ProjectIdFormatError as e:
+            raise ManifestError(f"Entry {index}: {e}")
+        if project_id in seen:
+            raise ManifestError(f"Entry {index}: duplicate {project_id}")
+        seen.add(project_id)
+
+        unknown = set(entry) - set(MANIFEST_OVERRIDES)
+        if unknown:
+            raise ManifestError(
+                f"Entry {index}: unknown fields {', '.join(sorted(unknown))}"
+            )
+        if entry.get("branch_protection", "standard") not in (
+            BRANCH_PROTECTION_LEVELS
+        ):
+            raise ManifestError(
+                f"Entry {index}: branch_protection should be one of "
+                + ", ".join(BRANCH_PROTECTION_LEVELS)
+            )
+
+        for key, value in entry.items():
+            if MANIFEST_OVERRIDES[key] is bool:
+                entry[key] = _to_bool(value)
+            else:
+                entry[key] = MANIFEST_OVERRIDES[key](value)
+        entries.append(dict(entry, project_id=project_id))
+    return entries
+
+
+class BulkState:
+    """
+    Results of bulk run, stored next to manifest after every project, so
+    interrupted or partially failed run can be resumed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as state_file:
+                self.projects = json.load(state_file)
+        except FileNotFoundError:
+            self.projects = {}
+
+    def succeeded(self, project_id):
+        return self.projects.get(project_id, {}).get("status") == "success"
+
+    def record(self, project_id, status, elapsed, error=None):
+        with self._lock:
+            self.projects[project_id] = {
+                "status": status,
+                "time": round(elapsed, 3),
+                "error": error,
+                "finished_at": datetime.utcnow().isoformat(),
+            }
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".", dir=directory)
+            with os.fdopen(fd, "w") as state_file:
+                json.dump(self.projects, state_file, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def project_args(parsed_args, entry):
+    """
+    Builds arguments of single project run from bulk run arguments
+    :param parsed_args: obj: arguments of bulk run
+    :param entry: dict: manifest entry
+    :return: obj: copy of arguments with project overrides applied
+    """
+    args = copy.copy(parsed_args)
+    args.manifest = None
+    args.project_id = entry["project_id"]
+    args.config_repo = entry.get("config_repo", entry["project_id"])
+    for key in ("force", "bypass_branch_protection", "output_data"):
+        if key in entry:
+            setattr(args, key, entry[key])
+    if "branch_protection" in entry:
+        args.branch_permissions = BRANCH_PROTECTION_LEVELS[
+            entry["branch_protection"]
+        ]
+    return args
+
+
+def bulk_setup(parsed_args, setup_func, resume=True):
+    """
+    Runs `setup_func` for every project of manifest on bounded thread pool.
+    Clients, organisations and team index are shared by all projects.
+    :param parsed_args: obj: which contains `manifest` and `manifest_workers`
+    :param setup_func: callable: sets up single project from its arguments
+    :param resume: bool: whether to skip projects succeeded in previous runs
+    :return: dict: of project id to result, see `BulkState.record`
+    """
+    entries = load_manifest(parsed_args.manifest)
+    # every project renders the same templates, so they are read once and
+    # broken templates fail the run before any project is touched
+    TEMPLATE_STORE.preload(getattr(parsed_args, "change_files", {}).values())
+    state = BulkState(parsed_args.manifest + SETTINGS.BULK_STATE_SUFFIX)
+
+    pending = [
+        entry
+        for entry in entries
+        if not (resume and state.succeeded(entry["project_id"]))
+    ]
+    if len(pending) < len(entries):
+        print(
+            f"Skipping {len(entries) - len(pending)} projects succeeded "
+            "in previous run"
+        )
+
+    def run(entry):
+        start_time = time.monotonic()
+        try:
+            setup_func(project_args(parsed_args, entry))
+        except (Exception, SystemExit) as e:
+            # setup exits, when repository exists and --force isn't set
+            return "failure", time.monotonic() - start_time, repr(e)
+        return "success", time.monotonic() - start_time, None
+
+    with ThreadPoolExecutor(
+        max_workers=parsed_args.manifest_workers, thread_name_prefix="bulk"
+    ) as executor:
+        futures = {
+            executor.submit(run, entry): entry["project_id"]
+            for entry in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            project_id = futures[future]
+            status, elapsed, error = future.result()
+            state.record(project_id, status, elapsed, error)
+            print(
+                f"[{done}/{len(pending)}] {project_id}: {status} "
+                f"in {elapsed:.2f}s" + (f" ({error})" if error else "")
+            )
+
+    failed = [
+        entry["project_id"]
+        for entry in entries
+        if not state.succeeded(entry["project_id"])
+    ]
+    print(
+        f"Onboarded {len(entries) - len(failed)} of {len(entries)} projects"
+        + (f", failed: {', '.join(failed)}" if failed else "")
+    )
+    return {
+        entry["project_id"]: state.projects[entry["project_id"]]
+        for entry in entries
+    }
@@ -0,0 +1,128 @@
+import time
+
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+Step = namedtuple("Step", ["name", "func", "requires"])
+
+
+class StepError(Exception):
+    """
+    Raised after run, when any of steps failed
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(
+            "Failed steps: "
+            + ", ".join(f"{name} ({error})" for name, error in failures.items())
+        )
+
+
+class StepExecutor:
+    """
+    Runs steps declared as dependency graph. Step is started as soon as all
+    steps it requires succeeded, so independent steps run concurrently on
+    bounded thread pool and whole run takes roughly its critical path. Steps,
+    which depend on failed steps, are skipped.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._steps = {}
+        self.results = {}
+        self.timings = {}
+        self.failures = {}
+        self.skipped = []
+
+    def add(self, name, func, requires=()):
+        """
+        :param name: string: unique name of step
+        :param func: callable: called with dict of results of required steps
+        :param requires: iterable: of names of steps which must succeed first
+        :return: string: name of step
+        """
+        if name in self._steps:
+            raise ValueError(f"Step {name} is already added")
+        self._steps[name] = Step(name, func, tuple(requires))
+        return name
+
+    def _run_step(self, step):
+        start_time = time.monotonic()
+        try:
+            return step.func(
+                {
+                    requirement: self.results[requirement]
+                    for requirement in step.requires
+                }
+            )
+        finally:
+            self.timings[step.name] = time.monotonic() - start_time
+
+    def _skip_unreachable(self, pending):
+        """
+        Removes steps, which require failed or skipped steps, from pending
+        """
+        skipped = True
+        while skipped:
+            skipped = False
+            for name, step in list(pending.items()):
+                if any(
+                    requirement in self.failures or requirement in self.skipped
+                    for requirement in step.requires
+                ):
+                    print(
+                        "Skipping step " + name + ", as it requires failed step"
+                    )
+                    self.skipped.append(name)
+                    del pending[name]
+                    skipped = True
+
+    def run(self):
+        """
+        :return: dict: of step name to its result
+        """
+        for step in self._steps.values():
+            for requirement in step.requires:
+                if requirement not in self._steps:
+                    raise ValueError(
+                        f"Step {step.name} requires unknown step {requirement}"
+                    )
+
+        pending = dict(self._steps)
+        running = {}
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="setup"
+        ) as executor:
+            while pending or running:
+                self._skip_unreachable(pending)
+                for name, step in list(pending.items()):
+                    if all(
+                        requirement in self.results
+                        for requirement in step.requires
+                    ):
+                        running[executor.submit(self._run_step, step)] = name
+                        del pending[name]
+
+                if not running:
+                    if pending:
+                        raise ValueError(
+                            "Steps have circular requirements: "
+                            + ", ".join(pending)
+                        )
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        print(f"Step {name} failed: {e}")
+                        self.failures[name] = e
+                    else:
+                        print(
+                            f"Step {name} finished in {self.timings[name]:.2f}s"
+                        )
+
+        return self.results
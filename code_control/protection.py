@@ -0,0 +1,141 @@
+import threading
+
+from github import GithubException
+
+# statuses GitHub returns, when write is rejected by branch protection
+PROTECTION_REJECTED = (409, 422)
+
+
+def protection_kwargs(protection):
+    """
+    Converts branch protection, as returned by GitHub, to arguments of
+    `github.Branch.Branch.edit_protection`, which set exactly this protection
+    :param protection: dict: raw data of branch protection
+    :return: dict
+    """
+    kwargs = {
+        "enforce_admins": bool(
+            (protection.get("enforce_admins") or {}).get("enabled")
+        )
+    }
+
+    status_checks = protection.get("required_status_checks")
+    if status_checks:
+        kwargs["strict"] = bool(status_checks.get("strict"))
+        kwargs["contexts"] = list(status_checks.get("contexts") or [])
+
+    reviews = protection.get("required_pull_request_reviews")
+    if reviews:
+        for key in (
+            "dismiss_stale_reviews",
+            "require_code_owner_reviews",
+            "required_approving_review_count",
+        ):
+            if reviews.get(key) is not None:
+                kwargs[key] = reviews[key]
+        dismissal = reviews.get("dismissal_restrictions")
+        if dismissal:
+            kwargs["dismissal_users"] = [
+                user["login"] for user in dismissal.get("users") or []
+            ]
+            kwargs["dismissal_teams"] = [
+                team["slug"] for team in dismissal.get("teams") or []
+            ]
+
+    restrictions = protection.get("restrictions")
+    if restrictions:
+        kwargs["user_push_restrictions"] = [
+            user["login"] for user in restrictions.get("users") or []
+        ]
+        kwargs["team_push_restrictions"] = [
+            team["slug"] for team in restrictions.get("teams") or []
+        ]
+    return kwargs
+
+
+class BranchProtectionBypass:
+    """
+    Scoped bypass of branch protection for a batch of writes.
+
+    Protection is snapshotted and lifted once, when the first write is
+    rejected, and the exact snapshot is restored when the outermost `with`
+    block exits, even if a write failed. Repositories, which don't reject
+    writes, cost no extra requests.
+    """
+
+    def __init__(self, repo, branch="master", enabled=True):
+        """
+        :param repo: obj: repository we're writing to
+        :param branch: str: protected branch
+        :param enabled: bool: whether protection may be lifted, when False
+         rejected writes are raised as is
+        """
+        self.repo = repo
+        self.branch = branch
+        self.enabled = enabled
+        self.snapshot = None
+        self.lifted = False
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        with self._lock:
+            self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self._lock:
+            self._depth -= 1
+            if self._depth == 0:
+                self.restore()
+
+    def lift(self):
+        """
+        Removes protection from branch, keeping its snapshot
+        :return: bool: whether writes may be retried
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self.lifted:
+                return True
+            branch = self.repo.get_branch(self.branch)
+            try:
+                self.snapshot = branch.get_protection().raw_data
+            except GithubException as e:
+                if e.status != 404:
+                    raise
+                self.snapshot = None
+            if self.snapshot is not None:
+                print(f"Lifting protection of {self.branch} branch")
+                branch.remove_protection()
+            self.lifted = True
+            return True
+
+    def restore(self):
+        """
+        Sets protection from snapshot back, if it was lifted
+        """
+        with self._lock:
+            if not self.lifted:
+                return
+            if self.snapshot is not None:
+                print(f"Restoring protection of {self.branch} branch")
+                self.repo.get_branch(self.branch).edit_protection(
+                    **protection_kwargs(self.snapshot)
+                )
+            self.snapshot = None
+            self.lifted = False
+
+    def write(self, func, *args, **kwargs):
+        """
+        Calls `func`, lifting protection and retrying once, if it was
+        rejected by protection
+        :return: result of `func`
+        """
+        try:
+            return func(*args, **kwargs)
+        except GithubException as e:
+            if e.status in PROTECTION_REJECTED and self.lift():
+                return func(*args, **kwargs)
+            raise
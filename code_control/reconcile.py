@@ -0,0 +1,276 @@
+from collections import namedtuple
+
+from github import GithubException
+
+from common import get_org, get_repo, get_teams
+from settings import SETTINGS
+
+from . import (
+    commit_repo_files,
+    configure_team,
+    create_team,
+    render_config_files,
+    set_master_branch_permissions,
+    set_repo_visibility,
+    setup,
+)
+from .templates import TEMPLATE_STORE, TemplateError
+
+RepoState = namedtuple(
+    "RepoState",
+    ["files", "teams", "team_permissions", "private", "branch_protection"],
+)
+RepoState.__doc__ = """
+Current state of config repository and its teams, read in one pass
+"""
+
+Change = namedtuple("Change", ["kind", "target", "current", "desired"])
+Change.__doc__ = """
+Single difference between current and desired state. `kind` is one of
+"file", "team", "team_attribute", "repo_permission", "visibility" or
+"branch_protection".
+"""
+
+# (team attributes from settings, permission of team on repository)
+MANAGED_TEAMS = (
+    (SETTINGS.STANDARD_TEAM_ATTRIBUTES, "pull"),
+    (SETTINGS.PRIV_TEAM_ATTRIBUTES, "push"),
+)
+
+
+def _branch_protection(repo, branch="master"):
+    """
+    :return: dict: with the same keys as `SETTINGS.PROTECTED_BRANCH` or None,
+     if branch isn't protected
+    """
+    try:
+        protection = repo.get_branch(branch).get_protection()
+    except GithubException as e:
+        if e.status == 404:
+            return None
+        raise
+
+    reviews = protection.required_pull_request_reviews
+    return {
+        "enforce_admins": protection.enforce_admins,
+        "dismiss_stale_reviews": (
+            reviews.dismiss_stale_reviews if reviews else None
+        ),
+        "require_code_owner_reviews": (
+            reviews.require_code_owner_reviews if reviews else None
+        ),
+        "required_approving_review_count": (
+            reviews.required_approving_review_count if reviews else None
+        ),
+    }
+
+
+def read_state(org, repo):
+    """
+    Reads everything `setup` manages with a fixed amount of requests. Teams
+    are fetched from API rather than from inventory, so drift is computed
+    from their current attributes.
+    :param org: obj: organisation of the repository
+    :param repo: obj: config repository, fetched from API as well
+    :return: obj: of :class:`RepoState`
+    """
+    try:
+        tree = repo.get_git_tree("master", recursive=True)
+        files = {
+            element.path: element.sha
+            for element in tree.tree
+            if element.type == "blob"
+        }
+    except GithubException as e:
+        # 409 is returned for empty repository
+        if e.status not in (404, 409):
+            raise
+        files = {}
+
+    team_names = [attributes["name"] for attributes, _ in MANAGED_TEAMS]
+    teams = get_teams(org, team_names + [SETTINGS.ADMIN_TEAM], live=True)
+    team_permissions = {team.slug: team.permission for team in repo.get_teams()}
+
+    return RepoState(
+        files, teams, team_permissions, repo.private, _branch_protection(repo)
+    )
+
+
+def plan_changes(state, files, branch_permissions):
+    """
+    Compares current state with desired one
+    :param state: obj: of :class:`RepoState`
+    :param files: dict: of path to desired str content
+    :param branch_permissions: dict: desired protection of master branch
+    :return: list: of :class:`Change` in order they should be applied
+    """
+    changes = []
+
+    for attributes, _ in MANAGED_TEAMS:
+        name = attributes["name"]
+        team = state.teams.get(name)
+        if team is None:
+            changes.append(Change("team", name, None, attributes["privacy"]))
+
+        current = {
+            "privacy": team.privacy if team else None,
+            "description": team.description if team else None,
+        }
+        desired = {
+            "privacy": attributes["privacy"],
+            "description": attributes["description"],
+        }
+        if attributes is SETTINGS.PRIV_TEAM_ATTRIBUTES:
+            parent = (team.raw_data.get("parent") or {}) if team else {}
+            current["parent"] = parent.get("slug")
+            desired["parent"] = SETTINGS.STANDARD_TEAM_ATTRIBUTES["name"]
+
+        for attribute, value in desired.items():
+            if current[attribute] != value:
+                changes.append(
+                    Change(
+                        "team_attribute",
+                        f"{name}.{attribute}",
+                        current[attribute],
+                        value,
+                    )
+                )
+
+    permissions = [
+        (attributes["name"], permission)
+        for attributes, permission in MANAGED_TEAMS
+    ]
+    if state.teams.get(SETTINGS.ADMIN_TEAM):
+        permissions.insert(0, (SETTINGS.ADMIN_TEAM, "admin"))
+    for name, permission in permissions:
+        current = state.team_permissions.get(name)
+        if current != permission:
+            changes.append(Change("repo_permission", name, current, permission))
+
+    for path, content in files.items():
+        desired = TEMPLATE_STORE.blob_sha(content)
+        current = state.files.get(path)
+        if current != desired:
+            changes.append(Change("file", path, current, desired))
+
+    if not state.private:
+        changes.append(Change("visibility", "private", state.private, True))
+
+    if branch_permissions and state.branch_protection != branch_permissions:
+        changes.append(
+            Change(
+                "branch_protection",
+                "master",
+                state.branch_protection,
+                branch_permissions,
+            )
+        )
+
+    return changes
+
+
+def format_change(change):
+    symbol = "+" if change.current is None else "~"
+    return (
+        f"{symbol} {change.kind} {change.target}: "
+        f"{change.current} -> {change.desired}"
+    )
+
+
+def apply_changes(org, repo, state, changes, files, parsed_args):
+    """
+    Issues only mutations required by changes
+    """
+    teams = dict(state.teams)
+    team_attributes = {
+        attributes["name"]: attributes for attributes, _ in MANAGED_TEAMS
+    }
+
+    for change in changes:
+        if change.kind == "team":
+            attributes = team_attributes[change.target]
+            teams[change.target] = create_team(
+                org,
+                attributes["name"],
+                attributes["permission"],
+                attributes["privacy"],
+            )
+
+    # attributes of each team are set with single request
+    team_updates = {}
+    for change in changes:
+        if change.kind == "team_attribute":
+            name, attribute = change.target.rsplit(".", 1)
+            if attribute == "parent":
+                team_updates.setdefault(name, {})["parent_team_id"] = teams[
+                    change.desired
+                ].id
+            else:
+                team_updates.setdefault(name, {})[attribute] = change.desired
+    for name, update in team_updates.items():
+        configure_team(org, teams[name], parsed_args.vcs_token, **update)
+
+    for change in changes:
+        if change.kind == "repo_permission":
+            teams[change.target].set_repo_permission(repo, change.desired)
+
+    changed_files = {
+        change.target: files[change.target]
+        for change in changes
+        if change.kind == "file"
+    }
+    if changed_files:
+        commit_repo_files(
+            repo,
+            changed_files,
+            "Update " + ", ".join(changed_files),
+            force=True,
+            bypass_protection=parsed_args.bypass_branch_protection,
+        )
+
+    if any(change.kind == "visibility" for change in changes):
+        set_repo_visibility(repo, "private")
+
+    # protection lifted to commit files is restored by commit_repo_files
+    if any(change.kind == "branch_protection" for change in changes):
+        set_master_branch_permissions(repo, parsed_args.branch_permissions)
+
+
+def reconcile(parsed_args):
+    """
+    Brings config repository to the state `setup` would, issuing only
+    mutations which are actually needed. With `plan` set only prints changes.
+    :param parsed_args: obj: arguments of config command
+    :return: bool: True
+    """
+    try:
+        files = render_config_files(parsed_args)
+    except TemplateError as e:
+        print(e)
+        exit(1)
+
+    org = get_org(parsed_args, parsed_args.config_org)
+    try:
+        repo = get_repo(org, parsed_args.config_repo, live=True)
+    except GithubException as e:
+        if e.status != 404:
+            raise
+        if parsed_args.plan:
+            print(f"+ repository {parsed_args.config_repo}")
+            return True
+        return setup(parsed_args)
+
+    state = read_state(org, repo)
+    changes = plan_changes(state, files, parsed_args.branch_permissions)
+
+    if not changes:
+        print(f"Repository {parsed_args.config_repo} is up to date")
+        return True
+
+    print(f"Changes of repository {parsed_args.config_repo}:")
+    for change in changes:
+        print(format_change(change))
+
+    if not parsed_args.plan:
+        apply_changes(org, repo, state, changes, files, parsed_args)
+    return True
@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from collections import namedtuple
+
+SnapshotChange = namedtuple("SnapshotChange", ["key", "status", "fields"])
+SnapshotChange.__doc__ = """
+Difference of one record between two snapshots. `status` is one of "added",
+"removed" or "changed", `fields` lists top level keys of changed record data.
+"""
+
+# appends of concurrent setups to the same snapshot are serialised
+_WRITE_LOCKS = {}
+_WRITE_LOCKS_LOCK = threading.Lock()
+
+
+def _write_lock(path):
+    with _WRITE_LOCKS_LOCK:
+        return _WRITE_LOCKS.setdefault(
+            os.path.abspath(str(path)), threading.Lock()
+        )
+
+
+def _open(path, mode):
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _dumps(record):
+    return json.dumps(record, separators=(",", ":"), sort_keys=True)
+
+
+def repo_record(project_id, repo, teams=()):
+    """
+    :param project_id: str: project the repository belongs to or None
+    :param repo: obj: github.Repository.Repository
+    :param teams: iterable: of github.Team.Team with access to repository, as
+     listed by `github.Repository.Repository.get_teams`
+    :return: dict: with permission of every team on repository
+    """
+    return {
+        "key": "repo:" + repo.full_name,
+        "kind": "repo",
+        "project_id": project_id,
+        "teams": {team.slug: team.raw_data.get("permission") for team in teams},
+        "data": repo.raw_data,
+    }
+
+
+def team_record(team):
+    """
+    Permission of team on repository it was listed for is kept in repository
+    record, so team record is the same whatever repository it came from
+    """
+    return {
+        "key": "team:" + team.slug,
+        "kind": "team",
+        "data": {
+            key: value
+            for key, value in team.raw_data.items()
+            if key != "permission"
+        },
+    }
+
+
+class SnapshotWriter:
+    """
+    Writes records to JSON Lines snapshot one by one, so memory doesn't grow
+    with amount of exported repositories. Snapshot is gzip compressed, when
+    its path ends with ".gz". Appending to gzip snapshot adds new gzip member,
+    which is read back as the same stream.
+    """
+
+    def __init__(self, path, append=False):
+        """
+        :param path: path: of snapshot file
+        :param append: bool: whether to add records to existing snapshot
+        """
+        self.path = path
+        self.append = append
+        self.records = 0
+        self._file = None
+        self._lock = _write_lock(path)
+
+    def __enter__(self):
+        directory = os.path.dirname(os.path.abspath(str(self.path)))
+        os.makedirs(directory, exist_ok=True)
+        self._lock.acquire()
+        try:
+            self._file = _open(self.path, "a" if self.append else "w")
+        except Exception:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self._file.close()
+        finally:
+            self._file = None
+            self._lock.release()
+
+    def write(self, record):
+        self._file.write(_dumps(record) + "\n")
+        self.records += 1
+
+
+def read_snapshot(path):
+    """
+    Records of the same key may repeat in appended snapshot, the last one is
+    current.
+    :param path: path: of JSON Lines snapshot, gzip compressed or not
+    :return: generator: of records
+    """
+    with _open(path, "r") as snapshot:
+        for line in snapshot:
+            if line.strip():
+                yield json.loads(line)
+
+
+def export_repos(repos, path, project_id=None):
+    """
+    Streams repositories, their teams and teams themselves to snapshot. Each
+    team is written once, whatever amount of repositories it has access to.
+    :param repos: iterable: of github.Repository.Repository, e.g. paginated
+     listing of organisation repositories
+    :param path: path: of snapshot file
+    :param project_id: str: project of all repositories, if known
+    :return: int: amount of written records
+    """
+    seen_teams = set()
+    with SnapshotWriter(path) as writer:
+        for repo in repos:
+            teams = list(repo.get_teams())
+            writer.write(repo_record(project_id, repo, teams))
+            for team in teams:
+                if team.slug not in seen_teams:
+                    seen_teams.add(team.slug)
+                    writer.write(team_record(team))
+    return writer.records
+
+
+def _digests(path):
+    """
+    :return: dict: of record key to hash of record, so snapshots are compared
+     without keeping their records in memory
+    """
+    return {
+        record["key"]: hashlib.sha1(_dumps(record).encode("utf-8")).digest()
+        for record in read_snapshot(path)
+    }
+
+
+def diff_snapshots(old_path, new_path):
+    """
+    Compares two snapshots. Only hashes of records and changed records are
+    kept in memory.
+    :param old_path: path: of previous snapshot
+    :param new_path: path: of current snapshot
+    :return: list: of :class:`SnapshotChange` ordered by key
+    """
+    old = _digests(old_path)
+    new = _digests(new_path)
+    changed = {key for key in old.keys() & new.keys() if old[key] != new[key]}
+
+    def changed_records(path):
+        return {
+            record["key"]: record
+            for record in read_snapshot(path)
+            if record["key"] in changed
+        }
+
+    old_records = changed_records(old_path)
+    new_records = changed_records(new_path)
+
+    changes = [
+        SnapshotChange(key, "added", []) for key in new.keys() - old.keys()
+    ]
+    changes += [
+        SnapshotChange(key, "removed", []) for key in old.keys() - new.keys()
+    ]
+    for key in changed:
+        old_record, new_record = old_records[key], new_records[key]
+        old_data, new_data = old_record["data"], new_record["data"]
+        fields = {
+            field
+            for field in old_data.keys() | new_data.keys()
+            if old_data.get(field) != new_data.get(field)
+        }
+        fields.update(
+            field
+            for field in ("project_id", "teams")
+            if old_record.get(field) != new_record.get(field)
+        )
+        changes.append(SnapshotChange(key, "changed", sorted(fields)))
+    return sorted(changes)
+
+
+def format_snapshot_change(change):
+    symbol = {"added": "+", "removed": "-", "changed": "~"}[change.status]
+    fields = f": {', '.join(change.fields)}" if change.fields else ""
+    return f"{symbol} {change.key}{fields}"
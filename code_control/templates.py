@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+
+from collections import OrderedDict, namedtuple
+
+from common import git_blob_sha
+from settings import SETTINGS
+
+RenderedFile = namedtuple("RenderedFile", ["content", "data", "sha"])
+RenderedFile.__doc__ = """
+Rendered template as str `content`, its utf-8 encoded `data` and git blob
+hash of data
+"""
+
+
+class TemplateError(Exception):
+    pass
+
+
+class TemplateStore:
+    """
+    In-memory store of config file templates.
+
+    Every template is read from disk and validated once. JSON templates are
+    parsed once too, and rendered by updating copy of parsed base with
+    per-project values. Up to `max_renders` rendered files are memoized
+    together with their blob hashes, so repeated renders do no file I/O nor
+    hashing, while memory of bulk runs stays bounded.
+    """
+
+    def __init__(self, max_renders=None):
+        self.max_renders = max_renders or SETTINGS.TEMPLATE_MAX_RENDERS
+        self._lock = threading.Lock()
+        self._templates = {}
+        self._rendered = OrderedDict()
+        self._hashes = {}
+        self.loads = 0
+
+    def _load(self, path):
+        """
+        :return: tuple: of template text and parsed JSON or None
+        """
+        try:
+            with open(path, "r") as template_file:
+                text = template_file.read()
+        except (OSError, UnicodeDecodeError) as e:
+            raise TemplateError(f"Can't read template {path}: {e}")
+
+        parsed = None
+        if os.path.splitext(str(path))[-1].lower() == ".json":
+            try:
+                parsed = json.loads(text)
+            except ValueError as e:
+                raise TemplateError(f"Template {path} isn't valid JSON: {e}")
+            if not isinstance(parsed, dict):
+                raise TemplateError(f"Template {path} should be JSON object")
+        self.loads += 1
+        return text, parsed
+
+    def _template(self, path):
+        path = str(path)
+        with self._lock:
+            template = self._templates.get(path)
+        if template is None:
+            template = self._load(path)
+            with self._lock:
+                template = self._templates.setdefault(path, template)
+        return template
+
+    def preload(self, paths):
+        """
+        Loads and validates templates, so errors are reported before any
+        project is set up
+        :param paths: iterable: of template paths
+        """
+        for path in paths:
+            self._template(path)
+
+    def render(self, path, **values):
+        """
+        :param path: path: to template
+        :param values: key value pairs to set in JSON template
+        :return: obj: of :class:`RenderedFile`
+        """
+        key = (str(path), tuple(sorted(values.items())))
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                self._rendered.move_to_end(key)
+        if rendered is not None:
+            return rendered
+
+        text, parsed = self._template(path)
+        if values and parsed is None:
+            raise TemplateError(f"Only JSON template {path} accepts values")
+        if values:
+            text = json.dumps(dict(parsed, **values), indent=2)
+
+        data = text.encode("utf-8")
+        rendered = RenderedFile(text, data, git_blob_sha(data))
+        with self._lock:
+            self._rendered[key] = rendered
+            self._hashes[text] = rendered.sha
+            while len(self._rendered) > self.max_renders:
+                _, evicted = self._rendered.popitem(last=False)
+                self._hashes.pop(evicted.content, None)
+        return rendered
+
+    def blob_sha(self, content):
+        """
+        Git blob hash of str content, taken from memoized renders if possible
+        :param content: str: content of file
+        :return: string
+        """
+        with self._lock:
+            sha = self._hashes.get(content)
+        if sha is None:
+            sha = git_blob_sha(content.encode("utf-8"))
+        return sha
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+            self._rendered.clear()
+            self._hashes.clear()
+            self.loads = 0
+
+
+TEMPLATE_STORE = TemplateStore()
@@ -3,11 +3,34 @@ import argparse
 import os
 import json
 
-from github import Github
+from github import GithubException
 from httplib2 import Http
 
 from settings import SETTINGS
 
+from .clients import CLIENT_REGISTRY, HTTP_CACHE, GithubClientRegistry
+from .http_cache import HttpCache
+from .blob_cache import BlobCache, BlobCacheError, git_blob_sha
+from .repo_files import (
+    RepoFile,
+    get_content_files,
+    get_tree_files,
+    resolve_commit_sha,
+)
+from .refs import REF_CACHE, RefCache, resolve_ref
+from .archive import ArchiveError, get_archive_files
+from .local_git import LocalGitError, LocalGitMirrors, LocalGitRepo
+from .inventory import INVENTORY, OrgInventory
+from .teams import TEAM_INDEX, TeamIndex
+from .scheduler import REQUEST_SCHEDULER, RequestScheduler
+from .sessions import REST_SESSION, RestSession
+
+
+BLOB_CACHE = BlobCache(SETTINGS.BLOB_CACHE_DIR, SETTINGS.BLOB_CACHE_MAX_SIZE)
+LOCAL_GIT_MIRRORS = LocalGitMirrors(
+    SETTINGS.LOCAL_GIT_MIRROR_DIR, SETTINGS.LOCAL_GIT_FETCH_INTERVAL
+)
+
 
 class ProjectIdFormatError(Exception):
     pass
@@ -32,6 +55,12 @@ def root_parser():
         help="URL to GitHub API",
         default=SETTINGS.DEFAULT_GITHUB_API_URL,
     )
+    parser.add_argument(
+        "--git-remote-url",
+        help="URL template of repositories mirrored by local-git VCS platform"
+        ", {org} and {repo} are substituted, e.g. file:///srv/git/{org}/{repo}",
+        default=SETTINGS.DEFAULT_GIT_REMOTE_URL,
+    )
     parser.add_argument(
         "--code-org",
         "-o",
@@ -109,6 +138,15 @@ def root_parser():
         "-sc",
         help="Name of channel, where notifications will go",
     )
+    parser.add_argument(
+        "--fetch-mode",
+        help="how files are pulled from code and config repositories\n"
+        "contents: one request per file of the cloud directory\n"
+        "tree: whole cloud directory subtree in a few bulk requests\n"
+        "archive: whole cloud directory subtree from one streamed tarball",
+        choices=SETTINGS.SUPPORTED_FETCH_MODES,
+        default=SETTINGS.DEFAULT_FETCH_MODE,
+    )
     parser.add_argument(
         "--vcs-platform",
         choices=["all"] + SETTINGS.SUPPORTED_VCS_PLATFORMS,
@@ -180,30 +218,70 @@ class GcpAuth:
 
 
 def get_org(parsed_args, org):
-    github = Github(
-        base_url=parsed_args.api_url, login_or_token=parsed_args.vcs_token
+    """
+    Get organisation through the client shared by all callers using the same
+    API URL and token
+    :param parsed_args: object: which contains `api_url` and `vcs_token`
+    :param org: string: name of the organisation
+    :return: obj: github.Organization.Organization, or
+     :class:`common.local_git.LocalGitOrg` for local-git VCS platform
+    """
+    if getattr(parsed_args, "vcs_platform", "github") == "local-git":
+        return LOCAL_GIT_MIRRORS.get_org(
+            parsed_args.git_remote_url, parsed_args.vcs_token, org
+        )
+    return CLIENT_REGISTRY.get_org(
+        parsed_args.api_url, parsed_args.vcs_token, org
     )
-    return github.get_organization(org)
 
 
-def get_repo(org, name=SETTINGS.DEFAULT_PROJECT_ID):
-    return org.get_repo(name)
+def get_repo(org, name=SETTINGS.DEFAULT_PROJECT_ID, live=False):
+    """
+    Repository is served from `INVENTORY`, when organisation was refreshed
+    recently, otherwise it's fetched from API
+    :param org: obj: of the organisation to search
+    :param name: string: name of the repository
+    :param live: bool: whether to fetch repository from API even when it's
+     indexed, for callers which compare its attributes with desired ones
+    :return: obj: github.Repository.Repository
+    """
+    repo = None if live else INVENTORY.get_repo(org, name)
+    if repo is None:
+        try:
+            repo = org.get_repo(name)
+        except GithubException as e:
+            if e.status == 404:
+                INVENTORY.forget_repo(org, name)
+            raise
+        INVENTORY.record_repo(org, repo)
+    return repo
 
 
 def get_team(org, team_name):
     """
-    returns team from org by searching the name
+    returns team from org by its slug
     :param org: obj: of the organisation to search
     :param team_name: string: name of the team to return
     :return: obj: github.Team.Team
     """
-    for team in org.get_teams():
-        if team.slug == team_name:
-            return team
-    return None
+    return TEAM_INDEX.get(org, team_name)
+
+
+def get_teams(org, team_names, live=False):
+    """
+    returns many teams from org in one pass
+    :param org: obj: of the organisation to search
+    :param team_names: list: of names of the teams to return
+    :param live: bool: whether to fetch teams from API even when they're
+     indexed
+    :return: dict: of team name to github.Team.Team or None
+    """
+    return TEAM_INDEX.get_many(org, team_names, live)
 
 
-def get_files(org, repo_name, directory, version):
+def get_files(
+    org, repo_name, directory, version, fetch_mode=SETTINGS.DEFAULT_FETCH_MODE
+):
     """
     Get a list of the files from given repository
     :param org: object: of :class:`github.Organization.Organization`
@@ -211,10 +289,33 @@ def get_files(org, repo_name, directory, version):
      files are located
     :param directory: string: of directory in reposo
     :param version: string : branch or tag of repo
-    :return: list :class:`github.ContentFile.ContentFile`
+    :param fetch_mode: string: one of `SETTINGS.SUPPORTED_FETCH_MODES`
+    :return: list :class:`common.RepoFile`
     """
     repo = get_repo(org, repo_name)
-    return repo.get_dir_contents(directory, version)
+    return get_repo_files(repo, directory, version, fetch_mode)
+
+
+def get_repo_files(
+    repo, directory, version, fetch_mode=SETTINGS.DEFAULT_FETCH_MODE
+):
+    """
+    Same as `get_files`, but for already resolved repository
+    :param repo: object: of :class:`github.Repository.Repository`
+    :param directory: string: of directory in repo
+    :param version: string : branch, tag or commit sha of repo, pass commit
+     sha to pin reads to it
+    :param fetch_mode: string: one of `SETTINGS.SUPPORTED_FETCH_MODES`,
+     ignored for local-git mirrors
+    :return: list :class:`common.RepoFile`
+    """
+    if isinstance(repo, LocalGitRepo):
+        return repo.get_files(directory, version)
+    if fetch_mode == "tree":
+        return get_tree_files(repo, directory, version, BLOB_CACHE)
+    if fetch_mode == "archive":
+        return get_archive_files(repo, directory, version)
+    return get_content_files(repo, directory, version, BLOB_CACHE)
 
 
 def get_hash_of_latest_commit(org, repo_name, branch):
@@ -227,8 +328,21 @@ def get_hash_of_latest_commit(org, repo_name, branch):
     :return: sha256 hash string
     """
     repo = get_repo(org, repo_name)
-    branch = repo.get_branch(branch)
-    return branch.commit.sha
+    return get_latest_commit_hash(repo, branch)
+
+
+def get_latest_commit_hash(repo, branch):
+    """
+    Same as `get_hash_of_latest_commit`, but for already resolved repository.
+    Branch is resolved through `REF_CACHE`, so repeated calls within its TTL
+    don't hit API.
+    :param repo: object: of :class:`github.Repository.Repository`
+    :param branch: string : name of the git branch
+    :return: sha256 hash string
+    """
+    if isinstance(repo, LocalGitRepo):
+        return repo.resolve(branch)
+    return resolve_ref(repo, branch)
 
 
 def valid_project_id_format(project_id):
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+
+from pathlib import Path
+
+from settings import SETTINGS
+
+from .refs import resolve_ref
+from .repo_files import RepoFile, _directory_not_found
+from .sessions import REST_SESSION
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _member_path(member_name, directory):
+    """
+    Strips top-level `<owner>-<repo>-<sha>` directory of GitHub archive
+    member, and returns path relative to repository root, if member is
+    located under requested directory.
+    :return: string or None
+    """
+    parts = member_name.split("/", 1)
+    if len(parts) != 2:
+        return None
+
+    path = posixpath.normpath(parts[1])
+    if path.startswith(("/", "../")) or path == "..":
+        raise ArchiveError(f"Unsafe path in archive: {member_name}")
+
+    if not path.startswith(directory.strip("/") + "/"):
+        return None
+    return path
+
+
+def _extract_member(tar, member, destination):
+    """
+    Copies content of archive member to destination by chunks, calculating
+    its git blob hash on the fly.
+    :return: string: git blob hash
+    """
+    blob_hash = hashlib.sha1(f"blob {member.size}\0".encode())
+    os.makedirs(destination.parent, exist_ok=True)
+    with tar.extractfile(member) as source, open(destination, "wb") as target:
+        chunk = source.read(SETTINGS.ARCHIVE_CHUNK_SIZE)
+        while chunk:
+            blob_hash.update(chunk)
+            target.write(chunk)
+            chunk = source.read(SETTINGS.ARCHIVE_CHUNK_SIZE)
+    return blob_hash.hexdigest()
+
+
+def download_archive(repo, directory, sha, destination):
+    """
+    Streams tarball of repository at commit and extracts only files under
+    directory. Archive is never held in memory or written to disk as whole.
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :param directory: string: directory in repository
+    :param sha: string: commit hash
+    :param destination: path: directory to extract files into
+    :return: dict: of file path relative to repository root to blob hash
+    """
+    url = repo.get_archive_link("tarball", sha)
+    blobs = {}
+
+    with REST_SESSION.get(
+        url, stream=True, timeout=SETTINGS.ARCHIVE_DOWNLOAD_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                path = _member_path(member.name, directory)
+                if path is None:
+                    continue
+                blobs[path] = _extract_member(
+                    tar, member, Path(destination) / path
+                )
+
+    return blobs
+
+
+def _write_index(index_file, blobs):
+    # index marks complete extraction, so it must never be seen half written
+    fd, tmp_path = tempfile.mkstemp(prefix=".", dir=index_file.parent)
+    try:
+        with os.fdopen(fd, "w") as index:
+            json.dump(blobs, index)
+        os.replace(tmp_path, index_file)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def prune_archives(repo_dir, keep):
+    """
+    Removes extracted commits of repository, except `keep` most recently used
+    :param repo_dir: path: directory with extracted commits of repository
+    :param keep: int: amount of commits to keep
+    :return: int: amount of removed commits
+    """
+    commits = []
+    for commit_dir in Path(repo_dir).iterdir():
+        if commit_dir.name.startswith(".") or not commit_dir.is_dir():
+            continue
+        try:
+            commits.append((commit_dir.stat().st_mtime, commit_dir))
+        except FileNotFoundError:
+            continue
+
+    commits.sort(reverse=True)
+    for _, commit_dir in commits[keep:]:
+        shutil.rmtree(commit_dir, ignore_errors=True)
+    return max(len(commits) - keep, 0)
+
+
+def get_archive_files(repo, directory, version):
+    """
+    Fetches all files under directory with single streamed archive download.
+    Files are extracted once per commit into `SETTINGS.ARCHIVE_DIR` and are
+    copied from there by deployer, so their content isn't kept in memory.
+    Only `SETTINGS.ARCHIVE_KEEP_COMMITS` most recently used commits of each
+    repository are kept.
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :param directory: string: directory in repository
+    :param version: string: branch, tag or commit sha
+    :return: list of :class:`RepoFile`
+    :raises: :class:`github.UnknownObjectException` if directory doesn't exist
+    """
+    sha = resolve_ref(repo, version)
+    repo_dir = Path(SETTINGS.ARCHIVE_DIR) / repo.full_name.replace("/", "-")
+    commit_dir = repo_dir / sha
+    archive_dir = commit_dir / directory.strip("/")
+    index_file = archive_dir.with_suffix(".json")
+
+    if not index_file.is_file():
+        os.makedirs(archive_dir.parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".", dir=archive_dir.parent)
+        try:
+            blobs = download_archive(repo, directory, sha, tmp_dir)
+            tmp_archive_dir = Path(tmp_dir) / directory.strip("/")
+            if tmp_archive_dir.is_dir() and not archive_dir.is_dir():
+                os.replace(tmp_archive_dir, archive_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        if not blobs:
+            # never remember missing directory, empty list of files would
+            # make deployer destroy everything
+            raise _directory_not_found(directory)
+
+        # index is written last, so it's present only for complete extraction
+        _write_index(index_file, blobs)
+        prune_archives(repo_dir, SETTINGS.ARCHIVE_KEEP_COMMITS)
+    else:
+        # mark commit as recently used
+        os.utime(commit_dir)
+
+    with open(index_file, "r") as index:
+        blobs = json.load(index)
+
+    return [
+        RepoFile(
+            posixpath.basename(path),
+            path,
+            blob_sha,
+            None,
+            commit_dir / path,
+        )
+        for path, blob_sha in sorted(blobs.items())
+    ]
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from pathlib import Path
+
+
+class BlobCacheError(Exception):
+    pass
+
+
+def git_blob_sha(content):
+    """
+    Calculates hash of content the same way as `git hash-object` does
+    :param content: bytes: content of file
+    :return: string: hex digest of git blob
+    """
+    header = f"blob {len(content)}\0".encode()
+    return hashlib.sha1(header + content).hexdigest()
+
+
+class BlobCache:
+    """
+    On-disk content-addressed storage of git blobs.
+
+    Blobs are stored by their git hash, so once downloaded blob never has to
+    be fetched again, whatever repository, branch or path it came from.
+    When total size of the cache exceeds `max_size`, least recently used
+    blobs are evicted.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _blob_path(self, sha):
+        return self.directory / sha[:2] / sha[2:]
+
+    def __contains__(self, sha):
+        return self._blob_path(sha).is_file()
+
+    def get(self, sha):
+        """
+        Returns content of cached blob or None, if it's not cached yet
+        :param sha: string: git blob hash
+        :return: bytes or None
+        """
+        content = self._read(sha)
+        if content is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return content
+
+    def _read(self, sha):
+        """
+        Reads cached blob, verifying that it still matches its hash. Blob
+        that was corrupted on disk is removed and treated as not cached.
+        :param sha: string: git blob hash
+        :return: bytes or None
+        """
+        blob_path = self._blob_path(sha)
+        try:
+            with open(blob_path, "rb") as blob:
+                content = blob.read()
+        except FileNotFoundError:
+            return None
+
+        if git_blob_sha(content) != sha:
+            try:
+                os.remove(blob_path)
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self._size = None
+            return None
+
+        self._touch(blob_path)
+        return content
+
+    def put(self, sha, content):
+        """
+        Stores blob content, verifying that it matches given hash
+        :param sha: string: git blob hash
+        :param content: bytes: content of blob
+        """
+        if git_blob_sha(content) != sha:
+            raise BlobCacheError(f"Content doesn't match blob {sha}")
+
+        blob_path = self._blob_path(sha)
+        if blob_path.is_file():
+            self._touch(blob_path)
+            return
+
+        # cache lives in shared temporary directory by default, so keep it
+        # private to current user
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        os.makedirs(blob_path.parent, mode=0o700, exist_ok=True)
+        # write to temporary file first, so concurrent readers never see
+        # partially written blob
+        fd, tmp_path = tempfile.mkstemp(prefix=".", dir=blob_path.parent)
+        with os.fdopen(fd, "wb") as blob:
+            blob.write(content)
+        os.replace(tmp_path, blob_path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(content)
+            if self._size > self.max_size:
+                self._evict()
+
+    def copy_to(self, sha, destination):
+        """
+        Copies cached blob to destination path
+        :param sha: string: git blob hash
+        :param destination: path where blob should be written
+        :return: bool: whether blob was cached and copied
+        """
+        content = self._read(sha)
+        if content is None:
+            return False
+
+        with open(destination, "wb") as copy:
+            copy.write(content)
+        return True
+
+    @staticmethod
+    def _touch(blob_path):
+        try:
+            os.utime(blob_path)
+        except FileNotFoundError:
+            # blob could be evicted by another process meanwhile
+            pass
+
+    def _blobs(self):
+        if not self.directory.is_dir():
+            return []
+        return [
+            path
+            for path in self.directory.glob("??/*")
+            if not path.name.startswith(".") and path.is_file()
+        ]
+
+    def _scan_size(self):
+        return sum(path.stat().st_size for path in self._blobs())
+
+    def _evict(self):
+        """
+        Removes least recently used blobs until cache fits into `max_size`
+        """
+        blobs = []
+        for path in self._blobs():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(blob_size for _, blob_size, _ in blobs)
+        for _, blob_size, path in sorted(blobs):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= blob_size
+
+        self._size = size
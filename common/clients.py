@@ -0,0 +1,112 @@
+import threading
+
+from github import Github
+
+from settings import SETTINGS
+
+from .http_cache import HttpCache, install_http_cache
+from .scheduler import REQUEST_SCHEDULER
+
+HTTP_CACHE = HttpCache(
+    SETTINGS.GITHUB_HTTP_CACHE_DIR, SETTINGS.GITHUB_HTTP_CACHE_MAX_SIZE
+)
+
+
+class GithubClientRegistry:
+    """
+    Process-wide registry of GitHub clients.
+
+    One `github.Github` client is kept per `(api_url, token)` pair, so every
+    caller shares its persistent HTTP connection instead of opening new ones,
+    and every organisation object is resolved only once per run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._orgs = {}
+        self.created_clients = 0
+        self.reused_clients = 0
+        self.resolved_orgs = 0
+        self.reused_orgs = 0
+
+    def get_client(self, api_url, token):
+        """
+        Returns shared client for given API URL and token, creating it on
+        first use.
+        :param api_url: string: URL to GitHub API
+        :param token: string: authentication token
+        :return: obj: github.Github
+        """
+        key = (api_url, token)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.reused_clients += 1
+                return client
+
+            # connection classes are picked when client is created, and they
+            # are installed even without cache, so every request is scheduled
+            install_http_cache(
+                HTTP_CACHE if SETTINGS.GITHUB_HTTP_CACHE_ENABLED else None,
+                REQUEST_SCHEDULER,
+            )
+            client = Github(
+                base_url=api_url,
+                login_or_token=token,
+                per_page=SETTINGS.GITHUB_PER_PAGE,
+            )
+            self._clients[key] = client
+            self.created_clients += 1
+            return client
+
+    def get_org(self, api_url, token, org_name):
+        """
+        Returns organisation object, fetching it from API only once per
+        `(api_url, token, org_name)`.
+        :return: obj: github.Organization.Organization
+        """
+        key = (api_url, token, org_name)
+        with self._lock:
+            org = self._orgs.get(key)
+            if org is not None:
+                self.reused_orgs += 1
+                return org
+
+        org = self.get_client(api_url, token).get_organization(org_name)
+
+        with self._lock:
+            # another thread could resolve same organisation meanwhile
+            org = self._orgs.setdefault(key, org)
+            self.resolved_orgs += 1
+        return org
+
+    @property
+    def reused_connections(self):
+        """
+        Number of times an already connected client was handed out instead of
+        creating new one.
+        """
+        return self.reused_clients + self.reused_orgs
+
+    @property
+    def stats(self):
+        return {
+            "created_clients": self.created_clients,
+            "reused_clients": self.reused_clients,
+            "resolved_orgs": self.resolved_orgs,
+            "reused_orgs": self.reused_orgs,
+            "reused_connections": self.reused_connections,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._orgs.clear()
+            self.created_clients = 0
+            self.reused_clients = 0
+            self.resolved_orgs = 0
+            self.reused_orgs = 0
+
+
+CLIENT_REGISTRY = GithubClientRegistry()
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+from pathlib import Path
+
+import requests
+
+from github.Requester import Requester
+
+# resources addressed by full commit, tree or blob hash never change
+_IMMUTABLE_URL_RE = re.compile(
+    r"/(?:git/(?:trees|blobs|commits)|commits)/[0-9a-f]{40}(?:[?#]|$)"
+    r"|[?&]ref=[0-9a-f]{40}(?:&|$)"
+)
+
+
+class HttpCache:
+    """
+    Disk-backed cache of GitHub API responses.
+
+    Responses are stored with their `ETag` and `Last-Modified` values, which
+    are sent back in `If-None-Match` and `If-Modified-Since` headers of next
+    request for the same URL. GitHub answers such request with `304 Not
+    Modified` when resource didn't change, and these responses are not
+    counted against rate limit. Responses pinned to commit hash are served
+    without revalidation at all. When total size of the cache exceeds
+    `max_size`, least recently used responses are evicted.
+    """
+
+    def __init__(self, directory, max_size=None):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size = None
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def key(url, headers):
+        """
+        Responses depend on URL, credentials and requested media type, so all
+        of them form cache key. Token itself is never stored.
+        :param url: string: full URL including protocol, host and port, so
+         responses of different GitHub hosts never collide
+        :param headers: dict: request headers
+        """
+        key_parts = [
+            url,
+            headers.get("Authorization", ""),
+            headers.get("Accept", ""),
+        ]
+        return hashlib.sha256("\n".join(key_parts).encode()).hexdigest()
+
+    @staticmethod
+    def is_immutable(url):
+        """
+        :param url: string: requested URL
+        :return: bool: True, if URL points to resource addressed by hash
+        """
+        return bool(_IMMUTABLE_URL_RE.search(url))
+
+    def _entry_path(self, key):
+        return self.directory / key[:2] / key
+
+    def get(self, key):
+        """
+        :param key: string: cache key, see `HttpCache.key`
+        :return: dict: cached entry or None
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r") as entry_file:
+                entry = json.load(entry_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        self._touch(entry_path)
+        return entry
+
+    def put(self, key, status, headers, body):
+        """
+        Stores response, if it has any validator to revalidate it with
+        :param key: string: cache key, see `HttpCache.key`
+        :param status: int: status of response
+        :param headers: dict: response headers
+        :param body: string: response body
+        """
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if not etag and not last_modified:
+            return
+
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "status": status,
+            "headers": headers,
+            "body": body,
+        }
+        entry_path = self._entry_path(key)
+        os.makedirs(entry_path.parent, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".", dir=entry_path.parent)
+        with os.fdopen(fd, "w") as entry_file:
+            json.dump(entry, entry_file)
+            entry_size = entry_file.tell()
+        os.replace(tmp_path, entry_path)
+
+        with self._lock:
+            self.stores += 1
+            if self.max_size is None:
+                return
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += entry_size
+            if self._size > self.max_size:
+                self._evict()
+
+    @staticmethod
+    def _touch(entry_path):
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # entry could be evicted by another process meanwhile
+            pass
+
+    def _entries(self):
+        if not self.directory.is_dir():
+            return []
+        return [
+            path
+            for path in self.directory.glob("??/*")
+            if not path.name.startswith(".") and path.is_file()
+        ]
+
+    def _scan_size(self):
+        return sum(path.stat().st_size for path in self._entries())
+
+    def _evict(self):
+        """
+        Removes least recently used entries until cache fits into `max_size`
+        """
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+        self._size = size
+
+    def record(self, hit):
+        with self._lock:
+            self.requests += 1
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+        }
+
+
+class CachedResponse:
+    """
+    Mimics response object, which `github.Requester.Requester` reads status,
+    headers and body from.
+    """
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def getheaders(self):
+        return iter(self.headers.items())
+
+    def read(self):
+        return self.body
+
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _get_session(protocol, host, port, retry=None):
+    """
+    Sessions are shared between connections to the same host, so HTTP
+    connections are kept alive, even though PyGithub creates new connection
+    object for each request when connection classes are injected.
+    """
+    key = (protocol, host, port)
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = _SESSIONS[key] = requests.Session()
+            if retry:
+                adapter = requests.adapters.HTTPAdapter(max_retries=retry)
+                session.mount(f"{protocol}://", adapter)
+        return session
+
+
+class CachingHTTPSConnection:
+    """
+    Replacement of PyGithub connection class, that revalidates GET requests
+    through `HttpCache` and sends all requests through `RequestScheduler`.
+    """
+
+    protocol = "https"
+    default_port = 443
+    cache = None
+    scheduler = None
+
+    def __init__(
+        self, host, port=None, strict=False, timeout=None, retry=None, **kwargs
+    ):
+        self.host = host
+        self.port = port if port else self.default_port
+        self.timeout = timeout
+        self.verify = kwargs.get("verify", True)
+        self.session = _get_session(self.protocol, self.host, self.port, retry)
+        self.verb = None
+        self.url = None
+        self.input = None
+        self.headers = None
+
+    def request(self, verb, url, input, headers):
+        self.verb = verb
+        self.url = url
+        self.input = input
+        self.headers = headers
+
+    @property
+    def full_url(self):
+        return f"{self.protocol}://{self.host}:{self.port}{self.url}"
+
+    def _send(self, headers):
+        url = self.full_url
+
+        def send_request():
+            return self.session.request(
+                self.verb,
+                url,
+                headers=headers,
+                data=self.input,
+                timeout=self.timeout,
+                verify=self.verify,
+                allow_redirects=False,
+            )
+
+        if self.scheduler is None:
+            return send_request()
+        return self.scheduler.send(send_request)
+
+    def getresponse(self):
+        cache = self.cache
+        if cache is None or self.verb != "GET":
+            response = self._send(self.headers)
+            return CachedResponse(
+                response.status_code, dict(response.headers), response.text
+            )
+
+        key = cache.key(self.full_url, self.headers)
+        entry = cache.get(key)
+
+        if entry and entry["status"] == 200 and cache.is_immutable(self.url):
+            cache.record(hit=True)
+            return CachedResponse(
+                entry["status"], entry["headers"], entry["body"]
+            )
+
+        headers = dict(self.headers)
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self._send(headers)
+        response_headers = {k.lower(): v for k, v in response.headers.items()}
+
+        if entry and response.status_code == 304:
+            cache.record(hit=True)
+            # fresh rate limit headers are taken from 304 response
+            cached_headers = dict(entry["headers"])
+            cached_headers.update(response_headers)
+            return CachedResponse(
+                entry["status"], cached_headers, entry["body"]
+            )
+
+        cache.record(hit=False)
+        if response.status_code == 200:
+            cache.put(
+                key, response.status_code, response_headers, response.text
+            )
+        return CachedResponse(
+            response.status_code, response_headers, response.text
+        )
+
+    def close(self):
+        return
+
+
+class CachingHTTPConnection(CachingHTTPSConnection):
+    protocol = "http"
+    default_port = 80
+
+
+def install_http_cache(cache, scheduler=None):
+    """
+    Makes all GitHub clients created afterwards send requests through cache
+    and scheduler
+    :param cache: obj: of :class:`HttpCache` or None to disable caching
+    :param scheduler: obj: of :class:`common.scheduler.RequestScheduler`
+    """
+    CachingHTTPSConnection.cache = cache
+    CachingHTTPSConnection.scheduler = scheduler
+    Requester.injectConnectionClasses(
+        CachingHTTPConnection, CachingHTTPSConnection
+    )
+
+
+def uninstall_http_cache():
+    CachingHTTPSConnection.cache = None
+    CachingHTTPSConnection.scheduler = None
+    Requester.resetConnectionClasses()
@@ -0,0 +1,680 @@
+import os
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from github import GithubException
+from github.Organization import Organization
+from github.Repository import Repository
+from github.Team import Team
+
+from settings import SETTINGS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    org TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id INTEGER,
+    url TEXT,
+    private INTEGER,
+    archived INTEGER,
+    default_branch TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (org, name)
+);
+CREATE TABLE IF NOT EXISTS teams (
+    org TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    id INTEGER,
+    url TEXT,
+    name TEXT,
+    privacy TEXT,
+    description TEXT,
+    parent TEXT,
+    checked_at REAL,
+    PRIMARY KEY (org, slug)
+);
+CREATE TABLE IF NOT EXISTS team_repos (
+    org TEXT NOT NULL,
+    team TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    permission TEXT,
+    PRIMARY KEY (org, team, repo)
+);
+CREATE TABLE IF NOT EXISTS branch_protection (
+    org TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    protected INTEGER NOT NULL,
+    enforce_admins INTEGER,
+    dismiss_stale_reviews INTEGER,
+    require_code_owner_reviews INTEGER,
+    required_approving_review_count INTEGER,
+    checked_at REAL,
+    PRIMARY KEY (org, repo, branch)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    org TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (org, name)
+);
+"""
+
+# columns of branch_protection table, which mirror keys of
+# `SETTINGS.PROTECTED_BRANCH`
+PROTECTION_COLUMNS = (
+    "enforce_admins",
+    "dismiss_stale_reviews",
+    "require_code_owner_reviews",
+    "required_approving_review_count",
+)
+
+# tables, which got `checked_at` column after their first release
+_CHECKED_TABLES = ("teams", "branch_protection")
+
+# format of `updated_at` watermark, `datetime.fromisoformat` isn't available
+# on all supported Python versions
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def _migrate(connection):
+    for table in _CHECKED_TABLES:
+        columns = {
+            row[1] for row in connection.execute(f"PRAGMA table_info({table})")
+        }
+        if "checked_at" not in columns:
+            connection.execute(
+                f"ALTER TABLE {table} ADD COLUMN checked_at REAL"
+            )
+
+
+def _permission(permissions):
+    """
+    :param permissions: obj: github.Permissions.Permissions of team on repo
+    :return: str: permission name as used by team repo API
+    """
+    if permissions is None:
+        return None
+    if permissions.admin:
+        return "admin"
+    if permissions.push:
+        return "push"
+    return "pull"
+
+
+def protection_record(protection):
+    """
+    Flattens raw branch protection returned by GitHub
+    :param protection: dict: raw data of branch protection or None
+    :return: dict: with `PROTECTION_COLUMNS` or None, if branch isn't protected
+    """
+    if protection is None:
+        return None
+    reviews = protection.get("required_pull_request_reviews") or {}
+    return {
+        "enforce_admins": bool(
+            (protection.get("enforce_admins") or {}).get("enabled")
+        ),
+        "dismiss_stale_reviews": reviews.get("dismiss_stale_reviews"),
+        "require_code_owner_reviews": reviews.get("require_code_owner_reviews"),
+        "required_approving_review_count": reviews.get(
+            "required_approving_review_count"
+        ),
+    }
+
+
+class OrgInventory:
+    """
+    Local SQLite index of organisation repositories, teams, team permissions
+    and branch protection.
+
+    Repositories are crawled incrementally: they are listed from the most
+    recently updated and listing stops at `updated_at` watermark of previous
+    refresh, so only changed repositories cost further requests. Changes of
+    branch protection and team permissions don't bump `updated_at`, so
+    protection of other repositories and repositories of teams are rechecked,
+    when they weren't checked within `SETTINGS.INVENTORY_RECHECK_INTERVAL`.
+    All requests go through GitHub HTTP cache, so unchanged resources are
+    revalidated with ETags and don't consume rate limit. Deleted repositories
+    are dropped by full refresh, made at least once per
+    `SETTINGS.INVENTORY_FULL_REFRESH_INTERVAL`. Each crawl is written in
+    single transaction.
+
+    Lookups are served only for organisations refreshed within
+    `SETTINGS.INVENTORY_MAX_AGE`, and only for entries which exist, so stale
+    index never hides repository or team created since last refresh.
+    Changes made through this tool are written back to index, and entries,
+    which API reports as missing, are dropped.
+    """
+
+    def __init__(self, path, clock=time.time):
+        """
+        :param path: path: of SQLite database, created on first use
+        :param clock: callable: returns current time in seconds
+        """
+        self.path = path
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._connection = None
+        self._transaction_depth = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def connection(self):
+        with self._lock:
+            if self._connection is None:
+                directory = os.path.dirname(os.path.abspath(str(self.path)))
+                os.makedirs(directory, exist_ok=True)
+                self._connection = sqlite3.connect(
+                    str(self.path), check_same_thread=False
+                )
+                self._connection.row_factory = sqlite3.Row
+                self._connection.executescript(_SCHEMA)
+                with self._connection:
+                    _migrate(self._connection)
+            return self._connection
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Statements executed within block are committed together
+        """
+        with self._lock:
+            self._transaction_depth += 1
+            try:
+                if self._transaction_depth == 1:
+                    with self.connection:
+                        yield
+                else:
+                    yield
+            finally:
+                self._transaction_depth -= 1
+
+    def _execute(self, sql, params=()):
+        with self._transaction():
+            return self.connection.execute(sql, params).fetchall()
+
+    def _executemany(self, sql, rows):
+        with self._transaction():
+            self.connection.executemany(sql, rows)
+
+    def _watermark(self, org_login, name):
+        rows = self._execute(
+            "SELECT value FROM watermarks WHERE org = ? AND name = ?",
+            (org_login, name),
+        )
+        return rows[0]["value"] if rows else None
+
+    def _set_watermark(self, org_login, name, value):
+        self._execute(
+            "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)",
+            (org_login, name, str(value)),
+        )
+
+    def refreshed_at(self, org_login):
+        """
+        :return: float: time of last refresh of organisation or None
+        """
+        value = self._watermark(org_login, "refreshed_at")
+        return float(value) if value is not None else None
+
+    def is_fresh(self, org_login):
+        refreshed_at = self.refreshed_at(org_login)
+        return (
+            refreshed_at is not None
+            and self.clock() - refreshed_at <= SETTINGS.INVENTORY_MAX_AGE
+        )
+
+    def add_repo(self, org_login, repo):
+        """
+        Stores or updates repository fetched or created through API
+        """
+        updated_at = repo.updated_at
+        self._execute(
+            "INSERT OR REPLACE INTO repos (org, name, id, url, private, "
+            "archived, default_branch, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                org_login,
+                repo.name,
+                repo.id,
+                repo.url,
+                int(bool(repo.private)),
+                int(bool(repo.archived)),
+                repo.default_branch,
+                updated_at.strftime(_TIME_FORMAT) if updated_at else None,
+            ),
+        )
+
+    def add_team(self, org_login, team, checked_at=None):
+        """
+        Stores or updates team fetched or created through API
+        :param checked_at: float: time repositories of team were indexed at
+        """
+        parent = team.raw_data.get("parent") or {}
+        self._execute(
+            "INSERT OR REPLACE INTO teams (org, slug, id, url, name, privacy, "
+            "description, parent, checked_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                org_login,
+                team.slug,
+                team.id,
+                team.url,
+                team.name,
+                team.privacy,
+                team.description,
+                parent.get("slug"),
+                checked_at,
+            ),
+        )
+
+    def set_protection(
+        self, org_login, repo_name, branch, protection, checked_at=None
+    ):
+        """
+        :param protection: dict: with `PROTECTION_COLUMNS` or None, if branch
+         isn't protected
+        :param checked_at: float: time protection was read at, now by default
+        """
+        protection = protection or {}
+        self._execute(
+            "INSERT OR REPLACE INTO branch_protection (org, repo, branch, "
+            "protected, " + ", ".join(PROTECTION_COLUMNS) + ", checked_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (org_login, repo_name, branch, int(bool(protection)))
+            + tuple(protection.get(column) for column in PROTECTION_COLUMNS)
+            + (self.clock() if checked_at is None else checked_at,),
+        )
+
+    @staticmethod
+    def _fetch_protection(org, repo_url, branch):
+        """
+        Reads protection with single request, without fetching branch first
+        :return: dict: raw data of branch protection or None
+        """
+        try:
+            headers, data = org._requester.requestJsonAndCheck(
+                "GET", f"{repo_url}/branches/{branch}/protection"
+            )
+        except GithubException as e:
+            # 404 is returned for unprotected or empty repository, 403 when
+            # token can't read protection
+            if e.status not in (403, 404):
+                raise
+            return None
+        return data
+
+    def _crawl_repos(self, org, full):
+        """
+        :return: tuple: of amount of crawled repositories and amount of other
+         repositories, which protection was rechecked
+        """
+        watermark = None if full else self._watermark(org.login, "updated_at")
+        watermark = (
+            datetime.strptime(watermark, _TIME_FORMAT) if watermark else None
+        )
+        newest = watermark
+        repos = []
+
+        for repo in org.get_repos(type="all", sort="updated", direction="desc"):
+            if watermark and repo.updated_at and repo.updated_at <= watermark:
+                break
+            repos.append(repo)
+            if repo.updated_at and (newest is None or repo.updated_at > newest):
+                newest = repo.updated_at
+
+        now = self.clock()
+        protections = {
+            repo.name: (
+                repo.default_branch,
+                self._fetch_protection(org, repo.url, repo.default_branch),
+            )
+            for repo in repos
+        }
+        rechecked = 0
+        if not full:
+            for row in self._execute(
+                "SELECT r.name, r.url, r.default_branch FROM repos r "
+                "LEFT JOIN branch_protection p "
+                "ON p.org = r.org AND p.repo = r.name "
+                "AND p.branch = r.default_branch "
+                "WHERE r.org = ? AND IFNULL(p.checked_at, 0) < ?",
+                (org.login, now - SETTINGS.INVENTORY_RECHECK_INTERVAL),
+            ):
+                if row["name"] in protections:
+                    continue
+                protections[row["name"]] = (
+                    row["default_branch"],
+                    self._fetch_protection(
+                        org, row["url"], row["default_branch"]
+                    ),
+                )
+                rechecked += 1
+
+        with self._transaction():
+            for repo in repos:
+                self.add_repo(org.login, repo)
+            for name, (branch, protection) in protections.items():
+                self.set_protection(
+                    org.login, name, branch, protection_record(protection), now
+                )
+            if full:
+                seen = {repo.name for repo in repos}
+                for row in self._execute(
+                    "SELECT name FROM repos WHERE org = ?", (org.login,)
+                ):
+                    if row["name"] not in seen:
+                        self._forget_repo(org.login, row["name"])
+            if newest:
+                self._set_watermark(
+                    org.login, "updated_at", newest.strftime(_TIME_FORMAT)
+                )
+        return len(repos), rechecked
+
+    def _forget_repo(self, org_login, name):
+        for table, column in (
+            ("repos", "name"),
+            ("team_repos", "repo"),
+            ("branch_protection", "repo"),
+        ):
+            self._execute(
+                f"DELETE FROM {table} WHERE org = ? AND {column} = ?",
+                (org_login, name),
+            )
+
+    def _forget_team(self, org_login, slug):
+        for table, column in (("teams", "slug"), ("team_repos", "team")):
+            self._execute(
+                f"DELETE FROM {table} WHERE org = ? AND {column} = ?",
+                (org_login, slug),
+            )
+
+    def _crawl_teams(self, org, full):
+        """
+        Lists all teams with single listing, but repositories only of teams,
+        which weren't checked within `SETTINGS.INVENTORY_RECHECK_INTERVAL`
+        :return: int: amount of teams, which repositories were crawled
+        """
+        now = self.clock()
+        checked = {
+            row["slug"]: row["checked_at"]
+            for row in self._execute(
+                "SELECT slug, checked_at FROM teams WHERE org = ?",
+                (org.login,),
+            )
+        }
+        teams = list(org.get_teams())
+        team_repos = {
+            team.slug: [
+                (org.login, team.slug, repo.name, _permission(repo.permissions))
+                for repo in team.get_repos()
+            ]
+            for team in teams
+            if full
+            or (checked.get(team.slug) or 0)
+            < now - SETTINGS.INVENTORY_RECHECK_INTERVAL
+        }
+
+        with self._transaction():
+            for slug in checked.keys() - {team.slug for team in teams}:
+                self._forget_team(org.login, slug)
+            for team in teams:
+                self.add_team(
+                    org.login,
+                    team,
+                    now if team.slug in team_repos else checked.get(team.slug),
+                )
+            for slug, rows in team_repos.items():
+                self._execute(
+                    "DELETE FROM team_repos WHERE org = ? AND team = ?",
+                    (org.login, slug),
+                )
+                self._executemany(
+                    "INSERT OR REPLACE INTO team_repos VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+        return len(team_repos)
+
+    def refresh(self, org, full=False):
+        """
+        Crawls organisation into index
+        :param org: obj: of :class:`github.Organization.Organization`
+        :param full: bool: whether to relist all repositories, otherwise
+         only repositories updated since previous refresh are crawled
+        :return: dict: with amount of crawled repositories, rechecked
+         protections and crawled teams
+        """
+        full_refreshed_at = self._watermark(org.login, "full_refreshed_at")
+        full = (
+            full
+            or full_refreshed_at is None
+            or self.clock() - float(full_refreshed_at)
+            > SETTINGS.INVENTORY_FULL_REFRESH_INTERVAL
+        )
+
+        repos, rechecked = self._crawl_repos(org, full)
+        teams = self._crawl_teams(org, full)
+
+        now = self.clock()
+        with self._transaction():
+            self._set_watermark(org.login, "refreshed_at", now)
+            if full:
+                self._set_watermark(org.login, "full_refreshed_at", now)
+        return {
+            "full": full,
+            "repos": repos,
+            "rechecked_protections": rechecked,
+            "teams": teams,
+        }
+
+    def _lookup(self, org, sql, key):
+        if not (
+            SETTINGS.INVENTORY_ENABLED
+            and isinstance(org, Organization)
+            and self.is_fresh(org.login)
+        ):
+            return None
+        rows = self._execute(sql, (org.login, key))
+        with self._lock:
+            if rows:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return rows[0] if rows else None
+
+    def get_repo(self, org, name):
+        """
+        :param org: obj: of :class:`github.Organization.Organization`
+        :param name: str: name of repository
+        :return: obj: github.Repository.Repository, which issues requests only
+         when attributes missing in index are read, or None
+        """
+        row = self._lookup(
+            org,
+            "SELECT * FROM repos WHERE org = ? AND name = ?",
+            name,
+        )
+        if row is None:
+            return None
+        return Repository(
+            org._requester,
+            {},
+            {
+                "id": row["id"],
+                "url": row["url"],
+                "name": row["name"],
+                "full_name": f"{row['org']}/{row['name']}",
+                "private": bool(row["private"]),
+                "archived": bool(row["archived"]),
+                "default_branch": row["default_branch"],
+            },
+            completed=False,
+        )
+
+    def get_team(self, org, slug):
+        """
+        :param org: obj: of :class:`github.Organization.Organization`
+        :param slug: str: slug of team
+        :return: obj: github.Team.Team, which issues requests only when
+         attributes missing in index are read, or None
+        """
+        row = self._lookup(
+            org,
+            "SELECT * FROM teams WHERE org = ? AND slug = ?",
+            slug,
+        )
+        if row is None:
+            return None
+        parent = {"slug": row["parent"]} if row["parent"] else None
+        return Team(
+            org._requester,
+            {},
+            {
+                "id": row["id"],
+                "url": row["url"],
+                "slug": row["slug"],
+                "name": row["name"],
+                "privacy": row["privacy"],
+                "description": row["description"],
+                "parent": parent,
+            },
+            completed=False,
+        )
+
+    def lacking_protection(self, org_login, branch_permissions):
+        """
+        Repositories, which default branch is less protected than required
+        :param org_login: str: organisation
+        :param branch_permissions: dict: required protection, same keys as
+         `SETTINGS.PROTECTED_BRANCH`
+        :return: list: of repository names
+        """
+        conditions = ["p.protected IS NULL", "NOT p.protected"]
+        params = [org_login]
+        for column in PROTECTION_COLUMNS:
+            required = branch_permissions.get(column)
+            if isinstance(required, bool):
+                if required:
+                    conditions.append(f"NOT IFNULL(p.{column}, 0)")
+            elif required is not None:
+                conditions.append(f"IFNULL(p.{column}, 0) < ?")
+                params.append(required)
+
+        rows = self._execute(
+            "SELECT r.name FROM repos r LEFT JOIN branch_protection p "
+            "ON p.org = r.org AND p.repo = r.name "
+            "AND p.branch = r.default_branch "
+            "WHERE r.org = ? AND NOT r.archived AND ("
+            + " OR ".join(conditions)
+            + ") ORDER BY r.name",
+            params,
+        )
+        return [row["name"] for row in rows]
+
+    def query(self, sql, params=()):
+        """
+        Runs arbitrary query against index
+        :return: list: of dicts
+        """
+        return [dict(row) for row in self._execute(sql, params)]
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def record_repo(self, org, repo):
+        """
+        Keeps index of recently refreshed organisation up to date with
+        repository fetched or created through API
+        """
+        if (
+            SETTINGS.INVENTORY_ENABLED
+            and isinstance(org, Organization)
+            and isinstance(repo, Repository)
+            and self.is_fresh(org.login)
+        ):
+            self.add_repo(org.login, repo)
+
+    def record_protection(self, repo, branch, branch_permissions):
+        """
+        Keeps index of recently refreshed organisation up to date with
+        protection set through API
+        :param branch_permissions: dict: same keys as `PROTECTION_COLUMNS`
+        """
+        if not (SETTINGS.INVENTORY_ENABLED and isinstance(repo, Repository)):
+            return
+        org_login = repo.full_name.split("/")[0]
+        if self.is_fresh(org_login):
+            self.set_protection(
+                org_login, repo.name, branch, dict(branch_permissions)
+            )
+
+    def record_visibility(self, repo, private):
+        """
+        Keeps index up to date with visibility set through API
+        :param private: bool: whether repository is private now
+        """
+        if not (SETTINGS.INVENTORY_ENABLED and isinstance(repo, Repository)):
+            return
+        self._execute(
+            "UPDATE repos SET private = ? WHERE org = ? AND name = ?",
+            (int(bool(private)), repo.full_name.split("/")[0], repo.name),
+        )
+
+    def record_team(self, org, slug, attributes):
+        """
+        Keeps index up to date with team attributes set through API
+        :param slug: str: slug of team
+        :param attributes: dict: raw data of team returned by API, only
+         indexed attributes present in it are updated
+        """
+        if not (SETTINGS.INVENTORY_ENABLED and isinstance(org, Organization)):
+            return
+        columns = {
+            column: attributes[column]
+            for column in ("name", "privacy", "description")
+            if column in attributes
+        }
+        if "parent" in attributes:
+            columns["parent"] = (attributes["parent"] or {}).get("slug")
+        if not columns:
+            return
+        self._execute(
+            "UPDATE teams SET "
+            + ", ".join(f"{column} = ?" for column in columns)
+            + " WHERE org = ? AND slug = ?",
+            tuple(columns.values()) + (org.login, slug),
+        )
+
+    def forget_repo(self, org, name):
+        """
+        Drops repository, which API reported as missing, so it isn't served
+        until next refresh
+        """
+        if SETTINGS.INVENTORY_ENABLED and isinstance(org, Organization):
+            with self._transaction():
+                self._forget_repo(org.login, name)
+
+    def forget_team(self, org, slug):
+        """
+        Drops team, which API reported as missing, so it isn't served until
+        next refresh
+        """
+        if SETTINGS.INVENTORY_ENABLED and isinstance(org, Organization):
+            with self._transaction():
+                self._forget_team(org.login, slug)
+
+
+INVENTORY = OrgInventory(SETTINGS.INVENTORY_DB)
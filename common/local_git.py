@@ -0,0 +1,285 @@
+import base64
+import os
+import posixpath
+import subprocess
+import threading
+import time
+
+from pathlib import Path
+
+from settings import SETTINGS
+
+from .refs import FULL_SHA_RE
+from .repo_files import RepoFile, _directory_not_found
+
+
+class LocalGitError(Exception):
+    pass
+
+
+def _config_env(config):
+    """
+    Passes settings to git through environment, so unlike `-c` options,
+    they are not visible in command line of the process to other users
+    :param config: iterable: of `(name, value)` settings
+    :return: dict: environment for git or None, when there are no settings
+    """
+    config = list(config)
+    if not config:
+        return None
+
+    env = os.environ.copy()
+    count = int(env.get("GIT_CONFIG_COUNT") or 0)
+    for index, (name, value) in enumerate(config, count):
+        env[f"GIT_CONFIG_KEY_{index}"] = name
+        env[f"GIT_CONFIG_VALUE_{index}"] = value
+    env["GIT_CONFIG_COUNT"] = str(count + len(config))
+    return env
+
+
+def _git(*args, cwd=None, input=None, config=()):
+    """
+    Runs git command and returns its standard output
+    :param args: arguments of git command
+    :param cwd: path: working directory or git directory
+    :param input: bytes: passed to standard input
+    :param config: iterable: of `(name, value)` settings passed through
+     environment
+    :return: bytes
+    """
+    command = [SETTINGS.GIT_BINARY] + list(args)
+
+    try:
+        result = subprocess.run(
+            command,
+            cwd=cwd,
+            env=_config_env(config),
+            input=input,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+    except subprocess.CalledProcessError as e:
+        raise LocalGitError(
+            f"{' '.join(args[:2])} failed: {e.stderr.decode().strip()}"
+        )
+    return result.stdout
+
+
+class LocalGitRepo:
+    """
+    Bare mirror of remote repository. Mimics part of
+    :class:`github.Repository.Repository` interface used for deployment, but
+    serves everything from local git object store.
+    """
+
+    def __init__(self, mirrors, full_name, remote_url, path):
+        self._mirrors = mirrors
+        self.full_name = full_name
+        self.name = posixpath.basename(full_name)
+        self.remote_url = remote_url
+        self.path = Path(path)
+
+    def _rev_parse(self, ref):
+        if ref.startswith("-"):
+            # would be taken for an option of `git rev-parse`
+            raise LocalGitError(f"Invalid ref {ref}")
+        return (
+            _git("rev-parse", "--verify", f"{ref}^{{commit}}", cwd=self.path)
+            .decode()
+            .strip()
+        )
+
+    def resolve(self, ref):
+        """
+        :param ref: string: branch, tag or commit sha
+        :return: string: full commit hash
+        """
+        if FULL_SHA_RE.match(ref) and (self.path / "HEAD").is_file():
+            # commit already present in mirror can't change
+            try:
+                return self._rev_parse(ref)
+            except LocalGitError:
+                pass
+
+        self._mirrors.update(self)
+        return self._rev_parse(ref)
+
+    def get_files(self, directory, version):
+        """
+        Reads all files under directory at given version with one `ls-tree`
+        and one `cat-file --batch` call.
+        :param directory: string: directory in repository
+        :param version: string: branch, tag or commit sha
+        :return: list of :class:`common.RepoFile`
+        :raises: :class:`github.UnknownObjectException` if directory doesn't
+            exist
+        """
+        sha = self.resolve(version)
+        listing = _git(
+            "ls-tree",
+            "-r",
+            "-z",
+            "--full-tree",
+            sha,
+            "--",
+            directory.strip("/"),
+            cwd=self.path,
+        )
+
+        entries = []
+        for line in filter(None, listing.split(b"\0")):
+            info, path = line.split(b"\t", 1)
+            _, object_type, blob_sha = info.decode().split(" ")
+            if object_type == "blob":
+                entries.append((path.decode(), blob_sha))
+        if not entries:
+            # the same error as GitHub backends raise for missing directory
+            raise _directory_not_found(directory)
+
+        blobs = self._read_blobs(blob_sha for _, blob_sha in entries)
+        return [
+            RepoFile(posixpath.basename(path), path, blob_sha, blobs[blob_sha])
+            for path, blob_sha in entries
+        ]
+
+    def _read_blobs(self, shas):
+        """
+        :param shas: iterable: of git blob hashes
+        :return: dict: of blob hash to content bytes
+        """
+        shas = list(dict.fromkeys(shas))
+        if not shas:
+            return {}
+
+        output = _git(
+            "cat-file",
+            "--batch",
+            cwd=self.path,
+            input="".join(sha + "\n" for sha in shas).encode(),
+        )
+
+        blobs = {}
+        position = 0
+        for sha in shas:
+            header_end = output.index(b"\n", position)
+            header = output[position:header_end].decode().split(" ")
+            if header[-1] == "missing":
+                raise LocalGitError(f"Blob {sha} is missing in {self.path}")
+            size = int(header[2])
+            blobs[sha] = output[header_end + 1 : header_end + 1 + size]
+            # content is followed by newline
+            position = header_end + 1 + size + 1
+        return blobs
+
+
+class LocalGitOrg:
+    """
+    Mimics :class:`github.Organization.Organization` for `get_repo` calls
+    """
+
+    def __init__(self, mirrors, login, remote_url_template, token=None):
+        self._mirrors = mirrors
+        self.login = login
+        self.remote_url_template = remote_url_template
+        self.token = token
+
+    def get_repo(self, name):
+        return self._mirrors.get_repo(
+            self.remote_url_template.format(org=self.login, repo=name),
+            f"{self.login}/{name}",
+            self.token,
+        )
+
+
+class LocalGitMirrors:
+    """
+    Keeps bare mirrors of remote repositories in directory. Mirror is cloned
+    on first use, and brought up to date with incremental fetch at most once
+    per `fetch_interval` seconds.
+    """
+
+    def __init__(self, directory, fetch_interval):
+        self.directory = Path(directory)
+        self.fetch_interval = fetch_interval
+        self._lock = threading.Lock()
+        self._repo_locks = {}
+        self._repos = {}
+        self._tokens = {}
+        self._updated = {}
+        self.clones = 0
+        self.fetches = 0
+
+    def get_org(self, remote_url_template, token, org_name):
+        """
+        :param remote_url_template: string: URL of remote repositories with
+         `{org}` and `{repo}` placeholders
+        :param token: string: token to authenticate HTTP(S) remotes with
+        :param org_name: string: name of the organisation
+        :return: obj: of :class:`LocalGitOrg`
+        """
+        return LocalGitOrg(self, org_name, remote_url_template, token)
+
+    def get_repo(self, remote_url, full_name, token=None):
+        with self._lock:
+            repo = self._repos.get(remote_url)
+            if repo is None:
+                path = self.directory / (full_name.replace("/", "-") + ".git")
+                repo = self._repos[remote_url] = LocalGitRepo(
+                    self, full_name, remote_url, path
+                )
+                self._repo_locks[remote_url] = threading.Lock()
+            self._tokens[remote_url] = token
+            return repo
+
+    def _auth_config(self, repo):
+        token = self._tokens.get(repo.remote_url)
+        if not token or not repo.remote_url.startswith(("http://", "https://")):
+            return ()
+        credentials = base64.b64encode(f"x-access-token:{token}".encode())
+        # token is passed to single command through its environment, so it
+        # doesn't show up in process list and isn't stored in mirror config
+        return (
+            (
+                "http.extraHeader",
+                f"Authorization: Basic {credentials.decode()}",
+            ),
+        )
+
+    def update(self, repo):
+        """
+        Clones mirror, if it doesn't exist yet, or fetches new objects into it,
+        if it wasn't updated within `fetch_interval`
+        :param repo: obj: of :class:`LocalGitRepo`
+        """
+        with self._repo_locks[repo.remote_url]:
+            updated = self._updated.get(repo.remote_url)
+            if (
+                updated is not None
+                and time.monotonic() - updated < self.fetch_interval
+            ):
+                return
+
+            config = self._auth_config(repo)
+            if (repo.path / "HEAD").is_file():
+                _git(
+                    "fetch", "--prune", "--quiet", cwd=repo.path, config=config
+                )
+                self.fetches += 1
+            else:
+                os.makedirs(self.directory, exist_ok=True)
+                _git(
+                    "clone",
+                    "--mirror",
+                    "--quiet",
+                    repo.remote_url,
+                    str(repo.path),
+                    config=config,
+                )
+                self.clones += 1
+
+            self._updated[repo.remote_url] = time.monotonic()
+
+    @property
+    def stats(self):
+        return {"clones": self.clones, "fetches": self.fetches}
@@ -0,0 +1,76 @@
+import re
+import threading
+import time
+
+from settings import SETTINGS
+
+from .repo_files import resolve_commit_sha
+
+FULL_SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+class RefCache:
+    """
+    Short-lived in-process mapping of git refs (branches, tags) to commit
+    hashes. Refs are moving, so entries expire after `ttl` seconds, while full
+    commit hashes are never cached nor resolved, as they point to immutable
+    commits.
+    """
+
+    def __init__(self, ttl, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, repo_name, ref):
+        """
+        :param repo_name: string: full name of repository
+        :param ref: string: branch or tag
+        :return: string: commit hash or None, if it's unknown or expired
+        """
+        with self._lock:
+            entry = self._refs.get((repo_name, ref))
+            if entry is None or entry[1] <= self._clock():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, repo_name, ref, sha):
+        with self._lock:
+            self._refs[(repo_name, ref)] = (sha, self._clock() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._refs.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+REF_CACHE = RefCache(SETTINGS.REF_CACHE_TTL)
+
+
+def resolve_ref(repo, ref, ref_cache=REF_CACHE):
+    """
+    Resolves branch or tag to commit hash once per `REF_CACHE_TTL`, so all
+    reads made during run can be pinned to the same commit.
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :param ref: string: branch, tag or commit sha
+    :param ref_cache: obj: of :class:`RefCache`
+    :return: string: full commit hash
+    """
+    if FULL_SHA_RE.match(ref):
+        return ref
+
+    sha = ref_cache.get(repo.full_name, ref)
+    if sha is None:
+        sha = resolve_commit_sha(repo, ref)
+        ref_cache.put(repo.full_name, ref, sha)
+    return sha
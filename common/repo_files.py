@@ -0,0 +1,241 @@
+import base64
+import json
+import posixpath
+import re
+
+from collections import namedtuple
+
+from github import GithubException, UnknownObjectException
+
+from settings import SETTINGS
+
+RepoFile = namedtuple(
+    "RepoFile", ["name", "path", "sha", "decoded_content", "local_path"]
+)
+RepoFile.__new__.__defaults__ = (None,)
+RepoFile.__doc__ = """
+Lightweight replacement of :class:`github.ContentFile.ContentFile`, which
+already holds decoded content or points to local copy of file in
+`local_path`, so it can be written out without any further API calls.
+"""
+
+_SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+_PrefixedTreeElement = namedtuple("_PrefixedTreeElement", ["path", "sha"])
+
+_BLOB_QUERY_FRAGMENT = (
+    '{alias}: object(oid: "{sha}") '
+    "{{ ... on Blob {{ text isBinary isTruncated }} }}"
+)
+
+
+def graphql_url(repo):
+    """
+    Derives GraphQL endpoint from repository API URL. For GitHub Enterprise
+    REST API lives under `/api/v3`, while GraphQL under `/api/graphql`.
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :return: string
+    """
+    api_url = repo.url.split("/repos/")[0]
+    if api_url.endswith("/v3"):
+        api_url = api_url[: -len("/v3")]
+    return api_url + "/graphql"
+
+
+def resolve_commit_sha(repo, ref):
+    """
+    Resolves branch, tag or short hash to full commit hash. Only hash is
+    requested, so commit with its diff isn't transferred.
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :param ref: string: branch, tag or commit sha
+    :return: string: commit hash
+    """
+    # response is plain text hash, which must not go through PyGithub's json
+    # parsing, so it's read unchecked
+    status, headers, output = repo._requester.requestJson(
+        "GET",
+        repo.url + "/commits/" + ref,
+        headers={"Accept": "application/vnd.github.v3.sha"},
+    )
+    if isinstance(output, bytes):
+        output = output.decode("utf-8")
+    sha = (output or "").strip()
+    if status >= 400 or not _SHA_RE.match(sha):
+        try:
+            data = json.loads(output)
+        except ValueError:
+            data = {"message": output}
+        if status == 404:
+            raise UnknownObjectException(status, data)
+        raise GithubException(status, data)
+    return sha
+
+
+def _directory_not_found(directory):
+    # the same error Contents API raises for missing directory
+    return UnknownObjectException(
+        404, {"message": f"Directory {directory} not found"}
+    )
+
+
+def get_tree_entries(repo, directory, version):
+    """
+    Lists all blobs under directory (including subdirectories) with one
+    recursive Git Trees request
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :param directory: string: directory in repository
+    :param version: string: branch, tag or commit sha
+    :return: list of :class:`github.GitTreeElement.GitTreeElement`
+    :raises: :class:`github.UnknownObjectException` if directory doesn't exist
+    """
+    prefix = directory.strip("/") + "/"
+    tree = repo.get_git_tree(version, recursive=True)
+    if tree.raw_data.get("truncated"):
+        # tree of whole repo is too big for one response, so we take
+        # only subtree of the directory
+        subtree_sha = next(
+            (
+                element.sha
+                for element in repo.get_git_tree(version).tree
+                if element.path == directory.strip("/")
+            ),
+            None,
+        )
+        if subtree_sha is None:
+            raise _directory_not_found(directory)
+        return [
+            _PrefixedTreeElement(prefix + element.path, element.sha)
+            for element in repo.get_git_tree(subtree_sha, recursive=True).tree
+            if element.type == "blob"
+        ]
+
+    elements = [
+        element for element in tree.tree if element.path.startswith(prefix)
+    ]
+    if not elements:
+        # git has no empty directories, so there is no such directory
+        raise _directory_not_found(directory)
+    return [element for element in elements if element.type == "blob"]
+
+
+def get_blobs(repo, shas, batch_size=None):
+    """
+    Downloads content of blobs, requesting them by batches through GraphQL API
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :param shas: iterable: of git blob hashes
+    :param batch_size: int: max amount of blobs per request
+    :return: dict: of blob hash to content bytes
+    """
+    batch_size = batch_size or SETTINGS.GITHUB_BLOB_BATCH_SIZE
+    shas = list(dict.fromkeys(shas))
+    blobs = {}
+    if not shas:
+        return blobs
+
+    url = graphql_url(repo)
+
+    for start in range(0, len(shas), batch_size):
+        batch = shas[start : start + batch_size]
+        objects = " ".join(
+            _BLOB_QUERY_FRAGMENT.format(alias=f"b{index}", sha=sha)
+            for index, sha in enumerate(batch)
+        )
+        query = (
+            "query($owner: String!, $name: String!) "
+            "{ repository(owner: $owner, name: $name) { %s } }" % objects
+        )
+        headers, data = repo._requester.requestJsonAndCheck(
+            "POST",
+            url,
+            input={
+                "query": query,
+                "variables": {
+                    "owner": repo.owner.login,
+                    "name": repo.name,
+                },
+            },
+        )
+        if data.get("errors"):
+            raise GithubException(200, data)
+
+        repository = data["data"]["repository"]
+        for index, sha in enumerate(batch):
+            blob = repository[f"b{index}"]
+            if blob is None or blob["isBinary"] or blob.get("isTruncated"):
+                # GraphQL doesn't return content of binary blobs and
+                # truncates text of large ones
+                blobs[sha] = base64.b64decode(repo.get_git_blob(sha).content)
+            else:
+                blobs[sha] = blob["text"].encode("utf-8")
+
+    return blobs
+
+
+def get_tree_files(repo, directory, version, blob_cache=None):
+    """
+    Fetches all files under directory in fixed amount of requests: one for
+    the tree and one per `GITHUB_BLOB_BATCH_SIZE` blobs.
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :param directory: string: directory in repository
+    :param version: string: branch, tag or commit sha
+    :param blob_cache: obj: of :class:`common.BlobCache`, only blobs missing
+     in it are downloaded
+    :return: list of :class:`RepoFile`
+    """
+    entries = get_tree_entries(repo, directory, version)
+
+    blobs = {}
+    if blob_cache is not None:
+        for entry in entries:
+            content = blob_cache.get(entry.sha)
+            if content is not None:
+                blobs[entry.sha] = content
+
+    missing_blobs = get_blobs(
+        repo, (entry.sha for entry in entries if entry.sha not in blobs)
+    )
+    if blob_cache is not None:
+        for sha, content in missing_blobs.items():
+            blob_cache.put(sha, content)
+    blobs.update(missing_blobs)
+
+    return [
+        RepoFile(
+            posixpath.basename(entry.path),
+            entry.path,
+            entry.sha,
+            blobs[entry.sha],
+        )
+        for entry in entries
+    ]
+
+
+def get_content_files(repo, directory, version, blob_cache=None):
+    """
+    Lists directory through Contents API. Content of each file is a separate
+    request, so it's made only for files missing in blob cache.
+    :param repo: obj: of :class:`github.Repository.Repository`
+    :param directory: string: directory in repository
+    :param version: string: branch, tag or commit sha
+    :param blob_cache: obj: of :class:`common.BlobCache`
+    :return: list of :class:`RepoFile`
+    """
+    files = []
+    for content_file in repo.get_dir_contents(directory, version):
+        if content_file.type != "file":
+            continue
+
+        content = (
+            blob_cache.get(content_file.sha) if blob_cache is not None else None
+        )
+        if content is None:
+            content = content_file.decoded_content
+            if blob_cache is not None:
+                blob_cache.put(content_file.sha, content)
+
+        files.append(
+            RepoFile(
+                content_file.name, content_file.path, content_file.sha, content
+            )
+        )
+    return files
@@ -0,0 +1,253 @@
+import random
+import threading
+import time
+
+from email.utils import parsedate_to_datetime
+
+from settings import SETTINGS
+
+
+class RequestScheduler:
+    """
+    Central scheduler for requests to VCS platform API.
+
+    Requests are not throttled while plenty of quota is left. Once remaining
+    quota reported in `X-RateLimit-*` headers falls below `low_remaining`,
+    it's spent through token bucket, so the rest of it is spread evenly until
+    its reset instead of being exhausted at once, and amount of concurrent
+    requests shrinks with it. Requests rejected by primary
+    or secondary rate limits (403/429) are retried after `Retry-After` or
+    adaptive backoff.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=None,
+        low_remaining=None,
+        max_retries=None,
+        backoff_base=None,
+        backoff_max=None,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        self.max_concurrency = max_concurrency or SETTINGS.VCS_MAX_CONCURRENCY
+        self.low_remaining = low_remaining or SETTINGS.VCS_LOW_REMAINING
+        self.max_retries = (
+            SETTINGS.VCS_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.backoff_base = backoff_base or SETTINGS.VCS_BACKOFF_BASE
+        self.backoff_max = backoff_max or SETTINGS.VCS_BACKOFF_MAX
+        self._clock = clock
+        self._sleep = sleep
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._tokens = float(self.max_concurrency)
+        self._last_refill = clock()
+        self._backoff_until = 0.0
+
+        self.rate_limit = None
+        self.rate_limit_remaining = None
+        self.rate_limit_reset = None
+        self.requests = 0
+        self.retries = 0
+        self.wait_time = 0.0
+
+    @property
+    def concurrency(self):
+        """
+        Allowed amount of concurrent requests. It's reduced proportionally,
+        when remaining quota falls below `low_remaining`.
+        """
+        remaining = self.rate_limit_remaining
+        if remaining is None or remaining >= self.low_remaining:
+            return self.max_concurrency
+        return max(
+            1, int(self.max_concurrency * remaining / self.low_remaining)
+        )
+
+    def _refill_rate(self, now):
+        """
+        Tokens per second, that spread remaining quota until its reset, when
+        it's low, otherwise requests are not paced
+        """
+        if (
+            self.rate_limit_remaining is None
+            or self.rate_limit_reset is None
+            or self.rate_limit_remaining >= self.low_remaining
+        ):
+            return float("inf")
+        seconds_to_reset = max(self.rate_limit_reset - now, 1.0)
+        return self.rate_limit_remaining / seconds_to_reset
+
+    def _delay(self, now):
+        """
+        Seconds to wait before next request can be sent, 0 if it can be sent
+        right away. Called with condition acquired.
+        """
+        if now < self._backoff_until:
+            return self._backoff_until - now
+
+        if self.rate_limit_remaining == 0 and self.rate_limit_reset:
+            return max(self.rate_limit_reset - now, 0.0)
+
+        rate = self._refill_rate(now)
+        if rate == float("inf"):
+            self._tokens = float(self.max_concurrency)
+        else:
+            self._tokens = min(
+                float(self.max_concurrency),
+                self._tokens + (now - self._last_refill) * rate,
+            )
+        self._last_refill = now
+
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / rate if rate else self.backoff_max
+
+    def acquire(self):
+        """
+        Blocks until request fits into concurrency limit and token bucket
+        """
+        with self._condition:
+            while True:
+                if self._in_flight >= self.concurrency:
+                    self._condition.wait()
+                    continue
+
+                delay = self._delay(self._clock())
+                if delay <= 0:
+                    break
+
+                self.wait_time += delay
+                # other threads may observe fresher headers while we sleep
+                self._condition.release()
+                try:
+                    self._sleep(delay)
+                finally:
+                    self._condition.acquire()
+
+            self._tokens -= 1
+            self._in_flight += 1
+            self.requests += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def observe(self, status, headers, body=""):
+        """
+        Updates quota from response headers
+        :param status: int: status of response
+        :param headers: case-insensitive mapping of response headers
+        :param body: string: response body
+        :return: float: seconds to wait before retry, if request was rejected
+         by rate limit, otherwise None
+        """
+        with self._condition:
+            if "x-ratelimit-limit" in headers:
+                self.rate_limit = int(headers["x-ratelimit-limit"])
+            if "x-ratelimit-remaining" in headers:
+                self.rate_limit_remaining = int(
+                    headers["x-ratelimit-remaining"]
+                )
+            if "x-ratelimit-reset" in headers:
+                self.rate_limit_reset = float(headers["x-ratelimit-reset"])
+            self._condition.notify_all()
+
+        if status not in (403, 429):
+            return None
+
+        retry_after = self._parse_retry_after(headers.get("retry-after"))
+        if retry_after is not None:
+            return retry_after
+        if self.rate_limit_remaining == 0 and self.rate_limit_reset:
+            return max(self.rate_limit_reset - self._clock(), 0.0)
+        if status == 429 or "rate limit" in (body or "").lower():
+            # secondary rate limit without Retry-After
+            return 0.0
+        return None
+
+    def _parse_retry_after(self, value):
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return max(
+                parsedate_to_datetime(value).timestamp() - self._clock(), 0.0
+            )
+        except (TypeError, ValueError):
+            return None
+
+    def _backoff(self, attempt, retry_after):
+        """
+        Pauses all requests until rate limit is expected to be lifted
+        """
+        delay = min(
+            self.backoff_max,
+            max(retry_after, self.backoff_base * 2**attempt),
+        )
+        delay += random.uniform(0, self.backoff_base)
+        with self._condition:
+            self._backoff_until = max(
+                self._backoff_until, self._clock() + delay
+            )
+            self.retries += 1
+
+    def send(self, send_request):
+        """
+        Sends request through scheduler, retrying it when it was rejected by
+        rate limit
+        :param send_request: callable: sends request and returns
+         :class:`requests.Response`
+        :return: :class:`requests.Response`
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                response = send_request()
+            finally:
+                self.release()
+
+            # body is read only for rejections, so streamed responses are
+            # not loaded into memory
+            retry_after = self.observe(
+                response.status_code,
+                response.headers,
+                response.text if response.status_code in (403, 429) else "",
+            )
+            if retry_after is None or attempt >= self.max_retries:
+                return response
+
+            self._backoff(attempt, retry_after)
+            attempt += 1
+
+    @property
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "wait_time": self.wait_time,
+            "rate_limit": self.rate_limit,
+            "rate_limit_remaining": self.rate_limit_remaining,
+            "concurrency": self.concurrency,
+        }
+
+    def report(self, metrics_registry):
+        """
+        Adds quota and waiting metrics to metrics registry
+        :param metrics_registry: obj: of :class:`reporter.base.MetricsRegistry`
+        """
+        if self.rate_limit_remaining is not None:
+            metrics_registry.add_metric(
+                "vcs_rate_limit_remaining", self.rate_limit_remaining
+            )
+        metrics_registry.add_metric("vcs_wait_time", float(self.wait_time))
+
+
+REQUEST_SCHEDULER = RequestScheduler()
@@ -0,0 +1,153 @@
+import random
+import re
+import threading
+import time
+
+from urllib.parse import urlparse
+
+import requests
+
+from settings import SETTINGS
+
+from .scheduler import REQUEST_SCHEDULER
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRIED_STATUSES = {500, 502, 503, 504}
+
+# numeric ids and hashes are replaced, so latency is tracked per endpoint
+_PATH_ID_RE = re.compile(r"/(?:\d+|[0-9a-f]{40})(?=/|$)")
+
+
+class RestSession:
+    """
+    Shared session for raw REST calls, which are not covered by PyGithub.
+
+    Connections are kept alive in pool, every request has bounded timeout,
+    and idempotent requests failed with connection error or 5xx status are
+    retried with jittered exponential backoff. Requests are sent through
+    request scheduler, so they respect rate limit as all other GitHub calls.
+    """
+
+    def __init__(
+        self,
+        timeout=None,
+        max_retries=None,
+        backoff_base=None,
+        backoff_max=None,
+        pool_size=None,
+        scheduler=None,
+        sleep=time.sleep,
+    ):
+        self.timeout = timeout or SETTINGS.REST_TIMEOUT
+        self.max_retries = (
+            SETTINGS.REST_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.backoff_base = backoff_base or SETTINGS.REST_BACKOFF_BASE
+        self.backoff_max = backoff_max or SETTINGS.REST_BACKOFF_MAX
+        self.scheduler = scheduler
+        self._sleep = sleep
+
+        pool_size = pool_size or SETTINGS.REST_POOL_SIZE
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self.retries = 0
+
+    @staticmethod
+    def endpoint(method, url):
+        """
+        :return: string: method and URL path with ids replaced by `:id`
+        """
+        return method + " " + _PATH_ID_RE.sub("/:id", urlparse(url).path)
+
+    def _record(self, endpoint, latency):
+        with self._lock:
+            stats = self._latencies.setdefault(
+                endpoint, {"count": 0, "total": 0.0, "max": 0.0}
+            )
+            stats["count"] += 1
+            stats["total"] += latency
+            stats["max"] = max(stats["max"], latency)
+
+    def _send(self, method, url, kwargs):
+        start_time = time.monotonic()
+        try:
+            if self.scheduler is None:
+                return self.session.request(method, url, **kwargs)
+            return self.scheduler.send(
+                lambda: self.session.request(method, url, **kwargs)
+            )
+        finally:
+            self._record(
+                self.endpoint(method, url), time.monotonic() - start_time
+            )
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """
+        :param method: string: HTTP method
+        :param url: string: requested URL
+        :param idempotent: bool: whether request can be safely retried,
+         derived from method by default
+        :param kwargs: passed to :meth:`requests.Session.request`
+        :return: obj: :class:`requests.Response`
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        max_retries = self.max_retries if idempotent else 0
+
+        attempt = 0
+        while True:
+            try:
+                response = self._send(method, url, kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= max_retries:
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRIED_STATUSES
+                    or attempt >= max_retries
+                ):
+                    return response
+                response.close()
+
+            # full jitter spreads retries of concurrent callers
+            self._sleep(
+                random.uniform(
+                    0, min(self.backoff_max, self.backoff_base * 2**attempt)
+                )
+            )
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "latency": {
+                    endpoint: {
+                        "count": stats["count"],
+                        "average": stats["total"] / stats["count"],
+                        "max": stats["max"],
+                    }
+                    for endpoint, stats in self._latencies.items()
+                },
+            }
+
+
+REST_SESSION = RestSession(scheduler=REQUEST_SCHEDULER)
@@ -0,0 +1,118 @@
+import threading
+
+from github import GithubException
+
+from settings import SETTINGS
+
+from .inventory import INVENTORY
+
+
+class TeamIndex:
+    """
+    Per-run slug index of organisation teams.
+
+    Team is fetched directly by its slug, which costs single request whatever
+    size of organisation is. Full listing of teams is made at most once per
+    organisation: when direct lookup isn't available, or when many slugs are
+    resolved at once. Teams of recently refreshed organisations are served
+    from `common.inventory.INVENTORY` without any request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._teams = {}
+        self._indexed_orgs = set()
+
+    def _org_teams(self, org):
+        return self._teams.setdefault(org.login, {})
+
+    def _build_index(self, org):
+        """
+        Lists all teams of organisation with one paginated pass
+        """
+        teams = {team.slug: team for team in org.get_teams()}
+        with self._lock:
+            self._org_teams(org).update(teams)
+            self._indexed_orgs.add(org.login)
+
+    def _lookup_in_index(self, org, slug):
+        if org.login not in self._indexed_orgs:
+            self._build_index(org)
+        with self._lock:
+            return self._org_teams(org).get(slug)
+
+    def get(self, org, slug, live=False):
+        """
+        :param org: obj: of :class:`github.Organization.Organization`
+        :param slug: string: slug of the team
+        :param live: bool: whether to fetch team from API even when it's
+         already known or indexed
+        :return: obj: github.Team.Team or None
+        """
+        if not live:
+            with self._lock:
+                team = self._org_teams(org).get(slug)
+                indexed = org.login in self._indexed_orgs
+            if team is not None or indexed:
+                return team
+
+            team = INVENTORY.get_team(org, slug)
+            if team is not None:
+                self.add(org, team)
+                return team
+
+        if not SETTINGS.GITHUB_TEAM_SLUG_LOOKUP:
+            return self._lookup_in_index(org, slug)
+
+        try:
+            team = org.get_team_by_slug(slug)
+        except GithubException as e:
+            if e.status == 404:
+                INVENTORY.forget_team(org, slug)
+                return None
+            # lookup by slug isn't supported by older GitHub Enterprise
+            return self._lookup_in_index(org, slug)
+
+        self.add(org, team)
+        return team
+
+    def get_many(self, org, slugs, live=False):
+        """
+        Resolves many slugs at once. When there are more slugs than
+        `SETTINGS.TEAM_INDEX_THRESHOLD`, one listing of all teams is cheaper
+        than fetching teams one by one.
+        :param org: obj: of :class:`github.Organization.Organization`
+        :param slugs: iterable: of team slugs
+        :param live: bool: whether to fetch teams from API even when they're
+         already known or indexed
+        :return: dict: of slug to github.Team.Team or None
+        """
+        slugs = list(dict.fromkeys(slugs))
+        with self._lock:
+            known = self._org_teams(org)
+            missing = [slug for slug in slugs if slug not in known]
+            indexed = org.login in self._indexed_orgs
+
+        if (
+            not live
+            and not indexed
+            and len(missing) > SETTINGS.TEAM_INDEX_THRESHOLD
+        ):
+            self._build_index(org)
+
+        return {slug: self.get(org, slug, live) for slug in slugs}
+
+    def add(self, org, team):
+        """
+        Adds created or fetched team to index
+        """
+        with self._lock:
+            self._org_teams(org)[team.slug] = team
+
+    def clear(self):
+        with self._lock:
+            self._teams.clear()
+            self._indexed_orgs.clear()
+
+
+TEAM_INDEX = TeamIndex()
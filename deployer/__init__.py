@@ -1,13 +1,43 @@
 import os
 import json
+import fcntl
+import shutil
+import hashlib
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from itertools import chain
 
 from python_terraform import Terraform, TerraformCommandError as TerraformError
 
+from common import BLOB_CACHE
 from settings import SETTINGS
 
+from .runner import run_streaming
+from .state_diff import (
+    StateNormaliser,
+    diff_states,
+    format_state_changes,
+    states_equal,
+)
+
 ERROR_RETURN_CODE = 1
+TERRAFORM_LOCK_FILE = ".terraform.lock.hcl"
+
+STATE_NORMALISER = StateNormaliser(
+    SETTINGS.STATE_IGNORED_KEYS,
+    SETTINGS.STATE_IGNORED_OUTPUT_VALUES,
+    SETTINGS.STATE_IGNORED_ATTRIBUTES,
+)
+
+# plugin cache isn't safe for concurrent `terraform init`
+_PLUGIN_CACHE_LOCK = threading.Lock()
+
+# first line of `terraform version` output by binary, which isn't replaced
+# while tool runs
+_TERRAFORM_VERSIONS = {}
+_TERRAFORM_VERSIONS_LOCK = threading.Lock()
 
 
 class WrongStateError(Exception):
@@ -19,12 +49,51 @@ class WrongStateError(Exception):
 class TerraformCommandError(TerraformError):
     """
     Redefined existing terraform command error to add content of stdout and stderr.
+    Output of streamed commands is limited to its tail.
     """
 
     def __str__(self):
         return f"{super().__str__()}\nSTDOUT:\n{self.out}\nSTDERR:\n{self.err}"
 
 
+@contextmanager
+def _plugin_cache_lock(cache_dir):
+    """
+    Serialises use of plugin cache by threads and processes
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with _PLUGIN_CACHE_LOCK:
+        with open(os.path.join(cache_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def init_fingerprint(project_dir, paths, working_dir, terraform_version=""):
+    """
+    Hash of terraform version and files, which `terraform get` and
+    `terraform init` depend on
+    :param project_dir: path: directory files are located in
+    :param paths: iterable: of paths of code files relative to project_dir
+    :param working_dir: path: where terraform is initialised
+    :param terraform_version: str: version of terraform binary
+    :return: str
+    """
+    digest = hashlib.sha256()
+    digest.update(terraform_version.encode("utf-8") + b"\0")
+    lock_file = working_dir / TERRAFORM_LOCK_FILE
+    files = [(str(path), project_dir / path) for path in sorted(set(paths))]
+    if lock_file.exists():
+        files.append((TERRAFORM_LOCK_FILE, lock_file))
+    for name, path in files:
+        digest.update(name.encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
 class TerraformDeployer(Terraform):
     def __init__(
         self, parsed_args, code_files, config_files, testing_ending=None
@@ -45,29 +114,126 @@ class TerraformDeployer(Terraform):
         os.makedirs(self.working_dir, exist_ok=True)
 
         for file_ in chain(code_files, config_files):
-            with open(self.project_dir / file_.path, "wb") as f:
+            # files fetched in bulk can be located in nested module directories
+            file_path = self.project_dir / file_.path
+            os.makedirs(file_path.parent, exist_ok=True)
+            local_path = getattr(file_, "local_path", None)
+            if local_path:
+                shutil.copyfile(local_path, file_path)
+                continue
+            sha = getattr(file_, "sha", None)
+            if sha and BLOB_CACHE.copy_to(sha, file_path):
+                continue
+            with open(file_path, "wb") as f:
                 f.write(file_.decoded_content)
 
         super(TerraformDeployer, self).__init__(working_dir=self.working_dir)
+        self.plugin_cache_dir = os.environ.get(
+            "TF_PLUGIN_CACHE_DIR", str(SETTINGS.TERRAFORM_PLUGIN_CACHE_DIR)
+        )
 
-        self.command("get")  # get terraform modules
-        self.init()
+        self.init_skipped = False
+        self._init_once([file_.path for file_ in code_files])
 
         self._create_workspace()
 
         self.current_state = self.get_state()
         self.previous_state = None
 
+    def cmd(self, cmd, *args, **kwargs):
+        """
+        Same as `Terraform.cmd`, but output is streamed to "deployer" logger
+        line by line, and only its tail is returned, unless `capture` is set.
+        :param capture: bool: whether to return complete stdout
+        :return: tuple: of return code, stdout and stderr
+        """
+        capture = kwargs.pop("capture", False)
+        for option in ("capture_output", "raise_on_error", "synchronous"):
+            kwargs.pop(option, None)
+
+        cmds = self.generate_cmd_string(cmd, *args, **kwargs)
+        env = os.environ.copy() if self.is_env_vars_included else {}
+        # plugin cache is passed to terraform only, environment of the tool
+        # itself is left intact
+        env.setdefault("TF_PLUGIN_CACHE_DIR", self.plugin_cache_dir)
+        try:
+            result = run_streaming(
+                cmds,
+                cwd=self.working_dir,
+                env=env,
+                name=f"{self.project_id} {cmd.split()[0]}",
+                capture=capture,
+            )
+        finally:
+            self.temp_var_files.clean_up()
+
+        if result[0] == 0:
+            self.read_state_file()
+        return result
+
     def command(self, command, *args, **kwargs):
         result = self.cmd(command, *args, **kwargs)
         self._raise_if_bad_return_code(command, *result)
         return result
 
+    def _terraform_version(self):
+        """
+        Only first line of `terraform version` is used, following ones list
+        providers, which change with init
+        :return: str: e.g. "Terraform v0.12.29"
+        """
+        with _TERRAFORM_VERSIONS_LOCK:
+            version = _TERRAFORM_VERSIONS.get(self.terraform_bin_path)
+            if version is None:
+                output = self.command("version", capture=True)[1]
+                version = (output.splitlines() or [""])[0].strip()
+                _TERRAFORM_VERSIONS[self.terraform_bin_path] = version
+        return version
+
+    def _init_once(self, code_paths):
+        """
+        Gets modules and initialises working directory, unless terraform
+        version, module sources and lock file didn't change since last
+        successful init. Providers are shared by all deployers through
+        plugin cache, so only init, which installs them, is serialised, while
+        modules are got concurrently.
+        """
+        fingerprint_file = (
+            self.working_dir
+            / ".terraform"
+            / SETTINGS.TERRAFORM_INIT_FINGERPRINT_FILE
+        )
+        terraform_version = self._terraform_version()
+        fingerprint = init_fingerprint(
+            self.project_dir, code_paths, self.working_dir, terraform_version
+        )
+        if (
+            fingerprint_file.exists()
+            and fingerprint_file.read_text() == fingerprint
+        ):
+            self.init_skipped = True
+            return
+
+        self.command("get")  # get terraform modules
+        with _plugin_cache_lock(self.plugin_cache_dir):
+            self._raise_if_bad_return_code("init", *self.init())
+
+        # lock file is created by first init
+        os.makedirs(fingerprint_file.parent, exist_ok=True)
+        fingerprint_file.write_text(
+            init_fingerprint(
+                self.project_dir,
+                code_paths,
+                self.working_dir,
+                terraform_version,
+            )
+        )
+
     def get_state(self):
         """
         Fetches the current state.
         """
-        result = self.command("state pull")
+        result = self.command("state pull", capture=True)
         stdout = result[1]
         return json.loads(stdout) if stdout else {}
 
@@ -77,6 +243,7 @@ class TerraformDeployer(Terraform):
         skip_delete = "true" if self.testing_ending else "false"
 
         plan_options = [
+            "-no-color",
             "-input=false",
             f"-out={plan_path}",
             f"-var=project_id={self.project_id}",
@@ -85,7 +252,7 @@ class TerraformDeployer(Terraform):
         ]
 
         if destroy:
-            plan_options.insert(0, "-destroy")
+            plan_options.insert(1, "-destroy")
 
         arguments = " ".join(plan_options)
         self.command(f"plan {arguments}")
@@ -125,7 +292,7 @@ class TerraformDeployer(Terraform):
         """
         Creates workspace if it's not exists and selects it.
         """
-        workspaces_list = self.command(f"workspace list")[1]
+        workspaces_list = self.command(f"workspace list", capture=True)[1]
         if self.project_id not in workspaces_list:
             self.command(f"workspace new {self.project_id}")
         self.command(f"workspace select {self.project_id}")
@@ -134,37 +301,11 @@ class TerraformDeployer(Terraform):
 def _prepare_state_for_compare(state):
     """
     State obtained from `terraform state pull` can contain items
-    that differs from one deployment from another, so we should remove them
-    to compare states.
+    that differs from one deployment from another, so we should ignore them
+    to compare states. Returned view shares unchanged items with state, which
+    is left intact.
     """
-    sanitized_state = state.copy()
-
-    global_keys_to_remove = ["serial", "lineage"]
-
-    for key in global_keys_to_remove:
-        sanitized_state.pop(key, None)
-
-    # delete unique project_id from state
-    outputs = sanitized_state.get("outputs", {})
-    if outputs.get("project_id", {}) is not None:
-        outputs.get("project_id", {}).pop("value", None)
-
-    # delete unique attributes of resources
-    instance_attributes_keys_to_remove = [
-        "id",
-        "name",
-        "number",
-        "project_id",
-        "project",
-        "skip_delete",
-    ]
-    for resource in sanitized_state.get("resources", []):
-        for instance in resource.get("instances", []):
-            attributes = instance.get("attributes") or {}
-            for key in instance_attributes_keys_to_remove:
-                attributes.pop(key, None)
-
-    return sanitized_state
+    return STATE_NORMALISER.normalise(state)
 
 
 def are_states_equal(test_state, real_state):
@@ -174,19 +315,31 @@ def are_states_equal(test_state, real_state):
     test_state = _prepare_state_for_compare(test_state)
     real_state = _prepare_state_for_compare(real_state)
 
-    return test_state == real_state
+    return states_equal(test_state, real_state)
 
 
 def assert_deployments_equal(test_state, real_state):
-    if not are_states_equal(test_state, real_state):
+    """
+    Raises error listing only differing resources and attribute paths
+    """
+    changes = diff_states(
+        _prepare_state_for_compare(test_state),
+        _prepare_state_for_compare(real_state),
+    )
+    if changes:
         raise WrongStateError(
-            f"\nStates are different.\nCurrent state:\n{test_state}\n\nDeployment state:\n{real_state}"
+            f"\nStates are different, {len(changes)} changes from test to "
+            "deployment state:\n"
+            + format_state_changes(changes, SETTINGS.STATE_DIFF_MAX_CHANGES)
         )
 
 
 def assert_deployments_not_equal(test_state, real_state):
     if are_states_equal(test_state, real_state):
-        raise WrongStateError(f"\nStates are equal:\n{test_state}")
+        resources = len(test_state.get("resources") or [])
+        raise WrongStateError(
+            f"\nStates are equal, {resources} resources in both states"
+        )
 
 
 def assert_project_id_did_not_change(project_id, state):
@@ -207,39 +360,132 @@ def assert_deployment_deleted(state):
         WrongStateError(f"\nProject was not deleted, current state:\n{state}")
 
 
+class PhaseTimer:
+    """
+    Records start and end of deploy phases, which may run concurrently
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    def timed(self, name, func):
+        """
+        :return: callable: which calls `func` and records its duration as
+         phase `name`
+        """
+
+        def wrapper(*args, **kwargs):
+            start = self.clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._phases[name] = (start, self.clock())
+
+        return wrapper
+
+    @property
+    def timings(self):
+        """
+        :return: dict: of phase name to its duration in seconds
+        """
+        with self._lock:
+            return {
+                name: end - start for name, (start, end) in self._phases.items()
+            }
+
+    @property
+    def wall_time(self):
+        with self._lock:
+            if not self._phases:
+                return 0.0
+            return max(end for _, end in self._phases.values()) - min(
+                start for start, _ in self._phases.values()
+            )
+
+    @property
+    def overlap(self):
+        """
+        :return: float: seconds saved by running phases concurrently
+        """
+        return sum(self.timings.values()) - self.wall_time
+
+    def summary(self):
+        phases = ", ".join(
+            f"{name} {duration:.2f}s" for name, duration in self.timings.items()
+        )
+        return (
+            f"Deploy phases: {phases}. Total {self.wall_time:.2f}s, "
+            f"{self.overlap:.2f}s saved by overlapping"
+        )
+
+
 def deploy(parsed_args, code, config, testing_ending=None):
     """
-    deploy infrastructure using code and configuration supplied
+    deploy infrastructure using code and configuration supplied.
+
+    Both deployers are prepared concurrently, though only writing of files
+    and `terraform get` overlap, as `terraform init` holds plugin cache lock.
+    Plans, which don't depend on the running apply, are created while it
+    runs: plan of real deployment during test apply, destroy plan of test
+    deployment during real apply.
+    Real deployment is still applied only after test deployment was checked,
+    and test deployment is destroyed only after real deployment was checked.
     :param parsed_args: object: which contains arguments required to run code
     :param code: list: of files containing deployment code
     :param config: list: of files containing deployment configuration
     :param testing_ending: string: unique for code and config repos combination of short hashes
     """
-    test_deployer = TerraformDeployer(parsed_args, code, config, testing_ending)
-    real_deployer = TerraformDeployer(parsed_args, code, config)
-
-    test_deployment = threading.Thread(target=test_deployer.run)
-    real_deployment = threading.Thread(target=real_deployer.run)
-    test_deployment_deletion = threading.Thread(target=test_deployer.delete)
+    timer = PhaseTimer()
+    with ThreadPoolExecutor(
+        max_workers=2, thread_name_prefix="deploy"
+    ) as executor:
+        test_preparation = executor.submit(
+            timer.timed("prepare_test", TerraformDeployer),
+            parsed_args,
+            code,
+            config,
+            testing_ending,
+        )
+        real_preparation = executor.submit(
+            timer.timed("prepare_real", TerraformDeployer),
+            parsed_args,
+            code,
+            config,
+        )
+        test_deployer = test_preparation.result()
+        real_deployer = real_preparation.result()
 
-    test_deployment.run()
-    assert_project_id_did_not_change(
-        test_deployer.project_id, test_deployer.current_state
-    )
-    assert_deployments_not_equal(
-        test_deployer.current_state, real_deployer.current_state
-    )
+        real_plan = executor.submit(
+            timer.timed("real_plan", real_deployer.create_plan)
+        )
+        timer.timed("test_apply", test_deployer.run)()
+        assert_project_id_did_not_change(
+            test_deployer.project_id, test_deployer.current_state
+        )
+        assert_deployments_not_equal(
+            test_deployer.current_state, real_deployer.current_state
+        )
 
-    real_deployment.run()
-    assert_project_id_did_not_change(
-        real_deployer.project_id, real_deployer.current_state
-    )
-    assert_deployments_equal(
-        test_deployer.current_state, real_deployer.current_state
-    )
+        test_destroy_plan = executor.submit(
+            timer.timed("test_destroy_plan", test_deployer.create_plan),
+            destroy=True,
+        )
+        timer.timed("real_apply", real_deployer.run)(real_plan.result())
+        assert_project_id_did_not_change(
+            real_deployer.project_id, real_deployer.current_state
+        )
+        assert_deployments_equal(
+            test_deployer.current_state, real_deployer.current_state
+        )
 
-    test_deployment_deletion.run()
-    assert_deployment_deleted(test_deployer.current_state)
+        timer.timed("test_destroy", test_deployer.run)(
+            test_destroy_plan.result()
+        )
+        assert_deployment_deleted(test_deployer.current_state)
 
+    print(timer.summary())
     print("Success!")
     return True
@@ -0,0 +1,124 @@
+import logging
+import re
+import subprocess
+import threading
+
+from collections import deque
+
+from settings import SETTINGS
+
+LOG = logging.getLogger("deployer")
+
+_RESOURCE_DONE_RE = re.compile(
+    r": (?:Creation|Modifications|Destruction|Read) complete"
+)
+_PLAN_RE = re.compile(r"Plan: (\d+) to add, (\d+) to change, (\d+) to destroy")
+# colors, which terraform prints unless run with -no-color
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+class TerraformProgress:
+    """
+    Counts resources completed by running plan or apply from its output
+    """
+
+    def __init__(self):
+        self.total = None
+        self.done = 0
+
+    def feed(self, line):
+        """
+        :param line: str: line of terraform output
+        :return: bool: whether progress changed
+        """
+        line = _ANSI_RE.sub("", line)
+        plan = _PLAN_RE.search(line)
+        if plan:
+            self.total = sum(int(count) for count in plan.groups())
+            return True
+        if _RESOURCE_DONE_RE.search(line):
+            self.done += 1
+            return True
+        return False
+
+    def __str__(self):
+        if self.total is None:
+            return f"{self.done} resources done"
+        return f"{self.done}/{self.total} resources done"
+
+
+class OutputTail:
+    """
+    Keeps only last lines of output, remembering how many were dropped
+    """
+
+    def __init__(self, max_lines):
+        self.lines = deque(maxlen=max_lines)
+        self.total = 0
+
+    def append(self, line):
+        self.lines.append(line)
+        self.total += 1
+
+    def __str__(self):
+        omitted = self.total - len(self.lines)
+        header = [f"[... {omitted} earlier lines omitted]"] if omitted else []
+        return "\n".join(header + list(self.lines))
+
+
+def run_streaming(
+    cmds, cwd=None, env=None, name="terraform", capture=False, logger=LOG
+):
+    """
+    Runs command and logs every line of its output as soon as it's printed.
+    Only bounded tail of output is kept in memory for error reports.
+    :param cmds: list: command and its arguments
+    :param cwd: path: working directory of command
+    :param env: dict: environment of command
+    :param name: str: prefix of logged lines
+    :param capture: bool: whether to keep and return complete stdout, for
+     commands which output is parsed, e.g. `terraform state pull`
+    :param logger: obj: logging.Logger lines are sent to
+    :return: tuple: of return code, stdout and stderr
+    """
+    process = subprocess.Popen(
+        cmds,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        encoding="utf-8",
+        errors="replace",
+        bufsize=1,
+    )
+
+    stderr_tail = OutputTail(SETTINGS.TERRAFORM_OUTPUT_TAIL_LINES)
+
+    def pump_stderr():
+        for line in process.stderr:
+            line = line.rstrip("\n")
+            stderr_tail.append(line)
+            logger.warning("%s: %s", name, line)
+
+    stderr_thread = threading.Thread(target=pump_stderr, daemon=True)
+    stderr_thread.start()
+
+    stdout_tail = OutputTail(SETTINGS.TERRAFORM_OUTPUT_TAIL_LINES)
+    captured = []
+    progress = TerraformProgress()
+    for line in process.stdout:
+        line = line.rstrip("\n")
+        if capture:
+            captured.append(line)
+            logger.debug("%s: %s", name, line)
+            continue
+        stdout_tail.append(line)
+        logger.info("%s: %s", name, line)
+        if progress.feed(line):
+            logger.info("%s: %s", name, progress)
+
+    stderr_thread.join()
+    return_code = process.wait()
+    stdout = "\n".join(captured) if capture else str(stdout_tail)
+    return return_code, stdout, str(stderr_tail)
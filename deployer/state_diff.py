@@ -0,0 +1,235 @@
+import hashlib
+import json
+
+from collections import namedtuple
+
+StateChange = namedtuple("StateChange", ["address", "status", "paths"])
+StateChange.__doc__ = """
+Difference of one resource instance, output or top level key between two
+states. `status` is one of "added", "removed" or "changed", `paths` lists
+changed attribute paths of changed entry.
+"""
+
+
+class StateNormaliser:
+    """
+    Builds view of terraform state without items, which differ from one
+    deployment to another. Only containers on the path to ignored items are
+    rebuilt, everything else is shared with original state, which is never
+    modified, so normalising is cheap and safe to repeat.
+
+    Ignore rules are compiled once into per resource type sets.
+    """
+
+    def __init__(self, ignored_keys, ignored_output_values, ignored_attributes):
+        """
+        :param ignored_keys: iterable: top level keys of state
+        :param ignored_output_values: iterable: outputs, which values are
+         ignored
+        :param ignored_attributes: dict: of resource type to attributes of
+         its instances to ignore, attributes of "*" are ignored for all types
+        """
+        self.ignored_keys = frozenset(ignored_keys)
+        self.ignored_output_values = frozenset(ignored_output_values)
+        self._default_attributes = frozenset(ignored_attributes.get("*", ()))
+        self._attributes = {
+            resource_type: self._default_attributes | frozenset(attributes)
+            for resource_type, attributes in ignored_attributes.items()
+            if resource_type != "*"
+        }
+
+    def ignored_attributes(self, resource_type):
+        return self._attributes.get(resource_type, self._default_attributes)
+
+    def _outputs(self, outputs):
+        if not outputs or not self.ignored_output_values & outputs.keys():
+            return outputs
+        return {
+            name: (
+                {key: value for key, value in output.items() if key != "value"}
+                if name in self.ignored_output_values
+                and isinstance(output, dict)
+                else output
+            )
+            for name, output in outputs.items()
+        }
+
+    def _resource(self, resource):
+        ignored = self.ignored_attributes(resource.get("type"))
+        instances = resource.get("instances")
+        if not ignored or not instances:
+            return resource
+
+        normalised_instances = []
+        for instance in instances:
+            attributes = instance.get("attributes")
+            if attributes and ignored & attributes.keys():
+                instance = dict(
+                    instance,
+                    attributes={
+                        key: value
+                        for key, value in attributes.items()
+                        if key not in ignored
+                    },
+                )
+            normalised_instances.append(instance)
+        return dict(resource, instances=normalised_instances)
+
+    def normalise(self, state):
+        """
+        :param state: dict: terraform state
+        :return: dict: normalised view of state
+        """
+        view = {
+            key: value
+            for key, value in state.items()
+            if key not in self.ignored_keys
+        }
+        if "outputs" in view:
+            view["outputs"] = self._outputs(view["outputs"])
+        if view.get("resources"):
+            view["resources"] = [
+                self._resource(resource) for resource in view["resources"]
+            ]
+        return view
+
+
+def _hash(value):
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    ).digest()
+
+
+def resource_address(resource, index_key=None, deposed=None):
+    """
+    :param resource: dict: resource of terraform state
+    :param index_key: int or str: key of instance created by count or for_each
+    :param deposed: str: key of deposed object, which is kept beside current
+     instance at the same address until it's destroyed
+    :return: str: address of resource instance as terraform shows it
+    """
+    address = f"{resource.get('type')}.{resource.get('name')}"
+    if resource.get("mode") == "data":
+        address = "data." + address
+    if resource.get("module"):
+        address = f"{resource['module']}.{address}"
+    if index_key is not None:
+        address += f"[{json.dumps(index_key)}]"
+    if deposed is not None:
+        address += f" (deposed object {deposed})"
+    return address
+
+
+def index_state(state):
+    """
+    Indexes state entries by address: resource instances, outputs and other
+    top level keys
+    :param state: dict: terraform state
+    :return: dict: of address to tuple of hash and entry
+    """
+    entries = {}
+    for key, value in state.items():
+        if key not in ("resources", "outputs"):
+            entries["state." + key] = value
+    for name, output in (state.get("outputs") or {}).items():
+        entries["output." + name] = output
+    for resource in state.get("resources") or []:
+        meta = {
+            key: value for key, value in resource.items() if key != "instances"
+        }
+        instances = resource.get("instances") or []
+        if not instances:
+            entries[resource_address(resource)] = meta
+        for instance in instances:
+            address = resource_address(
+                resource, instance.get("index_key"), instance.get("deposed")
+            )
+            entries[address] = dict(meta, **instance)
+    return {
+        address: (_hash(entry), entry) for address, entry in entries.items()
+    }
+
+
+def changed_paths(old, new, prefix=""):
+    """
+    :return: list: of dotted paths, where values of old and new differ
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        paths = []
+        for key in sorted(old.keys() | new.keys(), key=str):
+            path = f"{prefix}.{key}" if prefix else str(key)
+            if key not in old or key not in new:
+                paths.append(path)
+            elif old[key] != new[key]:
+                paths.extend(changed_paths(old[key], new[key], path))
+        return paths
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        paths = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            if old_item != new_item:
+                paths.extend(
+                    changed_paths(old_item, new_item, f"{prefix}[{index}]")
+                )
+        return paths
+    return [prefix]
+
+
+def diff_indexes(old_index, new_index):
+    """
+    Compares indexed states in linear time, attribute paths are computed only
+    for entries which hashes differ
+    :return: list: of :class:`StateChange` ordered by address
+    """
+    changes = []
+    for address in sorted(old_index.keys() | new_index.keys()):
+        if address not in new_index:
+            changes.append(StateChange(address, "removed", []))
+        elif address not in old_index:
+            changes.append(StateChange(address, "added", []))
+        elif old_index[address][0] != new_index[address][0]:
+            changes.append(
+                StateChange(
+                    address,
+                    "changed",
+                    changed_paths(old_index[address][1], new_index[address][1]),
+                )
+            )
+    return changes
+
+
+def diff_states(old_state, new_state):
+    """
+    :param old_state: dict: normalised terraform state
+    :param new_state: dict: normalised terraform state
+    :return: list: of :class:`StateChange`
+    """
+    return diff_indexes(index_state(old_state), index_state(new_state))
+
+
+def states_equal(old_state, new_state):
+    """
+    Compares only hashes of indexed entries
+    :return: bool
+    """
+    old_index = index_state(old_state)
+    new_index = index_state(new_state)
+    return old_index.keys() == new_index.keys() and all(
+        old_index[address][0] == new_index[address][0] for address in old_index
+    )
+
+
+def format_state_changes(changes, limit):
+    """
+    :param changes: list: of :class:`StateChange`
+    :param limit: int: maximum amount of listed changes
+    :return: str
+    """
+    symbols = {"added": "+", "removed": "-", "changed": "~"}
+    lines = [
+        f"{symbols[change.status]} {change.address}"
+        + (f": {', '.join(change.paths)}" if change.paths else "")
+        for change in changes[:limit]
+    ]
+    if len(changes) > limit:
+        lines.append(f"... and {len(changes) - limit} more")
+    return "\n".join(lines)
@@ -20,7 +20,13 @@ class MetricsRegistry:
                 "successes": {"metric_type": Counter, "value_type": int, "value": None,
                               "unit": None},
                 "failures": {"metric_type": Counter, "value_type": int, "value": None,
-                             "unit": None}
+                             "unit": None},
+                "source_resolution_time": {"metric_type": Gauge, "value_type": float,
+                                           "value": None, "unit": "seconds"},
+                "vcs_rate_limit_remaining": {"metric_type": Gauge, "value_type": int,
+                                             "value": None, "unit": None},
+                "vcs_wait_time": {"metric_type": Gauge, "value_type": float,
+                                  "value": None, "unit": "seconds"}
             },
             "config": {
                 "time": {"metric_type": Gauge, "value_type": float, "value": None,
@@ -30,7 +36,25 @@ class MetricsRegistry:
                 "successes": {"metric_type": Counter, "value_type": int, "value": None,
                               "unit": None},
                 "failures": {"metric_type": Counter, "value_type": int, "value": None,
-                             "unit": None}
+                             "unit": None},
+                "vcs_rate_limit_remaining": {"metric_type": Gauge, "value_type": int,
+                                             "value": None, "unit": None},
+                "vcs_wait_time": {"metric_type": Gauge, "value_type": float,
+                                  "value": None, "unit": "seconds"}
+            },
+            "inventory": {
+                "time": {"metric_type": Gauge, "value_type": float, "value": None,
+                         "unit": "seconds"},
+                "total": {"metric_type": Counter, "value_type": int, "value": None,
+                          "unit": None},
+                "successes": {"metric_type": Counter, "value_type": int, "value": None,
+                              "unit": None},
+                "failures": {"metric_type": Counter, "value_type": int, "value": None,
+                             "unit": None},
+                "vcs_rate_limit_remaining": {"metric_type": Gauge, "value_type": int,
+                                             "value": None, "unit": None},
+                "vcs_wait_time": {"metric_type": Gauge, "value_type": float,
+                                  "value": None, "unit": "seconds"}
             },
             "check": {
                 "time": {"metric_type": Gauge, "value_type": float, "value": None,
@@ -57,6 +81,18 @@ class MetricsRegistry:
     def metrics(self):
         return self._metrics[self.metric_set]
 
+    @property
+    def collected_metrics(self):
+        """
+        Metrics of current metric set, that have value. Optional metrics, which
+        weren't collected during run, are not reported.
+        """
+        return {
+            metric_name: metric_dict
+            for metric_name, metric_dict in self.metrics.items()
+            if metric_dict["value"] is not None
+        }
+
     def add_metric(self, metric_name: str, metric_value: Any):
         if metric_name not in self.metrics:
             raise KeyError
@@ -33,8 +33,9 @@ class CloudWatchMetrics(Metrics):
         }
 
         prepared_metrics = {}
+        collected_metrics = self.metrics_registry.collected_metrics
 
-        for metric_name, metric_dict in self.metrics_registry.metrics.items():
+        for metric_name, metric_dict in collected_metrics.items():
             cloudwatch_metric_name = metric_name.upper()
 
             prepared_metrics[cloudwatch_metric_name] = {
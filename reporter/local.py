@@ -123,8 +123,9 @@ class LocalMetrics(Metrics):
 
     def prepare_metrics(self):
         prepared_metrics = {}
+        collected_metrics = self.metrics_registry.collected_metrics
 
-        for metric_name, metric_dict in self.metrics_registry.metrics.items():
+        for metric_name, metric_dict in collected_metrics.items():
             prepared_metric_dict = metric_dict.copy()
 
             prepared_metric_dict.pop("metric_type")
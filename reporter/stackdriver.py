@@ -72,8 +72,9 @@ class StackdriverMetrics(Metrics):
         }
 
         prepared_metrics = {}
+        collected_metrics = self.metrics_registry.collected_metrics
 
-        for metric_name, metric_dict in self.metrics_registry.metrics.items():
+        for metric_name, metric_dict in collected_metrics.items():
             prepared_metric_dict = metric_dict.copy()
 
             if metric_name in ("total", "successes", "failures"):
@@ -28,9 +28,47 @@ DEFAULT_TOKEN = (
     else ""
 )
 SUPPORTED_CLOUDS = ["gcp"]
-SUPPORTED_VCS_PLATFORMS = ["github"]
+SUPPORTED_VCS_PLATFORMS = ["github", "local-git"]
 SUPPORTED_ORCHESTRATORS = ["terraform"]
+# "contents" lists a single directory through the Contents API and loads
+# every file separately, "tree" pulls the whole directory subtree with one
+# recursive Git Trees request and batched GraphQL blob reads, "archive"
+# streams one tarball of the repository and extracts the directory from it
+SUPPORTED_FETCH_MODES = ["contents", "tree", "archive"]
+DEFAULT_FETCH_MODE = "contents"
+GITHUB_BLOB_BATCH_SIZE = 50
+# threads used to fetch code and config files and commit hashes concurrently
+SOURCE_RESOLUTION_WORKERS = 4
+# branches and tags are resolved to commit hash at most once per this many
+# seconds, and all reads of the run are pinned to resolved commit
+REF_CACHE_TTL = 60
 VALID_PROJECT_ID_FORMAT = "^[a-z]{4}-[a-z0-9]{4,31}-(?:dev|prod|test)$"
+# page size of paginated GitHub listings, 100 is maximum allowed by API
+GITHUB_PER_PAGE = 100
+# teams are fetched directly by slug, disable for GitHub Enterprise versions
+# without `GET /orgs/:org/teams/:team_slug` to always use full team index
+GITHUB_TEAM_SLUG_LOOKUP = True
+# resolving more slugs at once than this lists all teams of organisation
+TEAM_INDEX_THRESHOLD = 10
+# all GitHub requests are sent through rate limit aware scheduler, which
+# allows up to VCS_MAX_CONCURRENCY requests at once. When remaining quota
+# falls below VCS_LOW_REMAINING, concurrency is reduced proportionally and
+# the rest of quota is spread evenly until its reset
+VCS_MAX_CONCURRENCY = 8
+VCS_LOW_REMAINING = 500
+# requests rejected by rate limit (403/429) are retried VCS_MAX_RETRIES times,
+# after `Retry-After` or exponential backoff between the bounds (seconds)
+VCS_MAX_RETRIES = 5
+VCS_BACKOFF_BASE = 1.0
+VCS_BACKOFF_MAX = 60.0
+# raw REST calls not covered by PyGithub share pool of keep-alive connections,
+# have (connect, read) timeouts in seconds, and idempotent ones are retried on
+# connection errors and 5xx with jittered exponential backoff
+REST_POOL_SIZE = 10
+REST_TIMEOUT = (5, 30)
+REST_MAX_RETRIES = 3
+REST_BACKOFF_BASE = 0.5
+REST_BACKOFF_MAX = 8.0
 
 
 # ############## Code control settings ##############
@@ -74,10 +112,94 @@ REMOTE_FILES = {
     "project_settings_file": "gcp/project_settings.auto.tfvars.json",
     "iam_file": "gcp/iam.auto.tfvars.json",
 }
+# independent team and permission API calls of `config` command run
+# concurrently on this many threads
+CONFIG_SETUP_WORKERS = 4
+# `config --manifest` sets up this many projects at once by default, and
+# stores per-project results next to manifest for resuming
+BULK_SETUP_WORKERS = 4
+BULK_STATE_SUFFIX = ".state.json"
+# rendered config files memoized by `config`, oldest are dropped, so memory
+# of bulk runs doesn't grow with amount of projects
+TEMPLATE_MAX_RENDERS = 256
 
 
 # ############## Deployer settings ##############
 WORKING_DIR_BASE = Path("/tmp")
+# providers downloaded by `terraform init` are shared by all deployers, unless
+# TF_PLUGIN_CACHE_DIR is already set in environment
+TERRAFORM_PLUGIN_CACHE_DIR = WORKING_DIR_BASE / "ecat_terraform_plugin_cache"
+# fingerprint of module sources and lock file of last successful init, stored
+# inside .terraform directory of working directory
+TERRAFORM_INIT_FINGERPRINT_FILE = "ecat_init_fingerprint"
+# terraform output is streamed to log, only this many last lines of stdout
+# and stderr are kept for error reports
+TERRAFORM_OUTPUT_TAIL_LINES = 200
+# differing states are reported with at most this many changes
+STATE_DIFF_MAX_CHANGES = 50
+# items of state, which differ between test and real deployment of the same
+# code, and are ignored when these states are compared
+STATE_IGNORED_KEYS = ["serial", "lineage"]
+STATE_IGNORED_OUTPUT_VALUES = ["project_id"]
+# attributes of resource instances ignored per resource type, attributes of
+# "*" are ignored for all types
+STATE_IGNORED_ATTRIBUTES = {
+    "*": ["id", "name", "number", "project_id", "project", "skip_delete"],
+}
+
+
+# ############## Blob cache settings ##############
+# code and config files are cached by git blob hash, so unchanged files are
+# never downloaded twice
+BLOB_CACHE_DIR = WORKING_DIR_BASE / "ecat_blob_cache"
+BLOB_CACHE_MAX_SIZE = 512 * 1024 * 1024  # bytes
+
+
+# ############## Archive fetch mode settings ##############
+# repository archives are extracted here once per commit
+ARCHIVE_DIR = WORKING_DIR_BASE / "ecat_archives"
+ARCHIVE_CHUNK_SIZE = 64 * 1024  # bytes
+ARCHIVE_DOWNLOAD_TIMEOUT = 60  # seconds
+# extracted commits of each repository, which are kept in ARCHIVE_DIR
+ARCHIVE_KEEP_COMMITS = 5
+
+
+# ############## Local git VCS platform settings ##############
+# `local-git` platform reads code and config repositories from bare mirrors
+# kept here, remote URLs are built from template with `{org}` and `{repo}`
+LOCAL_GIT_MIRROR_DIR = WORKING_DIR_BASE / "ecat_git_mirrors"
+DEFAULT_GIT_REMOTE_URL = "https://github.com/{org}/{repo}.git"
+# mirror is fetched at most once per this many seconds
+LOCAL_GIT_FETCH_INTERVAL = 60
+GIT_BINARY = "git"
+
+
+# ############## GitHub HTTP cache settings ##############
+# GitHub API responses are revalidated with ETag / Last-Modified, so unchanged
+# resources come back as 304 and don't consume rate limit
+GITHUB_HTTP_CACHE_ENABLED = True
+GITHUB_HTTP_CACHE_DIR = WORKING_DIR_BASE / "ecat_http_cache"
+GITHUB_HTTP_CACHE_MAX_SIZE = 256 * 1024 * 1024  # bytes
+
+
+# ############## Org inventory settings ##############
+# repositories, teams, team permissions and branch protection of organisation
+# are indexed in local SQLite database by `inventory refresh` command
+INVENTORY_ENABLED = True
+INVENTORY_DB = WORKING_DIR_BASE / "ecat_inventory.sqlite"
+# lookups are served from index only within this many seconds after refresh
+INVENTORY_MAX_AGE = 24 * 60 * 60
+# incremental refresh doesn't notice deleted repositories, so all of them are
+# relisted at least once per this many seconds
+INVENTORY_FULL_REFRESH_INTERVAL = 7 * 24 * 60 * 60
+# branch protection and team permissions don't change `updated_at` of
+# repository, so protection of repositories and repositories of teams are
+# rechecked by incremental refresh, when they are older than this many seconds
+INVENTORY_RECHECK_INTERVAL = 60 * 60
+# `inventory export` overwrites this snapshot of organisation, while
+# `config --output-data` appends records of configured projects to its own one
+EXPORT_SNAPSHOT_FILE = WORKING_DIR_BASE / "ecat_org_snapshot.jsonl.gz"
+OUTPUT_DATA_SNAPSHOT_FILE = WORKING_DIR_BASE / "ecat_project_data.jsonl.gz"
 
 
 # ############## Reporter settings ##############
@@ -0,0 +1,109 @@
+import json
+
+from argparse import Namespace
+
+import pytest
+
+from code_control.bulk import ManifestError, bulk_setup, load_manifest
+from settings import SETTINGS
+
+
+@pytest.fixture
+def manifest(tmpdir):
+    manifest = tmpdir.join("projects.csv")
+    manifest.write(
+        "project_id,config_repo,force,branch_protection\n"
+        "abcd-first-dev,,,\n"
+        "abcd-second-prod,second-config,yes,high\n"
+    )
+    return manifest
+
+
+@pytest.fixture
+def bulk_args(manifest):
+    return Namespace(
+        manifest=manifest.strpath,
+        manifest_workers=2,
+        project_id=SETTINGS.DEFAULT_PROJECT_NAME,
+        config_repo=SETTINGS.DEFAULT_PROJECT_NAME,
+        force=False,
+        branch_permissions=SETTINGS.PROTECTED_BRANCH,
+    )
+
+
+def test_csv_manifest_overrides(manifest):
+    assert load_manifest(manifest.strpath) == [
+        {"project_id": "abcd-first-dev"},
+        {
+            "project_id": "abcd-second-prod",
+            "config_repo": "second-config",
+            "force": True,
+            "branch_protection": "high",
+        },
+    ]
+
+
+@pytest.mark.parametrize(
+    "extension, content",
+    [
+        (".json", '{"projects": [{"project_id": "abcd-first-dev"}]}'),
+        (".yaml", "projects:\n  - project_id: abcd-first-dev\n"),
+    ],
+)
+def test_json_and_yaml_manifests(tmpdir, extension, content):
+    manifest = tmpdir.join("projects" + extension)
+    manifest.write(content)
+
+    assert load_manifest(manifest.strpath) == [{"project_id": "abcd-first-dev"}]
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        {"project_id": "Not Valid"},
+        {"project_id": "abcd-first-dev", "unknown": 1},
+        {"project_id": "abcd-first-dev", "branch_protection": "max"},
+        {"config_repo": "repo"},
+    ],
+)
+def test_invalid_manifest_entries(tmpdir, entry):
+    manifest = tmpdir.join("projects.json")
+    manifest.write(json.dumps([entry]))
+
+    with pytest.raises(ManifestError):
+        load_manifest(manifest.strpath)
+
+
+def test_projects_set_up_with_overrides(bulk_args):
+    calls = []
+
+    results = bulk_setup(bulk_args, calls.append)
+
+    assert {result["status"] for result in results.values()} == {"success"}
+    args = {call.project_id: call for call in calls}
+    assert args["abcd-first-dev"].config_repo == "abcd-first-dev"
+    assert not args["abcd-first-dev"].force
+    assert args["abcd-second-prod"].config_repo == "second-config"
+    assert args["abcd-second-prod"].force
+    assert (
+        args["abcd-second-prod"].branch_permissions
+        == SETTINGS.HIGHLY_PROTECTED_BRANCH
+    )
+    assert bulk_args.project_id == SETTINGS.DEFAULT_PROJECT_NAME
+
+
+def test_failed_projects_resumed(bulk_args, manifest):
+    def fail_second(args):
+        if args.project_id == "abcd-second-prod":
+            exit(1)
+
+    results = bulk_setup(bulk_args, fail_second)
+    assert results["abcd-second-prod"]["status"] == "failure"
+
+    calls = []
+    results = bulk_setup(bulk_args, lambda args: calls.append(args.project_id))
+
+    assert calls == ["abcd-second-prod"]
+    assert {result["status"] for result in results.values()} == {"success"}
+    state = json.loads(manifest.dirpath("projects.csv.state.json").read())
+    assert set(state) == {"abcd-first-dev", "abcd-second-prod"}
@@ -0,0 +1,215 @@
+from argparse import Namespace
+from unittest.mock import Mock
+
+import pytest
+
+from github import GithubException
+
+from code_control import (
+    GithubFileExists,
+    StepError,
+    commit_repo_files,
+    setup,
+)
+from common import git_blob_sha
+
+FILES = {
+    "README.md": "readme",
+    "gcp/project_settings.auto.tfvars.json": "{}",
+    "gcp/iam.auto.tfvars.json": "{}",
+}
+
+
+@pytest.fixture
+def repo():
+    repo = Mock()
+    repo.get_git_tree.return_value.tree = [Mock(path="README.md")]
+    return repo
+
+
+def test_files_written_with_single_commit(repo):
+    commit = commit_repo_files(repo, FILES, "Update", force=True)
+
+    repo.create_git_tree.assert_called_once()
+    elements = repo.create_git_tree.call_args[0][0]
+    assert [element._InputGitTreeElement__path for element in elements] == list(
+        FILES
+    )
+    repo.create_git_commit.assert_called_once_with(
+        "Update",
+        repo.create_git_tree.return_value,
+        [repo.get_git_commit.return_value],
+    )
+    repo.get_git_ref.return_value.edit.assert_called_once_with(
+        commit.sha, force=False
+    )
+    repo.create_file.assert_not_called()
+    repo.update_file.assert_not_called()
+
+
+def test_empty_repo_bootstrapped(repo):
+    """
+    Bootstrap commit of the first file is replaced with the commit holding
+    all files, so repository history starts with single commit.
+    """
+    ref = Mock()
+    repo.get_git_ref.side_effect = [
+        GithubException(409, {"message": "Git Repository is empty."}),
+        ref,
+    ]
+
+    commit_repo_files(repo, FILES, "Initial commit")
+
+    repo.create_file.assert_called_once_with(
+        "README.md", "Initial commit", "readme", branch="master"
+    )
+    repo.create_git_tree.assert_called_once()
+    assert len(repo.create_git_tree.call_args[0]) == 1
+    repo.create_git_commit.assert_called_once_with(
+        "Initial commit", repo.create_git_tree.return_value, []
+    )
+    ref.edit.assert_called_once_with(
+        repo.create_git_commit.return_value.sha, force=True
+    )
+
+
+def test_existing_files_not_overwritten_without_force(repo):
+    with pytest.raises(GithubFileExists):
+        commit_repo_files(repo, FILES, "Update")
+
+    repo.create_git_commit.assert_not_called()
+
+
+def test_protection_bypassed(repo):
+    branch = repo.get_branch.return_value
+    branch.get_protection.return_value.raw_data = {
+        "enforce_admins": {"enabled": True}
+    }
+    ref = repo.get_git_ref.return_value
+    ref.edit.side_effect = [GithubException(422, {}), None]
+
+    commit_repo_files(repo, FILES, "Update", force=True, bypass_protection=True)
+
+    branch.remove_protection.assert_called_once_with()
+    branch.edit_protection.assert_called_once_with(enforce_admins=True)
+    assert ref.edit.call_count == 2
+
+
+def test_unchanged_files_not_committed(repo):
+    repo.get_git_tree.return_value.tree = [
+        Mock(path=path, sha=git_blob_sha(content.encode()))
+        for path, content in FILES.items()
+    ]
+
+    assert commit_repo_files(repo, FILES, "Update", force=True) is None
+    repo.create_git_tree.assert_not_called()
+    repo.get_git_ref.return_value.edit.assert_not_called()
+
+
+def test_only_changed_files_committed(repo):
+    repo.get_git_tree.return_value.tree = [
+        Mock(path="README.md", sha=git_blob_sha(b"readme")),
+        Mock(path="gcp/iam.auto.tfvars.json", sha=git_blob_sha(b"old")),
+    ]
+
+    commit_repo_files(repo, FILES, "Update", force=True)
+
+    elements = repo.create_git_tree.call_args[0][0]
+    assert [element._InputGitTreeElement__path for element in elements] == [
+        "gcp/project_settings.auto.tfvars.json",
+        "gcp/iam.auto.tfvars.json",
+    ]
+    repo.get_git_ref.return_value.edit.assert_called_once()
+
+
+def test_setup_runs_team_and_permission_steps(mocker, tmpdir):
+    template = tmpdir.join("README.md")
+    template.write("readme")
+    mocker.patch("code_control.get_org")
+    mocker.patch("code_control.get_repo")
+    mocker.patch("code_control.commit_repo_files")
+    teams = {"std": Mock(id=1), "priv": Mock(id=2)}
+    mocker.patch(
+        "code_control.create_team",
+        side_effect=lambda org, *args: teams["priv" if args else "std"],
+    )
+    mocker.patch("code_control.get_team", return_value=Mock(id=3))
+    configure = mocker.patch("code_control.configure_remote_object")
+    set_perms = mocker.patch("code_control.set_repo_team_perms")
+    mocker.patch("code_control.set_repo_visibility")
+    mocker.patch("code_control.set_master_branch_permissions")
+    args = Namespace(
+        project_id="test-1234-dev",
+        config_org="my-org",
+        config_repo="test-1234-dev",
+        force=True,
+        bypass_branch_protection=False,
+        change_files={"readme_file": template.strpath},
+        vcs_token="token",
+        branch_permissions={},
+        output_data=False,
+    )
+
+    assert setup(args)
+
+    assert sorted(call[0][2:] for call in set_perms.call_args_list) == [
+        (1, "read"),
+        (2, "write"),
+        (3, "admin"),
+    ]
+    priv_team_config = next(
+        call
+        for call in configure.call_args_list
+        if call[0][0] is teams["priv"].url
+    )
+    assert priv_team_config[1]["parent_team_id"] == 1
+
+
+def test_failed_team_config_fails_setup(mocker, tmpdir):
+    template = tmpdir.join("README.md")
+    template.write("readme")
+    mocker.patch("code_control.get_org")
+    mocker.patch("code_control.get_repo")
+    mocker.patch("code_control.commit_repo_files")
+    mocker.patch("code_control.create_team", return_value=Mock(id=1))
+    mocker.patch("code_control.get_team", return_value=Mock(id=3))
+    mocker.patch("code_control.set_repo_team_perms")
+    mocker.patch("code_control.set_repo_visibility")
+    mocker.patch("code_control.set_master_branch_permissions")
+    patch = mocker.patch("code_control.REST_SESSION.patch")
+    patch.return_value = Mock(
+        status_code=422, text='{"message": "Validation Failed"}'
+    )
+    patch.return_value.json.return_value = {"message": "Validation Failed"}
+    args = Namespace(
+        project_id="test-1234-dev",
+        config_org="my-org",
+        config_repo="test-1234-dev",
+        force=True,
+        bypass_branch_protection=False,
+        change_files={"readme_file": template.strpath},
+        vcs_token="token",
+        branch_permissions={},
+        output_data=False,
+    )
+
+    with pytest.raises(StepError) as error:
+        setup(args)
+
+    assert set(error.value.failures) == {"std_team_config", "priv_team_config"}
+    assert error.value.failures["std_team_config"].status == 422
+
+
+def test_setup_stops_on_broken_template(mocker, tmpdir):
+    template = tmpdir.join("project.json")
+    template.write("{not json")
+    create_repo = mocker.patch("code_control.create_repo")
+    args = Namespace(
+        project_id="test-1234-dev",
+        change_files={"project_settings_file": template.strpath},
+    )
+
+    with pytest.raises(SystemExit):
+        setup(args)
+
+    create_repo.assert_not_called()
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from code_control.executor import StepExecutor
+
+
+def test_steps_run_after_requirements():
+    executor = StepExecutor(max_workers=4)
+    executor.add("parent", lambda results: 1)
+    executor.add("child", lambda results: results["parent"] + 1, ["parent"])
+    executor.add(
+        "grandchild", lambda results: results["child"] * 10, requires=["child"]
+    )
+
+    assert executor.run() == {"parent": 1, "child": 2, "grandchild": 20}
+    assert set(executor.timings) == {"parent", "child", "grandchild"}
+
+
+def test_independent_steps_run_concurrently():
+    """
+    Both steps wait for each other, so run finishes only if they run at once
+    """
+    barrier = threading.Barrier(2, timeout=5)
+    executor = StepExecutor(max_workers=2)
+    executor.add("first", lambda results: barrier.wait())
+    executor.add("second", lambda results: barrier.wait())
+
+    executor.run()
+
+    assert not executor.failures
+
+
+def test_dependants_of_failed_step_skipped():
+    def fail(results):
+        raise RuntimeError("API error")
+
+    executor = StepExecutor(max_workers=2)
+    executor.add("team", fail)
+    executor.add("team_config", lambda results: None, ["team"])
+    executor.add("team_perms", lambda results: None, ["team_config"])
+    executor.add("visibility", lambda results: "private")
+
+    results = executor.run()
+
+    assert results == {"visibility": "private"}
+    assert list(executor.failures) == ["team"]
+    assert sorted(executor.skipped) == ["team_config", "team_perms"]
+
+
+def test_circular_requirements_rejected():
+    executor = StepExecutor(max_workers=2)
+    executor.add("first", lambda results: None, ["second"])
+    executor.add("second", lambda results: None, ["first"])
+
+    with pytest.raises(ValueError):
+        executor.run()
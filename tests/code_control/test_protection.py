@@ -0,0 +1,91 @@
+from unittest.mock import Mock
+
+import pytest
+
+from github import GithubException
+
+from code_control.protection import BranchProtectionBypass, protection_kwargs
+
+PROTECTION = {
+    "required_status_checks": {"strict": True, "contexts": ["ci"]},
+    "enforce_admins": {"enabled": False},
+    "required_pull_request_reviews": {
+        "dismiss_stale_reviews": True,
+        "require_code_owner_reviews": False,
+        "required_approving_review_count": 2,
+        "dismissal_restrictions": {
+            "users": [{"login": "octocat"}],
+            "teams": [{"slug": "admins"}],
+        },
+    },
+    "restrictions": None,
+}
+
+
+@pytest.fixture
+def repo():
+    repo = Mock()
+    repo.get_branch.return_value.get_protection.return_value.raw_data = (
+        PROTECTION
+    )
+    return repo
+
+
+def rejected_once():
+    return Mock(side_effect=[GithubException(409, {}), None, None])
+
+
+def test_protection_kwargs():
+    assert protection_kwargs(PROTECTION) == {
+        "enforce_admins": False,
+        "strict": True,
+        "contexts": ["ci"],
+        "dismiss_stale_reviews": True,
+        "require_code_owner_reviews": False,
+        "required_approving_review_count": 2,
+        "dismissal_users": ["octocat"],
+        "dismissal_teams": ["admins"],
+    }
+
+
+def test_protection_lifted_once_for_batch(repo):
+    write = rejected_once()
+
+    with BranchProtectionBypass(repo) as bypass:
+        for path in ("README.md", "gcp/iam.auto.tfvars.json"):
+            bypass.write(write, path)
+
+    branch = repo.get_branch.return_value
+    assert write.call_count == 3
+    branch.get_protection.assert_called_once()
+    branch.remove_protection.assert_called_once()
+    branch.edit_protection.assert_called_once_with(
+        **protection_kwargs(PROTECTION)
+    )
+
+
+def test_protection_restored_when_write_fails(repo):
+    write = Mock(side_effect=GithubException(409, {}))
+
+    with pytest.raises(GithubException):
+        with BranchProtectionBypass(repo) as bypass:
+            bypass.write(write)
+
+    repo.get_branch.return_value.edit_protection.assert_called_once()
+
+
+def test_nested_bypass_restores_once(repo):
+    with BranchProtectionBypass(repo) as bypass:
+        with bypass:
+            bypass.write(rejected_once())
+        repo.get_branch.return_value.edit_protection.assert_not_called()
+
+    repo.get_branch.return_value.edit_protection.assert_called_once()
+
+
+def test_disabled_bypass_leaves_protection(repo):
+    with pytest.raises(GithubException):
+        with BranchProtectionBypass(repo, enabled=False) as bypass:
+            bypass.write(rejected_once())
+
+    repo.get_branch.assert_not_called()
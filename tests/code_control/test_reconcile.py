@@ -0,0 +1,137 @@
+from argparse import Namespace
+from unittest.mock import Mock
+
+import pytest
+
+from code_control.reconcile import (
+    RepoState,
+    apply_changes,
+    plan_changes,
+    reconcile,
+)
+from common import git_blob_sha
+from settings import SETTINGS
+
+STD_TEAM = SETTINGS.STANDARD_TEAM_ATTRIBUTES
+PRIV_TEAM = SETTINGS.PRIV_TEAM_ATTRIBUTES
+FILES = {"README.md": "readme"}
+
+
+def team(attributes, parent=None):
+    return Mock(
+        privacy=attributes["privacy"],
+        description=attributes["description"],
+        raw_data={"parent": {"slug": parent} if parent else None},
+    )
+
+
+@pytest.fixture
+def converged_state():
+    return RepoState(
+        files={"README.md": git_blob_sha(b"readme")},
+        teams={
+            STD_TEAM["name"]: team(STD_TEAM),
+            PRIV_TEAM["name"]: team(PRIV_TEAM, STD_TEAM["name"]),
+            SETTINGS.ADMIN_TEAM: Mock(),
+        },
+        team_permissions={
+            SETTINGS.ADMIN_TEAM: "admin",
+            STD_TEAM["name"]: "pull",
+            PRIV_TEAM["name"]: "push",
+        },
+        private=True,
+        branch_protection=dict(SETTINGS.PROTECTED_BRANCH),
+    )
+
+
+@pytest.fixture
+def parsed_args():
+    return Namespace(
+        config_org="my-org",
+        config_repo="abcd-first-dev",
+        vcs_token="token",
+        bypass_branch_protection=False,
+        branch_permissions=SETTINGS.PROTECTED_BRANCH,
+        plan=False,
+    )
+
+
+def test_converged_repo_has_no_changes(converged_state):
+    assert plan_changes(converged_state, FILES, SETTINGS.PROTECTED_BRANCH) == []
+
+
+def test_drift_detected(converged_state):
+    converged_state.team_permissions[STD_TEAM["name"]] = "push"
+    state = converged_state._replace(
+        private=False, files={"README.md": git_blob_sha(b"old")}
+    )
+
+    changes = plan_changes(state, FILES, SETTINGS.HIGHLY_PROTECTED_BRANCH)
+
+    assert [(change.kind, change.target) for change in changes] == [
+        ("repo_permission", STD_TEAM["name"]),
+        ("file", "README.md"),
+        ("visibility", "private"),
+        ("branch_protection", "master"),
+    ]
+
+
+def test_only_needed_mutations_applied(mocker, converged_state, parsed_args):
+    mocks = {
+        name: mocker.patch("code_control.reconcile." + name)
+        for name in (
+            "commit_repo_files",
+            "configure_team",
+            "create_team",
+            "set_master_branch_permissions",
+            "set_repo_visibility",
+        )
+    }
+    std_team = converged_state.teams[STD_TEAM["name"]]
+    del converged_state.team_permissions[PRIV_TEAM["name"]]
+    state = converged_state._replace(
+        teams=dict(converged_state.teams, **{PRIV_TEAM["name"]: None})
+    )
+    repo = Mock()
+    changes = plan_changes(state, FILES, SETTINGS.PROTECTED_BRANCH)
+
+    org = Mock()
+
+    apply_changes(org, repo, state, changes, FILES, parsed_args)
+
+    mocks["create_team"].assert_called_once()
+    priv_team = mocks["create_team"].return_value
+    mocks["configure_team"].assert_called_once_with(
+        org,
+        priv_team,
+        "token",
+        privacy=PRIV_TEAM["privacy"],
+        description=PRIV_TEAM["description"],
+        parent_team_id=std_team.id,
+    )
+    priv_team.set_repo_permission.assert_called_once_with(repo, "push")
+    for name in (
+        "commit_repo_files",
+        "set_master_branch_permissions",
+        "set_repo_visibility",
+    ):
+        mocks[name].assert_not_called()
+
+
+def test_plan_does_not_apply(mocker, converged_state, parsed_args, capsys):
+    mocker.patch("code_control.reconcile.get_org")
+    mocker.patch("code_control.reconcile.get_repo")
+    mocker.patch(
+        "code_control.reconcile.render_config_files",
+        return_value={"README.md": "new readme"},
+    )
+    mocker.patch(
+        "code_control.reconcile.read_state", return_value=converged_state
+    )
+    apply = mocker.patch("code_control.reconcile.apply_changes")
+    parsed_args.plan = True
+
+    assert reconcile(parsed_args)
+
+    apply.assert_not_called()
+    assert "~ file README.md" in capsys.readouterr().out
@@ -0,0 +1,99 @@
+from unittest.mock import Mock
+
+import pytest
+
+from code_control import write_project_data
+from code_control.snapshot import (
+    SnapshotChange,
+    diff_snapshots,
+    export_repos,
+    read_snapshot,
+)
+
+
+def _team(slug, permission="pull"):
+    return Mock(
+        slug=slug,
+        raw_data={"slug": slug, "privacy": "closed", "permission": permission},
+    )
+
+
+def _repo(name, teams, private=True):
+    repo = Mock(
+        full_name="my-org/" + name,
+        raw_data={"name": name, "private": private},
+    )
+    repo.get_teams.return_value = teams
+    return repo
+
+
+@pytest.fixture
+def repos():
+    return [
+        _repo("abcd-first-dev", [_team("devs"), _team("admins", "admin")]),
+        _repo("abcd-second-dev", [_team("devs", "push")]),
+    ]
+
+
+@pytest.mark.parametrize("name", ["snapshot.jsonl", "snapshot.jsonl.gz"])
+def test_repos_exported_with_each_team_once(tmpdir, repos, name):
+    path = tmpdir.join(name).strpath
+
+    assert export_repos(iter(repos), path) == 4
+
+    records = list(read_snapshot(path))
+    assert [record["key"] for record in records] == [
+        "repo:my-org/abcd-first-dev",
+        "team:devs",
+        "team:admins",
+        "repo:my-org/abcd-second-dev",
+    ]
+    assert records[0]["teams"] == {"devs": "pull", "admins": "admin"}
+    assert "permission" not in records[1]["data"]
+
+
+def test_repo_order_doesnt_change_teams(tmpdir, repos):
+    old = tmpdir.join("old.jsonl").strpath
+    new = tmpdir.join("new.jsonl").strpath
+    export_repos(repos, old)
+    export_repos(reversed(repos), new)
+
+    assert diff_snapshots(old, new) == []
+
+
+def test_project_data_appended(tmpdir, repos):
+    path = tmpdir.join("snapshot.jsonl.gz").strpath
+
+    write_project_data("abcd-first-dev", repos[0], path)
+    write_project_data("abcd-second-dev", repos[1], path)
+
+    records = list(read_snapshot(path))
+    assert len(records) == 5
+    assert records[3]["project_id"] == "abcd-second-dev"
+
+
+def test_project_data_has_permissions_on_repo(tmpdir, repos):
+    path = tmpdir.join("snapshot.jsonl").strpath
+
+    write_project_data("abcd-second-dev", repos[1], path)
+
+    # permission on repository, not organisation default of team
+    assert next(read_snapshot(path))["teams"] == {"devs": "push"}
+
+
+def test_snapshots_diff(tmpdir, repos):
+    old = tmpdir.join("old.jsonl.gz").strpath
+    new = tmpdir.join("new.jsonl.gz").strpath
+    export_repos(repos, old)
+    repos[0].raw_data = {"name": "abcd-first-dev", "private": False}
+    repos[0].get_teams.return_value = repos[0].get_teams.return_value[:1]
+    export_repos(repos[:1] + [_repo("abcd-third-dev", [])], new)
+
+    assert diff_snapshots(old, new) == [
+        SnapshotChange(
+            "repo:my-org/abcd-first-dev", "changed", ["private", "teams"]
+        ),
+        SnapshotChange("repo:my-org/abcd-second-dev", "removed", []),
+        SnapshotChange("repo:my-org/abcd-third-dev", "added", []),
+        SnapshotChange("team:admins", "removed", []),
+    ]
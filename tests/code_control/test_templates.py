@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from code_control.templates import TemplateError, TemplateStore
+from common import git_blob_sha
+
+
+@pytest.fixture
+def store():
+    return TemplateStore()
+
+
+@pytest.fixture
+def project_template(tmpdir):
+    template = tmpdir.join("project.json")
+    template.write('{"project_id": "", "region": "europe-west2"}')
+    return template
+
+
+def test_template_loaded_once(store, project_template):
+    first = store.render(project_template.strpath, project_id="abcd-first-dev")
+    project_template.write("{}")
+    second = store.render(project_template.strpath, project_id="abcd-dev")
+
+    assert store.loads == 1
+    assert json.loads(first.content)["project_id"] == "abcd-first-dev"
+    assert json.loads(second.content) == {
+        "project_id": "abcd-dev",
+        "region": "europe-west2",
+    }
+
+
+def test_render_memoized_with_blob_sha(store, project_template):
+    rendered = store.render(project_template.strpath, project_id="abcd-dev")
+
+    assert store.render(project_template.strpath, project_id="abcd-dev") is (
+        rendered
+    )
+    assert rendered.sha == git_blob_sha(rendered.data)
+    assert store.blob_sha(rendered.content) == rendered.sha
+    assert store.blob_sha("other") == git_blob_sha(b"other")
+
+
+def test_plain_template_rendered_verbatim(store, tmpdir):
+    readme = tmpdir.join("README.md")
+    readme.write("# readme\n")
+
+    assert store.render(readme.strpath).content == "# readme\n"
+    with pytest.raises(TemplateError):
+        store.render(readme.strpath, project_id="abcd-dev")
+
+
+@pytest.mark.parametrize("content", ["{not json", "[]"])
+def test_invalid_json_template(store, tmpdir, content):
+    template = tmpdir.join("project.json")
+    template.write(content)
+
+    with pytest.raises(TemplateError):
+        store.preload([template.strpath])
+
+
+def test_memoized_renders_bounded(project_template):
+    store = TemplateStore(max_renders=2)
+    first = store.render(project_template.strpath, project_id="abcd-first-dev")
+    for project_id in ("abcd-second-dev", "abcd-third-dev"):
+        store.render(project_template.strpath, project_id=project_id)
+
+    assert len(store._rendered) == len(store._hashes) == 2
+    assert store.render(
+        project_template.strpath, project_id="abcd-first-dev"
+    ) == (first)
@@ -0,0 +1,117 @@
+import io
+import tarfile
+
+from pathlib import Path
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from github import UnknownObjectException
+
+from common.archive import ArchiveError, get_archive_files
+from common.blob_cache import git_blob_sha
+
+COMMIT_SHA = "cfe3246ba56244faf3f8e58fa2bca3dd21f83ae1"
+
+
+def _tarball(files):
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for path, content in files.items():
+            member = tarfile.TarInfo(f"my-org-my-repo-{COMMIT_SHA[:7]}/{path}")
+            member.size = len(content)
+            tar.addfile(member, io.BytesIO(content))
+    archive.seek(0)
+    return archive
+
+
+@pytest.fixture
+def repo():
+    repo = Mock(
+        full_name="my-org/my-repo",
+        url="https://api.github.com/repos/my-org/my-repo",
+    )
+    repo._requester.requestJson.return_value = (200, {}, COMMIT_SHA)
+    return repo
+
+
+@pytest.fixture
+def archive_download(mocker, tmpdir):
+    mocker.patch.dict(
+        "settings.SETTINGS.attributes", {"ARCHIVE_DIR": Path(tmpdir.strpath)}
+    )
+    requests_get = mocker.patch("common.archive.REST_SESSION.get")
+
+    def download(files):
+        response = MagicMock()
+        response.raw = _tarball(files)
+        requests_get.return_value.__enter__.return_value = response
+        return requests_get
+
+    return download
+
+
+def test_get_archive_files_extracts_only_directory(repo, archive_download):
+    archive_download(
+        {
+            "README.md": b"readme",
+            "gcp/project.tf": b"project",
+            "gcp/modules/net/main.tf": b"module",
+            "gcp-legacy/project.tf": b"legacy",
+        }
+    )
+
+    files = get_archive_files(repo, "gcp", "master")
+
+    repo.get_archive_link.assert_called_once_with("tarball", COMMIT_SHA)
+    assert [file.path for file in files] == [
+        "gcp/modules/net/main.tf",
+        "gcp/project.tf",
+    ]
+    assert files[1].sha == git_blob_sha(b"project")
+    assert files[0].local_path.read_bytes() == b"module"
+
+
+def test_get_archive_files_extracted_once_per_commit(repo, archive_download):
+    requests_get = archive_download({"gcp/project.tf": b"project"})
+
+    get_archive_files(repo, "gcp", "master")
+    files = get_archive_files(repo, "gcp", "master")
+
+    requests_get.assert_called_once()
+    assert files[0].local_path.read_bytes() == b"project"
+
+
+def test_get_archive_files_rejects_unsafe_paths(repo, archive_download):
+    archive_download({"gcp/../../etc/passwd": b"root"})
+
+    with pytest.raises(ArchiveError):
+        get_archive_files(repo, "gcp", "master")
+
+
+def test_get_archive_files_missing_directory(repo, archive_download):
+    requests_get = archive_download({"aws/project.tf": b"project"})
+
+    with pytest.raises(UnknownObjectException):
+        get_archive_files(repo, "gcp", "master")
+
+    archive_download({"gcp/project.tf": b"project"})
+    files = get_archive_files(repo, "gcp", "master")
+
+    assert requests_get.call_count == 2
+    assert [file.path for file in files] == ["gcp/project.tf"]
+
+
+def test_old_commits_pruned(repo, archive_download, mocker):
+    mocker.patch.dict(
+        "settings.SETTINGS.attributes", {"ARCHIVE_KEEP_COMMITS": 1}
+    )
+    archive_download({"gcp/project.tf": b"first"})
+    first = get_archive_files(repo, "gcp", COMMIT_SHA)
+
+    archive_download({"gcp/project.tf": b"second"})
+    second = get_archive_files(repo, "gcp", "b" * 40)
+
+    assert not first[0].local_path.exists()
+    assert second[0].local_path.read_bytes() == b"second"
+    assert not list(second[0].local_path.parents[1].glob(".*"))
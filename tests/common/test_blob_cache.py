@@ -0,0 +1,92 @@
+import os
+import subprocess
+
+import pytest
+
+from common.blob_cache import BlobCache, BlobCacheError, git_blob_sha
+
+
+@pytest.fixture
+def blob_cache(tmpdir):
+    return BlobCache(tmpdir.join("blobs").strpath, max_size=10)
+
+
+def test_git_blob_sha_matches_git(tmpdir):
+    path = tmpdir.join("file.tf")
+    path.write_binary(b'variable "project_id" {}\n')
+
+    expected = (
+        subprocess.check_output(["git", "hash-object", path.strpath])
+        .decode()
+        .strip()
+    )
+
+    assert git_blob_sha(b'variable "project_id" {}\n') == expected
+
+
+def test_put_and_get(blob_cache):
+    sha = git_blob_sha(b"abc")
+
+    assert blob_cache.get(sha) is None
+    blob_cache.put(sha, b"abc")
+
+    assert sha in blob_cache
+    assert blob_cache.get(sha) == b"abc"
+    assert (blob_cache.hits, blob_cache.misses) == (1, 1)
+
+
+def test_put_verifies_content(blob_cache):
+    with pytest.raises(BlobCacheError):
+        blob_cache.put(git_blob_sha(b"abc"), b"abd")
+
+
+def test_least_recently_used_blobs_evicted(blob_cache):
+    shas = [git_blob_sha(content) for content in (b"1111", b"2222", b"3333")]
+    blob_cache.put(shas[0], b"1111")
+    blob_cache.put(shas[1], b"2222")
+
+    # make first blob the most recently used one
+    os.utime(blob_cache._blob_path(shas[1]), (0, 0))
+    blob_cache.get(shas[0])
+
+    blob_cache.put(shas[2], b"3333")
+
+    assert shas[0] in blob_cache
+    assert shas[1] not in blob_cache
+    assert shas[2] in blob_cache
+
+
+def test_copy_to(blob_cache, tmpdir):
+    sha = git_blob_sha(b"abc")
+    destination = tmpdir.join("copy").strpath
+
+    assert not blob_cache.copy_to(sha, destination)
+
+    blob_cache.put(sha, b"abc")
+    assert blob_cache.copy_to(sha, destination)
+    with open(destination, "rb") as copy:
+        assert copy.read() == b"abc"
+
+
+def test_corrupted_blob_is_a_miss(blob_cache, tmpdir):
+    sha = git_blob_sha(b"abc")
+    blob_cache.put(sha, b"abc")
+    with open(blob_cache._blob_path(sha), "wb") as blob:
+        blob.write(b"abd")
+
+    assert blob_cache.get(sha) is None
+    assert sha not in blob_cache
+    assert (blob_cache.hits, blob_cache.misses) == (0, 1)
+
+    blob_cache.put(sha, b"abc")
+    with open(blob_cache._blob_path(sha), "wb") as blob:
+        blob.write(b"abd")
+
+    assert not blob_cache.copy_to(sha, tmpdir.join("copy").strpath)
+    assert sha not in blob_cache
+
+
+def test_cache_directory_is_private(blob_cache):
+    blob_cache.put(git_blob_sha(b"abc"), b"abc")
+
+    assert blob_cache.directory.stat().st_mode & 0o077 == 0
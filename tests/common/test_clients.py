@@ -0,0 +1,41 @@
+import pytest
+
+import common
+
+from common.clients import GithubClientRegistry
+
+
+@pytest.fixture
+def registry(mocker):
+    mocker.patch("common.clients.install_http_cache")
+    github = mocker.patch("common.clients.Github")
+    github.side_effect = lambda **kwargs: mocker.Mock(**kwargs)
+    return GithubClientRegistry()
+
+
+def test_client_reused_for_same_url_and_token(registry):
+    client = registry.get_client("https://api.github.com", "token")
+
+    assert registry.get_client("https://api.github.com", "token") is client
+    assert registry.get_client("https://api.github.com", "other") is not client
+    assert registry.stats["created_clients"] == 2
+    assert registry.stats["reused_clients"] == 1
+
+
+def test_org_resolved_once(registry):
+    org = registry.get_org("https://api.github.com", "token", "my-org")
+
+    assert registry.get_org("https://api.github.com", "token", "my-org") is org
+    client = registry.get_client("https://api.github.com", "token")
+    client.get_organization.assert_called_once_with("my-org")
+    assert registry.reused_connections == 2
+
+
+def test_get_org_uses_shared_registry(mocker, command_line_args):
+    registry = mocker.patch("common.CLIENT_REGISTRY")
+
+    common.get_org(command_line_args, "my-org")
+
+    registry.get_org.assert_called_once_with(
+        command_line_args.api_url, command_line_args.vcs_token, "my-org"
+    )
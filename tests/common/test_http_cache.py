@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from github import Github
+
+from common.http_cache import (
+    HttpCache,
+    install_http_cache,
+    uninstall_http_cache,
+)
+
+
+@pytest.fixture
+def http_cache(tmpdir):
+    http_cache = HttpCache(tmpdir.join("http_cache").strpath)
+    install_http_cache(http_cache)
+    yield http_cache
+    uninstall_http_cache()
+
+
+@pytest.fixture
+def org_route(github_server):
+    github_server.routes["/orgs/my-org"] = {
+        "login": "my-org",
+        "url": f"{github_server.url}/orgs/my-org",
+    }
+
+
+@pytest.mark.usefixtures("org_route")
+def test_unchanged_resource_revalidated(github_server, http_cache):
+    """
+    Second read of unchanged organisation is answered with 304 and served
+    from cache without consuming rate limit.
+    """
+    for _ in range(2):
+        github = Github(base_url=github_server.url, login_or_token="token")
+        assert github.get_organization("my-org").login == "my-org"
+
+    assert [status for _, _, status in github_server.requests] == [200, 304]
+    assert github_server.rate_limit_remaining == github_server.rate_limit - 1
+    assert http_cache.stats == {
+        "requests": 2,
+        "hits": 1,
+        "misses": 1,
+        "stores": 1,
+    }
+
+
+@pytest.mark.usefixtures("org_route")
+def test_changed_resource_refetched(github_server, http_cache):
+    github = Github(base_url=github_server.url, login_or_token="token")
+    github.get_organization("my-org")
+
+    github_server.routes["/orgs/my-org"]["login"] = "renamed-org"
+
+    assert github.get_organization("my-org").login == "renamed-org"
+    assert [status for _, _, status in github_server.requests] == [200, 200]
+
+
+@pytest.mark.usefixtures("org_route")
+def test_cache_separated_by_token(github_server, http_cache):
+    for token in ("token", "another-token"):
+        github = Github(base_url=github_server.url, login_or_token=token)
+        github.get_organization("my-org")
+
+    assert [status for _, _, status in github_server.requests] == [200, 200]
+
+
+def test_pinned_resource_served_without_revalidation(github_server, http_cache):
+    """
+    Content read at full commit hash never changes, so it isn't revalidated
+    """
+    path = "/repos/my-org/my-repo/contents/gcp?ref=" + "a" * 40
+    github_server.routes[path] = [{"name": "project.tf"}]
+    github = Github(base_url=github_server.url, login_or_token="token")
+
+    for _ in range(2):
+        github._Github__requester.requestJsonAndCheck(
+            "GET", github_server.url + path
+        )
+
+    assert [status for _, _, status in github_server.requests] == [200]
+    assert http_cache.is_immutable(path)
+    assert not http_cache.is_immutable("/repos/my-org/my-repo/commits/master")
+
+
+def test_cache_separated_by_host():
+    path = "/orgs/my-org"
+    assert HttpCache.key("https://api.github.com:443" + path, {}) != (
+        HttpCache.key("https://ghe.example.com:443" + path, {})
+    )
+
+
+def test_least_recently_used_responses_evicted(tmpdir):
+    http_cache = HttpCache(tmpdir.strpath)
+    headers = {"etag": '"v1"'}
+    http_cache.put("a1", 200, headers, "x" * 100)
+    http_cache.put("b1", 200, headers, "x" * 100)
+    entry_size = os.path.getsize(http_cache._entry_path("a1"))
+    http_cache.max_size = 2 * entry_size
+    # b1 is the least recently used entry
+    os.utime(http_cache._entry_path("b1"), (1, 1))
+
+    http_cache.put("c1", 200, headers, "x" * 100)
+
+    assert http_cache.get("a1") is not None
+    assert http_cache.get("b1") is None
+    assert http_cache.get("c1") is not None
@@ -0,0 +1,290 @@
+import sqlite3
+
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+
+from github import GithubException
+from github.Organization import Organization
+from github.Repository import Repository
+
+import common
+
+from common.inventory import OrgInventory
+from settings import SETTINGS
+
+NOW = datetime(2020, 1, 10)
+HIGH_PROTECTION = {
+    "enforce_admins": {"enabled": True},
+    "required_pull_request_reviews": {
+        "dismiss_stale_reviews": True,
+        "require_code_owner_reviews": True,
+        "required_approving_review_count": 2,
+    },
+}
+STANDARD_PROTECTION = {
+    "enforce_admins": {"enabled": True},
+    "required_pull_request_reviews": {
+        "dismiss_stale_reviews": True,
+        "require_code_owner_reviews": False,
+        "required_approving_review_count": 1,
+    },
+}
+
+
+def _repo(name, days_ago):
+    repo = Mock(
+        id=hash(name),
+        url=f"https://api.github.com/repos/my-org/{name}",
+        private=True,
+        archived=False,
+        default_branch="master",
+        updated_at=NOW - timedelta(days=days_ago),
+    )
+    repo.name = name
+    return repo
+
+
+def _protection_url(name):
+    return (
+        f"https://api.github.com/repos/my-org/{name}/branches/master/protection"
+    )
+
+
+def _team(slug, repos):
+    team = Mock(
+        slug=slug,
+        id=hash(slug),
+        url=f"https://api.github.com/teams/{hash(slug)}",
+        privacy="closed",
+        description=slug,
+        raw_data={"parent": None},
+    )
+    team.name = slug
+    team.get_repos.return_value = [
+        Mock(permissions=Mock(admin=False, push=True)) for _ in repos
+    ]
+    for repo, name in zip(team.get_repos.return_value, repos):
+        repo.name = name
+    return team
+
+
+@pytest.fixture
+def clock():
+    return Mock(return_value=1000.0)
+
+
+@pytest.fixture
+def inventory(tmpdir, clock):
+    inventory = OrgInventory(tmpdir.join("inventory.sqlite").strpath, clock)
+    yield inventory
+    inventory.close()
+
+
+@pytest.fixture
+def org():
+    org = Mock(login="my-org")
+    org.get_repos.return_value = [
+        _repo("abcd-first-dev", 1),
+        _repo("abcd-second-dev", 2),
+        _repo("abcd-third-dev", 3),
+    ]
+    org.get_teams.return_value = [_team("devs", ["abcd-first-dev"])]
+    org.protections = {
+        _protection_url("abcd-first-dev"): HIGH_PROTECTION,
+        _protection_url("abcd-second-dev"): STANDARD_PROTECTION,
+    }
+
+    def request(verb, url):
+        if url not in org.protections:
+            raise GithubException(404, {})
+        return {}, org.protections[url]
+
+    org._requester.requestJsonAndCheck.side_effect = request
+    return org
+
+
+def _protection_requests(org):
+    return [
+        call[0][1] for call in org._requester.requestJsonAndCheck.call_args_list
+    ]
+
+
+def test_refresh_indexes_org(inventory, org):
+    assert inventory.refresh(org) == {
+        "full": True,
+        "repos": 3,
+        "rechecked_protections": 0,
+        "teams": 1,
+    }
+
+    assert inventory.lacking_protection(
+        "my-org", SETTINGS.HIGHLY_PROTECTED_BRANCH
+    ) == ["abcd-second-dev", "abcd-third-dev"]
+    assert inventory.lacking_protection(
+        "my-org", SETTINGS.PROTECTED_BRANCH
+    ) == ["abcd-third-dev"]
+    assert inventory.query("SELECT team, repo, permission FROM team_repos") == [
+        {"team": "devs", "repo": "abcd-first-dev", "permission": "push"}
+    ]
+
+
+def test_incremental_refresh_stops_at_watermark(inventory, org):
+    inventory.refresh(org)
+    org._requester.requestJsonAndCheck.reset_mock()
+    org.get_teams.return_value[0].get_repos.reset_mock()
+    updated = _repo("abcd-third-dev", 0)
+    org.get_repos.return_value = [updated] + org.get_repos.return_value
+    org.protections[_protection_url("abcd-third-dev")] = HIGH_PROTECTION
+
+    assert inventory.refresh(org) == {
+        "full": False,
+        "repos": 1,
+        "rechecked_protections": 0,
+        "teams": 0,
+    }
+
+    assert _protection_requests(org) == [_protection_url("abcd-third-dev")]
+    org.get_teams.return_value[0].get_repos.assert_not_called()
+    assert inventory.lacking_protection(
+        "my-org", SETTINGS.HIGHLY_PROTECTED_BRANCH
+    ) == ["abcd-second-dev"]
+
+
+def test_protection_and_permissions_rechecked(inventory, org, clock):
+    """
+    Changes of protection and team permissions don't bump `updated_at` of
+    repository, so they are rechecked once they are old enough
+    """
+    inventory.refresh(org)
+    org.protections[_protection_url("abcd-second-dev")] = HIGH_PROTECTION
+    team = org.get_teams.return_value[0]
+    team.get_repos.return_value[0].permissions = Mock(admin=True)
+    clock.return_value += SETTINGS.INVENTORY_RECHECK_INTERVAL + 1
+
+    assert inventory.refresh(org) == {
+        "full": False,
+        "repos": 0,
+        "rechecked_protections": 3,
+        "teams": 1,
+    }
+
+    assert inventory.lacking_protection(
+        "my-org", SETTINGS.HIGHLY_PROTECTED_BRANCH
+    ) == ["abcd-third-dev"]
+    assert inventory.query("SELECT permission FROM team_repos") == [
+        {"permission": "admin"}
+    ]
+
+
+def test_full_refresh_drops_deleted_repos(inventory, org):
+    inventory.refresh(org)
+    org.get_repos.return_value = org.get_repos.return_value[:1]
+
+    inventory.refresh(org, full=True)
+
+    assert inventory.query("SELECT name FROM repos") == [
+        {"name": "abcd-first-dev"}
+    ]
+
+
+@pytest.fixture
+def github_org():
+    return Organization(
+        Mock(),
+        {},
+        {"login": "my-org", "url": "https://api.github.com/orgs/my-org"},
+        completed=True,
+    )
+
+
+def test_lookups_served_from_fresh_index(inventory, org, github_org, clock):
+    inventory.refresh(org)
+
+    repo = inventory.get_repo(github_org, "abcd-first-dev")
+    team = inventory.get_team(github_org, "devs")
+
+    assert isinstance(repo, Repository)
+    assert repo.url == "https://api.github.com/repos/my-org/abcd-first-dev"
+    assert repo.full_name == "my-org/abcd-first-dev"
+    assert team.id == hash("devs")
+    assert inventory.get_repo(github_org, "missing") is None
+    github_org._requester.requestJsonAndCheck.assert_not_called()
+
+    clock.return_value += SETTINGS.INVENTORY_MAX_AGE + 1
+    assert inventory.get_repo(github_org, "abcd-first-dev") is None
+
+
+def test_changes_written_back(inventory, org, github_org):
+    inventory.refresh(org)
+
+    inventory.record_visibility(
+        inventory.get_repo(github_org, "abcd-first-dev"), False
+    )
+    inventory.record_team(
+        github_org,
+        "devs",
+        {"description": "Developers", "parent": {"slug": "admins"}},
+    )
+
+    assert not inventory.get_repo(github_org, "abcd-first-dev").private
+    team = inventory.get_team(github_org, "devs")
+    assert team.description == "Developers"
+    assert team.privacy == "closed"
+    assert inventory.query("SELECT parent FROM teams") == [{"parent": "admins"}]
+
+
+def test_missing_entries_forgotten(inventory, org, github_org):
+    inventory.refresh(org)
+
+    inventory.forget_repo(github_org, "abcd-first-dev")
+    inventory.forget_team(github_org, "devs")
+
+    assert inventory.get_repo(github_org, "abcd-first-dev") is None
+    assert inventory.get_team(github_org, "devs") is None
+    assert inventory.query("SELECT * FROM team_repos") == []
+    assert inventory.lacking_protection(
+        "my-org", SETTINGS.PROTECTED_BRANCH
+    ) == ["abcd-third-dev"]
+
+
+def test_get_repo_falls_back_to_api(mocker, github_org):
+    inventory = mocker.patch("common.INVENTORY")
+    inventory.get_repo.return_value = None
+    github_org.get_repo = Mock()
+
+    assert (
+        common.get_repo(github_org, "new") is github_org.get_repo.return_value
+    )
+    inventory.record_repo.assert_called_once_with(
+        github_org, github_org.get_repo.return_value
+    )
+
+
+def test_live_get_repo_bypasses_index(mocker, github_org):
+    inventory = mocker.patch("common.INVENTORY")
+    github_org.get_repo = Mock(side_effect=GithubException(404, {}))
+
+    with pytest.raises(GithubException):
+        common.get_repo(github_org, "deleted", live=True)
+
+    inventory.get_repo.assert_not_called()
+    inventory.forget_repo.assert_called_once_with(github_org, "deleted")
+
+
+def test_index_of_previous_version_migrated(tmpdir, clock, org):
+    path = tmpdir.join("inventory.sqlite").strpath
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE teams (org TEXT NOT NULL, slug TEXT NOT NULL, "
+        "id INTEGER, url TEXT, name TEXT, privacy TEXT, description TEXT, "
+        "parent TEXT, PRIMARY KEY (org, slug))"
+    )
+    connection.close()
+    inventory = OrgInventory(path, clock)
+
+    try:
+        assert inventory.refresh(org)["teams"] == 1
+    finally:
+        inventory.close()
@@ -0,0 +1,157 @@
+import subprocess
+
+from argparse import Namespace
+
+import pytest
+
+from github import UnknownObjectException
+
+import common
+
+from common.blob_cache import git_blob_sha
+from common.local_git import LocalGitError, LocalGitMirrors
+
+
+def git(path, *args):
+    return (
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+            + list(args),
+            cwd=path,
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        .stdout.decode()
+        .strip()
+    )
+
+
+def commit(path, files):
+    for name, content in files.items():
+        file_path = path.join(name)
+        file_path.dirpath().ensure(dir=True)
+        file_path.write_binary(content)
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "update")
+    return git(path, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def remote(tmpdir):
+    path = tmpdir.join("remotes", "my-org", "my-repo").ensure(dir=True)
+    git(path, "init", "-q", "-b", "master")
+    return path
+
+
+@pytest.fixture
+def mirrors(tmpdir):
+    return LocalGitMirrors(tmpdir.join("mirrors").strpath, fetch_interval=0)
+
+
+@pytest.fixture
+def org(tmpdir, mirrors):
+    remote_url = "file://" + tmpdir.join("remotes").strpath + "/{org}/{repo}"
+    return mirrors.get_org(remote_url, None, "my-org")
+
+
+def test_files_read_from_mirror(remote, org):
+    sha = commit(
+        remote,
+        {
+            "README.md": b"readme",
+            "gcp/project.tf": b"project",
+            "gcp/modules/net/main.tf": b"module",
+        },
+    )
+    repo = org.get_repo("my-repo")
+
+    files = repo.get_files("gcp", "master")
+
+    assert repo.resolve("master") == sha
+    assert sorted((file.path, file.decoded_content) for file in files) == [
+        ("gcp/modules/net/main.tf", b"module"),
+        ("gcp/project.tf", b"project"),
+    ]
+    assert files[-1].sha == git_blob_sha(files[-1].decoded_content)
+
+
+def test_missing_directory(remote, org):
+    commit(remote, {"gcp/project.tf": b"project"})
+
+    with pytest.raises(UnknownObjectException):
+        org.get_repo("my-repo").get_files("aws", "master")
+
+
+def test_mirror_fetched_incrementally(remote, org, mirrors):
+    first_sha = commit(remote, {"gcp/project.tf": b"first"})
+    repo = org.get_repo("my-repo")
+    assert repo.resolve("master") == first_sha
+
+    second_sha = commit(remote, {"gcp/project.tf": b"second"})
+
+    assert repo.resolve("master") == second_sha
+    assert repo.get_files("gcp", first_sha)[0].decoded_content == b"first"
+    assert mirrors.stats["clones"] == 1
+    assert mirrors.stats["fetches"] > 0
+
+
+def test_mirror_not_fetched_within_interval(remote, org, mirrors):
+    commit(remote, {"gcp/project.tf": b"first"})
+    mirrors.fetch_interval = 60
+    repo = org.get_repo("my-repo")
+
+    repo.resolve("master")
+    repo.resolve("master")
+
+    assert mirrors.stats == {"clones": 1, "fetches": 0}
+
+
+def test_unknown_ref(remote, org):
+    commit(remote, {"gcp/project.tf": b"project"})
+
+    with pytest.raises(LocalGitError):
+        org.get_repo("my-repo").resolve("missing-branch")
+
+
+def test_common_functions_dispatch_to_mirror(remote, tmpdir, mocker):
+    sha = commit(remote, {"gcp/project.tf": b"project"})
+    mocker.patch(
+        "common.LOCAL_GIT_MIRRORS",
+        LocalGitMirrors(tmpdir.join("mirrors").strpath, fetch_interval=0),
+    )
+    args = Namespace(
+        vcs_platform="local-git",
+        vcs_token=None,
+        git_remote_url="file://"
+        + tmpdir.join("remotes").strpath
+        + "/{org}/{repo}",
+    )
+
+    repo = common.get_repo(common.get_org(args, "my-org"), "my-repo")
+
+    assert common.get_latest_commit_hash(repo, "master") == sha
+    assert [file.path for file in common.get_repo_files(repo, "gcp", sha)] == [
+        "gcp/project.tf"
+    ]
+
+
+def test_ref_like_option_rejected(remote, org):
+    commit(remote, {"gcp/project.tf": b"project"})
+
+    with pytest.raises(LocalGitError):
+        org.get_repo("my-repo").resolve("--output=/tmp/file")
+
+
+def test_token_passed_through_environment(tmpdir, mirrors, mocker):
+    run = mocker.patch("common.local_git.subprocess.run")
+    org = mirrors.get_org("https://git.example.com/{org}/{repo}", "t0k", "o")
+    repo = org.get_repo("my-repo")
+
+    mirrors.update(repo)
+
+    command = run.call_args[0][0]
+    env = run.call_args[1]["env"]
+    assert not any("t0k" in arg or "Authorization" in arg for arg in command)
+    index = int(env["GIT_CONFIG_COUNT"]) - 1
+    assert env[f"GIT_CONFIG_KEY_{index}"] == "http.extraHeader"
+    assert env[f"GIT_CONFIG_VALUE_{index}"].startswith("Authorization: Basic")
@@ -0,0 +1,82 @@
+from unittest.mock import Mock
+
+import pytest
+
+from github import UnknownObjectException
+
+from common.refs import RefCache, resolve_ref
+
+COMMIT_SHA = "cfe3246ba56244faf3f8e58fa2bca3dd21f83ae1"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def ref_cache(clock):
+    return RefCache(ttl=60, clock=clock)
+
+
+@pytest.fixture
+def repo():
+    repo = Mock(
+        full_name="my-org/my-repo",
+        url="https://api.github.com/repos/my-org/my-repo",
+    )
+    repo._requester.requestJson.return_value = (200, {}, COMMIT_SHA)
+    return repo
+
+
+def test_ref_resolved_once_within_ttl(repo, ref_cache):
+    assert resolve_ref(repo, "master", ref_cache) == COMMIT_SHA
+    assert resolve_ref(repo, "master", ref_cache) == COMMIT_SHA
+
+    repo._requester.requestJson.assert_called_once()
+    assert ref_cache.stats == {"hits": 1, "misses": 1}
+
+
+def test_ref_resolved_again_after_ttl(repo, ref_cache, clock):
+    resolve_ref(repo, "master", ref_cache)
+    clock.now += 61
+
+    resolve_ref(repo, "master", ref_cache)
+
+    assert repo._requester.requestJson.call_count == 2
+
+
+def test_full_sha_not_resolved(repo, ref_cache):
+    assert resolve_ref(repo, COMMIT_SHA, ref_cache) == COMMIT_SHA
+
+    repo._requester.requestJson.assert_not_called()
+
+
+def test_numeric_looking_sha_read_as_text(repo, ref_cache):
+    """
+    Hash of digits with single `e` is valid json number, so it must not be
+    parsed
+    """
+    sha = "1234e" + "5" * 35
+    repo._requester.requestJson.return_value = (200, {}, sha + "\n")
+
+    assert resolve_ref(repo, "master", ref_cache) == sha
+
+
+def test_unknown_ref_raises(repo, ref_cache):
+    repo._requester.requestJson.return_value = (
+        404,
+        {},
+        '{"message": "No commit found for SHA: missing"}',
+    )
+
+    with pytest.raises(UnknownObjectException):
+        resolve_ref(repo, "missing", ref_cache)
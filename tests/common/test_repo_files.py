@@ -0,0 +1,162 @@
+import base64
+import re
+
+from collections import namedtuple
+from unittest.mock import Mock, PropertyMock
+
+import pytest
+
+from github import UnknownObjectException
+
+from common.blob_cache import BlobCache, git_blob_sha
+from common.repo_files import (
+    get_blobs,
+    get_content_files,
+    get_tree_files,
+    graphql_url,
+)
+
+TreeElement = namedtuple("TreeElement", ["path", "sha", "type"])
+
+
+@pytest.fixture
+def repo():
+    repo = Mock()
+    repo.url = "https://api.github.com/repos/my-org/my-repo"
+    repo.name = "my-repo"
+    repo.owner.login = "my-org"
+    repo.get_git_tree.return_value.raw_data = {"truncated": False}
+    repo.get_git_tree.return_value.tree = [
+        TreeElement("README.md", "a" * 40, "blob"),
+        TreeElement("gcp", "b" * 40, "tree"),
+        TreeElement("gcp/project.tf", "c" * 40, "blob"),
+        TreeElement("gcp/modules/net/main.tf", "d" * 40, "blob"),
+        TreeElement("gcp-legacy/project.tf", "e" * 40, "blob"),
+    ]
+
+    def graphql(verb, url, input):
+        aliases = re.findall(r"(b\d+): object", input["query"])
+        blob = {"text": "content", "isBinary": False}
+        return {}, {"data": {"repository": dict.fromkeys(aliases, blob)}}
+
+    repo._requester.requestJsonAndCheck.side_effect = graphql
+    return repo
+
+
+@pytest.mark.parametrize(
+    "api_url, expected",
+    [
+        ("https://api.github.com", "https://api.github.com/graphql"),
+        (
+            "https://ghe.example.com/api/v3",
+            "https://ghe.example.com/api/graphql",
+        ),
+    ],
+)
+def test_graphql_url(api_url, expected):
+    repo = Mock(url=f"{api_url}/repos/my-org/my-repo")
+    assert graphql_url(repo) == expected
+
+
+def test_get_tree_files_follows_subdirectories(repo):
+    files = get_tree_files(repo, "gcp", "master")
+
+    repo.get_git_tree.assert_called_once_with("master", recursive=True)
+    assert [file.path for file in files] == [
+        "gcp/project.tf",
+        "gcp/modules/net/main.tf",
+    ]
+    assert files[1].name == "main.tf"
+    assert all(file.decoded_content == b"content" for file in files)
+
+
+def test_get_blobs_batches_requests(repo):
+    shas = [str(index) * 40 for index in range(5)]
+
+    blobs = get_blobs(repo, shas, batch_size=2)
+
+    assert repo._requester.requestJsonAndCheck.call_count == 3
+    assert set(blobs) == set(shas)
+
+
+def test_get_blobs_falls_back_to_rest_for_binary(repo):
+    repo._requester.requestJsonAndCheck.side_effect = None
+    repo._requester.requestJsonAndCheck.return_value = (
+        {},
+        {"data": {"repository": {"b0": {"text": None, "isBinary": True}}}},
+    )
+    repo.get_git_blob.return_value.content = base64.b64encode(b"\x00\x01")
+
+    assert get_blobs(repo, ["f" * 40]) == {"f" * 40: b"\x00\x01"}
+
+
+def test_get_blobs_falls_back_to_rest_for_truncated(repo):
+    content = "x" * 600 + "\u00e9"
+    repo._requester.requestJsonAndCheck.side_effect = None
+    repo._requester.requestJsonAndCheck.return_value = (
+        {},
+        {
+            "data": {
+                "repository": {
+                    "b0": {
+                        "text": content[:600],
+                        "isBinary": False,
+                        "isTruncated": True,
+                    }
+                }
+            }
+        },
+    )
+    repo.get_git_blob.return_value.content = base64.b64encode(
+        content.encode("utf-8")
+    )
+
+    assert get_blobs(repo, ["f" * 40]) == {"f" * 40: content.encode("utf-8")}
+    repo.get_git_blob.assert_called_once_with("f" * 40)
+
+
+@pytest.mark.parametrize("truncated", [False, True])
+def test_get_tree_files_missing_directory(repo, truncated):
+    repo.get_git_tree.return_value.raw_data = {"truncated": truncated}
+
+    with pytest.raises(UnknownObjectException):
+        get_tree_files(repo, "aws", "master")
+
+
+def test_get_tree_files_downloads_only_missing_blobs(repo, tmpdir):
+    blob_cache = BlobCache(tmpdir.strpath, max_size=1024)
+    content_sha = git_blob_sha(b"content")
+    repo.get_git_tree.return_value.tree = [
+        TreeElement("gcp/project.tf", content_sha, "blob"),
+    ]
+
+    get_tree_files(repo, "gcp", "master", blob_cache)
+    files = get_tree_files(repo, "gcp", "master", blob_cache)
+
+    repo._requester.requestJsonAndCheck.assert_called_once()
+    assert files[0].decoded_content == b"content"
+
+
+def test_get_content_files_skips_cached_and_directories(repo, tmpdir):
+    blob_cache = BlobCache(tmpdir.strpath, max_size=1024)
+    cached_sha = git_blob_sha(b"cached")
+    blob_cache.put(cached_sha, b"cached")
+
+    cached_file = Mock(type="file", path="gcp/cached.tf", sha=cached_sha)
+    cached_file.name = "cached.tf"
+    type(cached_file).decoded_content = PropertyMock()
+    new_file = Mock(
+        type="file",
+        path="gcp/new.tf",
+        sha=git_blob_sha(b"new"),
+        decoded_content=b"new",
+    )
+    new_file.name = "new.tf"
+    directory = Mock(type="dir")
+    repo.get_dir_contents.return_value = [cached_file, new_file, directory]
+
+    files = get_content_files(repo, "gcp", "master", blob_cache)
+
+    assert [file.decoded_content for file in files] == [b"cached", b"new"]
+    type(cached_file).decoded_content.assert_not_called()
+    assert new_file.sha in blob_cache
@@ -0,0 +1,149 @@
+import pytest
+
+from github import Github
+
+from common.http_cache import install_http_cache, uninstall_http_cache
+from common.scheduler import RequestScheduler
+from reporter.base import MetricsRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    return RequestScheduler(
+        max_concurrency=4,
+        low_remaining=100,
+        max_retries=2,
+        backoff_base=0.5,
+        backoff_max=10,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+
+def rate_limit_headers(remaining, reset, **headers):
+    headers.update(
+        {
+            "x-ratelimit-limit": "5000",
+            "x-ratelimit-remaining": str(remaining),
+            "x-ratelimit-reset": str(reset),
+        }
+    )
+    return headers
+
+
+def test_concurrency_scaled_to_remaining_quota(scheduler, clock):
+    assert scheduler.concurrency == 4
+
+    scheduler.observe(200, rate_limit_headers(50, clock.now + 60))
+    assert scheduler.concurrency == 2
+
+    scheduler.observe(200, rate_limit_headers(1, clock.now + 60))
+    assert scheduler.concurrency == 1
+
+
+def test_token_bucket_spreads_remaining_quota(scheduler, clock):
+    """
+    With 10 requests left for 100 seconds, one request is allowed every 10
+    seconds once burst is spent.
+    """
+    scheduler.observe(200, rate_limit_headers(10, clock.now + 100))
+
+    for _ in range(5):
+        scheduler.acquire()
+        scheduler.release()
+
+    assert clock.sleeps == [pytest.approx(10.0)]
+    assert scheduler.wait_time == pytest.approx(10.0)
+
+
+def test_healthy_quota_not_paced(scheduler, clock):
+    scheduler.observe(200, rate_limit_headers(4990, clock.now + 3500))
+
+    for _ in range(60):
+        scheduler.acquire()
+        scheduler.release()
+
+    assert clock.sleeps == []
+    assert scheduler.wait_time == 0.0
+
+
+def test_exhausted_quota_waits_for_reset(scheduler, clock):
+    scheduler.observe(200, rate_limit_headers(0, clock.now + 30))
+
+    scheduler.acquire()
+
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+def test_retry_after_respected(scheduler, clock, mocker):
+    rejected = mocker.Mock(
+        status_code=403, headers={"retry-after": "3"}, text="secondary limit"
+    )
+    accepted = mocker.Mock(status_code=200, headers={}, text="")
+    send_request = mocker.Mock(side_effect=[rejected, accepted])
+
+    assert scheduler.send(send_request) is accepted
+    assert scheduler.retries == 1
+    assert clock.sleeps and clock.sleeps[0] >= 3.0
+
+
+def test_forbidden_without_rate_limit_not_retried(scheduler, mocker):
+    forbidden = mocker.Mock(status_code=403, headers={}, text="Forbidden")
+    send_request = mocker.Mock(return_value=forbidden)
+
+    assert scheduler.send(send_request) is forbidden
+    send_request.assert_called_once()
+
+
+def test_retries_limited(scheduler, mocker):
+    rejected = mocker.Mock(status_code=429, headers={}, text="")
+    send_request = mocker.Mock(return_value=rejected)
+
+    assert scheduler.send(send_request) is rejected
+    assert send_request.call_count == 3
+
+
+def test_report_adds_metrics(scheduler, clock):
+    metrics_registry = MetricsRegistry("config")
+    scheduler.observe(200, rate_limit_headers(4000, clock.now + 60))
+
+    scheduler.report(metrics_registry)
+
+    assert metrics_registry.metrics["vcs_rate_limit_remaining"]["value"] == 4000
+    assert metrics_registry.metrics["vcs_wait_time"]["value"] == 0.0
+
+
+def test_github_requests_scheduled(github_server, scheduler, clock):
+    """
+    Secondary rate limit response is retried transparently for PyGithub
+    """
+    github_server.routes["/orgs/my-org"] = {"login": "my-org"}
+    github_server.rejections.append((403, {"Retry-After": "1"}))
+    install_http_cache(None, scheduler)
+    try:
+        github = Github(base_url=github_server.url, login_or_token="token")
+        assert github.get_organization("my-org").login == "my-org"
+    finally:
+        uninstall_http_cache()
+
+    assert [status for _, _, status in github_server.requests] == [403, 200]
+    assert scheduler.requests == 2
+    assert scheduler.rate_limit_remaining == github_server.rate_limit - 1
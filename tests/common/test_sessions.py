@@ -0,0 +1,87 @@
+import pytest
+import requests
+
+from common.sessions import RestSession
+
+
+@pytest.fixture
+def sleeps():
+    return []
+
+
+@pytest.fixture
+def rest_session(sleeps):
+    return RestSession(
+        timeout=(1, 2),
+        max_retries=2,
+        backoff_base=0.5,
+        backoff_max=4,
+        pool_size=2,
+        sleep=sleeps.append,
+    )
+
+
+@pytest.fixture
+def responses(mocker, rest_session):
+    def respond(*results):
+        side_effect = [
+            (
+                result
+                if isinstance(result, Exception)
+                else mocker.Mock(status_code=result)
+            )
+            for result in results
+        ]
+        return mocker.patch.object(
+            rest_session.session, "request", side_effect=side_effect
+        )
+
+    return respond
+
+
+def test_idempotent_request_retried(rest_session, responses, sleeps):
+    request = responses(requests.ConnectionError(), 502, 200)
+
+    response = rest_session.get("https://api.github.com/teams/1")
+
+    assert response.status_code == 200
+    assert request.call_count == 3
+    assert request.call_args[1]["timeout"] == (1, 2)
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= 1.0 for delay in sleeps)
+
+
+def test_non_idempotent_request_not_retried(rest_session, responses):
+    request = responses(502)
+
+    assert (
+        rest_session.request("POST", "https://api.github.com/x").status_code
+        == 502
+    )
+    request.assert_called_once()
+
+
+def test_patch_retried_when_marked_idempotent(rest_session, responses):
+    request = responses(503, 200)
+
+    rest_session.patch("https://api.github.com/teams/1", idempotent=True)
+
+    assert request.call_count == 2
+
+
+def test_retries_limited(rest_session, responses):
+    responses(requests.Timeout(), requests.Timeout(), requests.Timeout())
+
+    with pytest.raises(requests.Timeout):
+        rest_session.get("https://api.github.com/teams/1")
+
+
+def test_latency_tracked_per_endpoint(rest_session, responses):
+    responses(200, 200)
+
+    rest_session.get("https://api.github.com/teams/1")
+    rest_session.get("https://api.github.com/teams/2")
+
+    latency = rest_session.stats["latency"]
+    assert list(latency) == ["GET /teams/:id"]
+    assert latency["GET /teams/:id"]["count"] == 2
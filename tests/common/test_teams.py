@@ -0,0 +1,86 @@
+from unittest.mock import Mock
+
+import pytest
+
+from github import GithubException
+
+from common.teams import TeamIndex
+
+
+def _team(slug):
+    team = Mock(slug=slug)
+    return team
+
+
+@pytest.fixture
+def org():
+    org = Mock(login="my-org")
+    teams = {slug: _team(slug) for slug in ("admins", "devs", "ops")}
+
+    def get_team_by_slug(slug):
+        if slug not in teams:
+            raise GithubException(404, {"message": "Not Found"})
+        return teams[slug]
+
+    org.get_team_by_slug.side_effect = get_team_by_slug
+    org.get_teams.return_value = list(teams.values())
+    return org
+
+
+def test_team_fetched_directly_by_slug_once(org):
+    index = TeamIndex()
+
+    assert index.get(org, "devs").slug == "devs"
+    assert index.get(org, "devs").slug == "devs"
+
+    org.get_team_by_slug.assert_called_once_with("devs")
+    org.get_teams.assert_not_called()
+
+
+def test_missing_team_does_not_list_all_teams(org):
+    assert TeamIndex().get(org, "missing") is None
+    org.get_teams.assert_not_called()
+
+
+def test_falls_back_to_index_when_slug_lookup_unavailable(org):
+    org.get_team_by_slug.side_effect = GithubException(415, {})
+    index = TeamIndex()
+
+    assert index.get(org, "ops").slug == "ops"
+    assert index.get(org, "admins").slug == "admins"
+    assert index.get(org, "missing") is None
+    org.get_teams.assert_called_once()
+
+
+def test_live_lookup_bypasses_indexed_teams(mocker, org):
+    inventory = mocker.patch("common.teams.INVENTORY")
+    stale_team = inventory.get_team.return_value
+    index = TeamIndex()
+
+    assert index.get(org, "devs") is stale_team
+    assert index.get(org, "devs", live=True) is org.get_teams.return_value[1]
+    assert index.get(org, "missing", live=True) is None
+
+    assert org.get_team_by_slug.call_count == 2
+    inventory.forget_team.assert_called_once_with(org, "missing")
+
+
+def test_get_many_uses_single_listing(mocker, org):
+    mocker.patch.dict(
+        "settings.SETTINGS.attributes", {"TEAM_INDEX_THRESHOLD": 1}
+    )
+
+    teams = TeamIndex().get_many(org, ["admins", "devs", "missing"])
+
+    assert teams["admins"].slug == "admins"
+    assert teams["missing"] is None
+    org.get_teams.assert_called_once()
+    org.get_team_by_slug.assert_not_called()
+
+
+def test_added_team_found_without_requests(org):
+    index = TeamIndex()
+    index.add(org, _team("new-team"))
+
+    assert index.get(org, "new-team").slug == "new-team"
+    org.get_team_by_slug.assert_not_called()
@@ -1,8 +1,11 @@
 import os
 import json
+import hashlib
 import textwrap
+import threading
 
 from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
 
@@ -380,3 +383,81 @@ def metrics_registry():
     metrics_registry.add_metric("successes", 1)
     metrics_registry.add_metric("failures", 1)
     return metrics_registry
+
+
+class FakeGithubServer(ThreadingHTTPServer):
+    """
+    Local stand-in for GitHub API. Serves JSON documents from `routes` with
+    ETag validators and, as GitHub does, answers matching conditional requests
+    with `304 Not Modified` without consuming rate limit. Responses queued in
+    `rejections` as `(status, headers)` are sent first, to simulate rate
+    limiting.
+    """
+
+    def __init__(self, rate_limit=5000):
+        super().__init__(("127.0.0.1", 0), _FakeGithubHandler)
+        self.routes = {}
+        self.requests = []
+        self.rejections = []
+        self.rate_limit = rate_limit
+        self.rate_limit_remaining = rate_limit
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _FakeGithubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, body=b"", headers=None):
+        self.send_response(status)
+        self.send_header("X-RateLimit-Limit", str(self.server.rate_limit))
+        self.send_header(
+            "X-RateLimit-Remaining", str(self.server.rate_limit_remaining)
+        )
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.server.rejections:
+            status, headers = self.server.rejections.pop(0)
+            self.server.requests.append(("GET", self.path, status))
+            return self._respond(
+                status,
+                b'{"message": "You have exceeded a secondary rate limit."}',
+                headers,
+            )
+
+        route = self.server.routes.get(self.path)
+        if route is None:
+            self.server.requests.append(("GET", self.path, 404))
+            return self._respond(404, b'{"message": "Not Found"}')
+
+        body = json.dumps(route).encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.server.requests.append(("GET", self.path, 304))
+            return self._respond(304, headers={"ETag": etag})
+
+        self.server.rate_limit_remaining -= 1
+        self.server.requests.append(("GET", self.path, 200))
+        self._respond(
+            200,
+            body,
+            {"ETag": etag, "Content-Type": "application/json; charset=utf-8"},
+        )
+
+
+@pytest.fixture
+def github_server():
+    server = FakeGithubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
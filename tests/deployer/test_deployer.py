@@ -7,10 +7,13 @@ from unittest.mock import Mock, PropertyMock, call
 
 import pytest
 
+import deployer as deployer_module
+
 from deployer import (
     deploy,
     assert_project_id_did_not_change,
     _prepare_state_for_compare,
+    PhaseTimer,
     WrongStateError,
     TerraformDeployer,
     TerraformCommandError,
@@ -151,7 +154,8 @@ def test_deploy(
     """
     Checks, that when `deploy` being called:
     1) `TerraformDeployer` instantiated twice.
-    2) `TerraformDeployer.run` called for two instances, and `TerraformDeployer.delete` called for test instance.
+    2) `TerraformDeployer.run` called for two instances with plans created
+    beforehand, and test instance is destroyed with its destroy plan.
     3) No errors raised
     """
     test_deployment = Mock()
@@ -173,7 +177,10 @@ def test_deploy(
     )
 
     deployer = mocker.patch("deployer.TerraformDeployer")
-    deployer.side_effect = [test_deployment, real_deployment]
+    # deployers are prepared concurrently, so order of calls isn't fixed
+    deployer.side_effect = lambda *args: (
+        test_deployment if len(args) == 4 else real_deployment
+    )
 
     deploy(command_line_args, code_files, config_files, short_code_config_hash)
 
@@ -186,12 +193,19 @@ def test_deploy(
                 short_code_config_hash,
             ),
             call(command_line_args, code_files, config_files),
-        ]
+        ],
+        any_order=True,
     )
 
-    test_deployment.run.assert_called_once()
-    test_deployment.delete.assert_called_once()
-    real_deployment.run.assert_called_once()
+    real_deployment.create_plan.assert_called_once_with()
+    real_deployment.run.assert_called_once_with(
+        real_deployment.create_plan.return_value
+    )
+    test_deployment.create_plan.assert_called_once_with(destroy=True)
+    assert test_deployment.run.call_args_list == [
+        call(),
+        call(test_deployment.create_plan.return_value),
+    ]
 
 
 @pytest.mark.parametrize(
@@ -227,7 +241,136 @@ def test_deploy_different_states(
     real_deployment.current_state = real_state
 
     deployer = mocker.patch("deployer.TerraformDeployer")
-    deployer.side_effect = [test_deployment, real_deployment]
+    deployer.side_effect = lambda *args: (
+        test_deployment if len(args) == 4 else real_deployment
+    )
 
     with pytest.raises(WrongStateError):
         deploy(command_line_args, code_files, config_files)
+
+
+@pytest.fixture
+def terraform_settings(mocker, tmpdir):
+    mocker.patch.dict(
+        "settings.SETTINGS.attributes",
+        {
+            "WORKING_DIR_BASE": Path(tmpdir.strpath),
+            "TERRAFORM_PLUGIN_CACHE_DIR": Path(tmpdir.join("plugins").strpath),
+        },
+    )
+    mocker.patch.dict(os.environ)
+    os.environ.pop("TF_PLUGIN_CACHE_DIR", None)
+    mocker.patch.dict("deployer._TERRAFORM_VERSIONS", clear=True)
+
+
+@pytest.fixture
+def fake_terraform(mocker, terraform_settings):
+    return mocker.patch(
+        "deployer.TerraformDeployer.cmd", return_value=(0, "", "")
+    )
+
+
+def _commands(cmd):
+    return [args[0] for args, _ in cmd.call_args_list]
+
+
+def test_init_skipped_when_sources_unchanged(
+    fake_terraform, command_line_args, code_files, config_files
+):
+    first = TerraformDeployer(command_line_args, code_files, config_files)
+    assert not first.init_skipped
+    assert _commands(fake_terraform)[:3] == ["version", "get", "init"]
+
+    fake_terraform.reset_mock()
+    second = TerraformDeployer(command_line_args, code_files, config_files)
+
+    assert second.init_skipped
+    assert "get" not in _commands(fake_terraform)
+    assert "init" not in _commands(fake_terraform)
+
+
+def test_init_repeated_when_terraform_upgraded(
+    fake_terraform, command_line_args, code_files, config_files
+):
+    versions = iter(["Terraform v0.12.28\n", "Terraform v0.12.29\n"])
+
+    def cmd(command, *args, **kwargs):
+        return 0, next(versions) if command == "version" else "", ""
+
+    fake_terraform.side_effect = cmd
+    TerraformDeployer(command_line_args, code_files, config_files)
+
+    deployer_module._TERRAFORM_VERSIONS.clear()
+    deployer = TerraformDeployer(command_line_args, code_files, config_files)
+
+    assert not deployer.init_skipped
+
+
+def test_plugin_cache_passed_to_terraform_only(
+    mocker, terraform_settings, command_line_args, code_files, config_files
+):
+    run_streaming = mocker.patch(
+        "deployer.run_streaming", return_value=(0, "", "")
+    )
+
+    TerraformDeployer(command_line_args, code_files, config_files)
+
+    for _, kwargs in run_streaming.call_args_list:
+        assert kwargs["env"]["TF_PLUGIN_CACHE_DIR"].endswith("plugins")
+    assert "TF_PLUGIN_CACHE_DIR" not in os.environ
+
+
+def test_plan_output_not_colored(
+    fake_terraform, command_line_args, code_files, config_files
+):
+    deployer = TerraformDeployer(command_line_args, code_files, config_files)
+
+    deployer.create_plan(destroy=True)
+
+    assert _commands(fake_terraform)[-1].startswith("plan -no-color -destroy")
+
+
+def test_only_init_holds_plugin_cache_lock(
+    fake_terraform, command_line_args, code_files, config_files
+):
+    locked = {}
+
+    def cmd(command, *args, **kwargs):
+        locked[command] = deployer_module._PLUGIN_CACHE_LOCK.locked()
+        return 0, "", ""
+
+    fake_terraform.side_effect = cmd
+
+    TerraformDeployer(command_line_args, code_files, config_files)
+
+    assert locked["get"] is False
+    assert locked["init"] is True
+
+
+def test_init_repeated_when_sources_change(
+    fake_terraform,
+    command_line_args,
+    code_files,
+    config_files,
+    github_file_factory,
+):
+    TerraformDeployer(command_line_args, code_files, config_files)
+    changed = [
+        github_file_factory(code_files[0].name, code_files[0].path, b"# new")
+    ]
+
+    fake_terraform.reset_mock()
+    deployer = TerraformDeployer(command_line_args, changed, config_files)
+
+    assert not deployer.init_skipped
+    assert _commands(fake_terraform)[:2] == ["get", "init"]
+
+
+def test_phase_timer_reports_overlap():
+    timer = PhaseTimer(Mock(side_effect=[0.0, 1.0, 5.0, 6.0]))
+
+    timer.timed("test_apply", timer.timed("real_plan", lambda: None))()
+
+    assert timer.timings == {"real_plan": 4.0, "test_apply": 6.0}
+    assert timer.wall_time == 6.0
+    assert timer.overlap == 4.0
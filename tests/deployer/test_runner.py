@@ -0,0 +1,69 @@
+import logging
+import sys
+
+from deployer.runner import TerraformProgress, run_streaming
+
+SCRIPT = """
+import sys
+print("Plan: 2 to add, 0 to change, 1 to destroy.")
+for index in range(50):
+    print(f"google_project.project{index}: Still creating...")
+print("google_project.project: Creation complete after 1s")
+print("failed", file=sys.stderr)
+sys.exit(1)
+"""
+
+
+def test_output_streamed_with_bounded_tail(mocker, caplog):
+    mocker.patch.dict(
+        "settings.SETTINGS.attributes", {"TERRAFORM_OUTPUT_TAIL_LINES": 3}
+    )
+    caplog.set_level(logging.INFO, logger="deployer")
+
+    return_code, stdout, stderr = run_streaming(
+        [sys.executable, "-c", SCRIPT], name="my-project apply"
+    )
+
+    assert return_code == 1
+    assert stdout.splitlines() == [
+        "[... 49 earlier lines omitted]",
+        "google_project.project48: Still creating...",
+        "google_project.project49: Still creating...",
+        "google_project.project: Creation complete after 1s",
+    ]
+    assert stderr == "failed"
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 55
+    assert "my-project apply: 1/3 resources done" in messages
+
+
+def test_captured_output_kept_whole(mocker):
+    mocker.patch.dict(
+        "settings.SETTINGS.attributes", {"TERRAFORM_OUTPUT_TAIL_LINES": 1}
+    )
+
+    _, stdout, _ = run_streaming(
+        [sys.executable, "-c", "print('{\\n}')"], capture=True
+    )
+
+    assert stdout == "{\n}"
+
+
+def test_progress():
+    progress = TerraformProgress()
+
+    assert not progress.feed("google_project.project: Refreshing state...")
+    assert progress.feed("google_project.project: Destruction complete")
+    assert str(progress) == "1 resources done"
+
+
+def test_progress_of_colored_output():
+    progress = TerraformProgress()
+
+    assert progress.feed(
+        "\x1b[0m\x1b[1mPlan:\x1b[0m 2 to add, 1 to change, 0 to destroy.\x1b[0m"
+    )
+    assert progress.feed(
+        "\x1b[0m\x1b[1mgoogle_project.project: Creation complete\x1b[0m"
+    )
+    assert str(progress) == "1/3 resources done"
@@ -0,0 +1,146 @@
+import copy
+
+import pytest
+
+from deployer import (
+    WrongStateError,
+    _prepare_state_for_compare,
+    assert_deployments_equal,
+)
+from deployer.state_diff import (
+    StateChange,
+    StateNormaliser,
+    diff_states,
+    format_state_changes,
+    states_equal,
+)
+
+
+def _state(labels, services, extra_resource=False):
+    resources = [
+        {
+            "mode": "managed",
+            "type": "google_project",
+            "name": "project",
+            "instances": [{"attributes": {"labels": labels}}],
+        },
+        {
+            "module": "module.apis",
+            "mode": "managed",
+            "type": "google_project_service",
+            "name": "service",
+            "instances": [
+                {"index_key": service, "attributes": {"service": service}}
+                for service in services
+            ],
+        },
+    ]
+    if extra_resource:
+        resources.append(
+            {"mode": "data", "type": "google_project", "name": "this"}
+        )
+    return {"version": 4, "resources": resources}
+
+
+def test_equal_states():
+    state = _state({"env": "dev"}, ["compute"])
+
+    assert states_equal(state, _state({"env": "dev"}, ["compute"]))
+    assert diff_states(state, _state({"env": "dev"}, ["compute"])) == []
+
+
+def test_changes_indexed_by_address():
+    old = _state({"env": "dev", "team": "a"}, ["compute", "dns"])
+    new = _state({"env": "prod"}, ["compute", "iam"], extra_resource=True)
+
+    assert not states_equal(old, new)
+    assert diff_states(old, new) == [
+        StateChange("data.google_project.this", "added", []),
+        StateChange(
+            "google_project.project",
+            "changed",
+            ["attributes.labels.env", "attributes.labels.team"],
+        ),
+        StateChange(
+            'module.apis.google_project_service.service["dns"]', "removed", []
+        ),
+        StateChange(
+            'module.apis.google_project_service.service["iam"]', "added", []
+        ),
+    ]
+
+
+def test_deposed_object_indexed_beside_current_instance():
+    old = _state({"env": "dev"}, ["compute"])
+    new = copy.deepcopy(old)
+    new["resources"][0]["instances"].append(
+        {"deposed": "00000001", "attributes": {"labels": {"env": "dev"}}}
+    )
+
+    assert diff_states(old, new) == [
+        StateChange(
+            "google_project.project (deposed object 00000001)", "added", []
+        )
+    ]
+
+
+def test_format_limits_changes():
+    changes = [StateChange(f"a.b{index}", "added", []) for index in range(3)]
+
+    assert format_state_changes(changes, 2) == "+ a.b0\n+ a.b1\n... and 1 more"
+
+
+def test_wrong_state_error_lists_changes(project_state1, project_state2):
+    project_state2["resources"][0]["instances"][0]["attributes"][
+        "billing_account"
+    ] = "other"
+
+    with pytest.raises(WrongStateError) as error:
+        assert_deployments_equal(project_state1, project_state2)
+
+    assert str(error.value).endswith(
+        "~ google_project.project: attributes.billing_account"
+    )
+
+
+def test_prepare_state_does_not_mutate(project_state1):
+    original = copy.deepcopy(project_state1)
+
+    first = _prepare_state_for_compare(project_state1)
+    second = _prepare_state_for_compare(project_state1)
+
+    assert project_state1 == original
+    assert first == second
+    assert "serial" not in first
+    assert "value" not in first["outputs"]["project_id"]
+
+
+def test_normaliser_rules_per_resource_type():
+    normaliser = StateNormaliser(
+        ["serial"], [], {"*": ["id"], "google_project": ["number"]}
+    )
+    shared = {"labels": {"env": "test"}}
+    state = {
+        "serial": 3,
+        "resources": [
+            {
+                "type": "google_project",
+                "instances": [
+                    {"attributes": {"id": "a", "number": 1, "meta": shared}}
+                ],
+            },
+            {
+                "type": "google_project_service",
+                "instances": [{"attributes": {"id": "b", "number": 2}}],
+            },
+        ],
+    }
+
+    view = normaliser.normalise(state)
+
+    project, service = view["resources"]
+    assert project["instances"][0]["attributes"] == {"meta": shared}
+    assert project["instances"][0]["attributes"]["meta"] is shared
+    assert service["instances"][0]["attributes"] == {"number": 2}
+    assert state["serial"] == 3
+    assert state["resources"][0]["instances"][0]["attributes"]["id"] == "a"
@@ -49,8 +49,24 @@ def test_metric_registry():
         "time": {"metric_type": Gauge, "value_type": float, "unit": "seconds", "value": 123.45},
         "successes": {"metric_type": Counter, "value_type": int, "unit": None, "value": 1},
         "failures": {"metric_type": Counter, "value_type": int, "value": None, "unit": None},
-        "total": {"metric_type": Counter, "value_type": int, "value": 1, "unit": None}
+        "total": {"metric_type": Counter, "value_type": int, "value": 1, "unit": None},
+        "source_resolution_time": {"metric_type": Gauge, "value_type": float, "value": None,
+                                   "unit": "seconds"},
+        "vcs_rate_limit_remaining": {"metric_type": Gauge, "value_type": int, "value": None,
+                                     "unit": None},
+        "vcs_wait_time": {"metric_type": Gauge, "value_type": float, "value": None,
+                          "unit": "seconds"}
     }
 
     assert deploy_registry.time
     assert deploy_registry.successes
+
+
+def test_metric_registry_collected_metrics():
+    """
+    Metrics without value are not collected, so they are not reported.
+    """
+    deploy_registry = MetricsRegistry("deploy")
+    deploy_registry.add_metric("time", 123.45)
+
+    assert set(deploy_registry.collected_metrics) == {"time", "total"}
@@ -24,20 +24,73 @@ def test_deploy(
 ):
     deploy = mocker.patch("cloud_control.deploy")
     common = mocker.patch("cloud_control.common")
-    common.get_hash_of_latest_commit.return_value = sha256_hash
+    common.get_latest_commit_hash.return_value = sha256_hash
 
     cloud_control = CloudControl(cli_args_with_mocked_metrics)
 
     cloud_control.perform_command()
     deploy.assert_called_once_with(
         cli_args_with_mocked_metrics,
-        common.get_files(),
-        common.get_files(),
+        common.get_repo_files(),
+        common.get_repo_files(),
         short_code_config_hash,
     )
     cli_args_with_mocked_metrics.monitoring_system.return_value.send_metrics.assert_called_once()
 
 
+def test_deploy_resolves_sources_concurrently(
+    mocker, cli_args_with_mocked_metrics, sha256_hash
+):
+    """
+    Each repository is resolved once and shared between files and commit hash
+    fetching, and duration of the stage is recorded.
+    """
+    mocker.patch("cloud_control.deploy")
+    common = mocker.patch("cloud_control.common")
+    common.get_latest_commit_hash.return_value = sha256_hash
+
+    cloud_control = CloudControl(cli_args_with_mocked_metrics)
+    cloud_control.perform_command()
+
+    assert common.get_repo.call_count == 2
+    assert common.get_repo_files.call_count == 2
+    assert common.get_latest_commit_hash.call_count == 2
+    assert isinstance(
+        cloud_control.metrics_registry.source_resolution_time["value"], float
+    )
+
+
+def test_deploy_pins_files_to_resolved_commits(
+    mocker, cli_args_with_mocked_metrics
+):
+    """
+    Each version is resolved to commit hash once, and files are fetched at
+    that commit, code files at code version.
+    """
+    mocker.patch("cloud_control.deploy")
+    common = mocker.patch("cloud_control.common")
+    common.get_repo.side_effect = lambda org, repo_name: repo_name
+    cli_args_with_mocked_metrics.config_repo = "config-repo"
+    cli_args_with_mocked_metrics.code_repo = "code-repo"
+    cli_args_with_mocked_metrics.config_version = "config-branch"
+    cli_args_with_mocked_metrics.code_version = "code-branch"
+    common.get_latest_commit_hash.side_effect = lambda repo, version: {
+        "config-branch": "a" * 40,
+        "code-branch": "b" * 40,
+    }[version]
+
+    CloudControl(cli_args_with_mocked_metrics).perform_command()
+
+    fetched_versions = {
+        (repo, version)
+        for (repo, _, version, _), _ in common.get_repo_files.call_args_list
+    }
+    assert fetched_versions == {
+        ("config-repo", "a" * 40),
+        ("code-repo", "b" * 40),
+    }
+
+
 def test_config(mocker, cli_args_with_mocked_metrics):
     setup = mocker.patch("cloud_control.setup")
 
@@ -50,6 +103,15 @@ def test_config(mocker, cli_args_with_mocked_metrics):
     cli_args_with_mocked_metrics.monitoring_system.return_value.send_metrics.assert_called_once()
 
 
+def test_config_requires_project_id(cli_args_with_mocked_metrics):
+    cli_args_with_mocked_metrics.command = "config"
+    cli_args_with_mocked_metrics.project_id = None
+    cli_args_with_mocked_metrics.manifest = None
+
+    with pytest.raises(CloudControlException):
+        CloudControl(cli_args_with_mocked_metrics)
+
+
 def test_perform_command_exception(cli_args_with_mocked_metrics):
     cli_args_with_mocked_metrics.command = "check"
 
@@ -98,6 +160,7 @@ def test_argument_parser_defaults(tmpdir):
 
     assert command_line_args_dict == {
         "api_url": "https://api.github.com",
+        "git_remote_url": "https://github.com/{org}/{repo}.git",
         "code_org": "my-code-org",
         "config_org": "my-config-org",
         "code_repo": "testrepo1",
@@ -119,5 +182,6 @@ def test_argument_parser_defaults(tmpdir):
         "command": "deploy",
         "force": False,
         "cloud": "gcp",
+        "fetch_mode": "contents",
         "vcs_platform": "github",
     }